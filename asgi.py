@@ -0,0 +1,16 @@
+"""
+ASGI-точка входа: uvicorn asgi:application.
+Миграции, прогрев и запуск доставки уведомлений выполняются при запуске сервера (lifespan), а не при импорте
+"""
+from framework.asgi import AsgiFrameworkApp
+from framework.middleware import CompressionMiddleware
+from framework.static import STATIC_MANIFEST
+from patterns.pattern_creator import POOL
+from runner import warm_up
+from urls import fronts
+from views import OUTBOX, routes
+
+application = AsgiFrameworkApp(routes, fronts, middlewares=[CompressionMiddleware()], startup=[warm_up, OUTBOX.start],
+                               static_manifest=STATIC_MANIFEST)
+# каждый поток представлений может одновременно держать соединение, еще одно - для миниатюр и сессий
+POOL.max_size = max(POOL.max_size, application.max_workers + 1)
@@ -0,0 +1,52 @@
+"""
+Бенчмарк /api/products/ на 100 000 товаров: прежний ProductsSerializer(all()).save() (jsonpickle)
+против потоковой выдачи ProductSchema.stream_json прямо из курсора. Замеряются время и пиковая память.
+Запуск из корня проекта: python -m benchmarks.bench_api
+"""
+import tracemalloc
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from patterns.pattern_creator import ProductsMapper, ProductsSerializer, ProductSchema
+
+PRODUCTS = 100_000
+
+
+def measure(func):
+    tracemalloc.start()
+    start = perf_counter()
+    size = func()
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6, size / 1e6
+
+
+def main():
+    path = temp_database(products=PRODUCTS)
+    connection = connect(path)
+    try:
+        def legacy():
+            mapper = ProductsMapper(connection)
+            mapper.invalidate()
+            return len(ProductsSerializer(mapper.all()).save().encode('utf-8'))
+
+        def streaming(fields=None):
+            serializer = ProductSchema(fields)
+            rows = ProductsMapper(connection).iter_rows(serializer.selected)
+            return sum(len(chunk.encode('utf-8')) for chunk in serializer.stream_json(rows))
+
+        print(f'{"способ":<28}{"время, с":>10}{"пик памяти, МБ":>18}{"ответ, МБ":>12}')
+        for title, func in (('jsonpickle', legacy),
+                            ('поток json', streaming),
+                            ('поток json, fields=id,name', lambda: streaming(['id', 'name']))):
+            elapsed, peak, size = measure(func)
+            print(f'{title:<28}{elapsed:>10.2f}{peak:>18.1f}{size:>12.1f}')
+    finally:
+        connection.close()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Нагрузочный стенд WSGI и ASGI путей приложения без внешнего сервера: конкурентные клиенты
+вызывают приложение напрямую (WSGI - из пула потоков, ASGI - задачами asyncio),
+измеряются запросы в секунду и 99-й перцентиль задержки.
+Запуск из корня проекта: python -m benchmarks.bench_asgi
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+
+CLIENTS = (1, 8, 32)
+REQUESTS = 400
+PATHS = ('/', '/products/', '/api/products/')
+
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def wsgi_request(app, path):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'wsgi.input': io.BytesIO()}
+    start = perf_counter()
+    body = b''.join(app(environ, lambda status, headers: None))
+    return perf_counter() - start, len(body)
+
+
+def run_wsgi(app, path, clients):
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        start = perf_counter()
+        results = list(executor.map(lambda _: wsgi_request(app, path), range(REQUESTS)))
+        elapsed = perf_counter() - start
+    return REQUESTS / elapsed, percentile([latency for latency, _ in results], 0.99)
+
+
+async def asgi_request(app, path):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': []}
+    chunks = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.body':
+            chunks.append(message['body'])
+
+    start = perf_counter()
+    await app(scope, receive, send)
+    return perf_counter() - start, sum(map(len, chunks))
+
+
+async def run_asgi(app, path, clients):
+    semaphore = asyncio.Semaphore(clients)
+
+    async def client():
+        async with semaphore:
+            return await asgi_request(app, path)
+
+    start = perf_counter()
+    results = await asyncio.gather(*(client() for _ in range(REQUESTS)))
+    elapsed = perf_counter() - start
+    return REQUESTS / elapsed, percentile([latency for latency, _ in results], 0.99)
+
+
+def main():
+    path = temp_database(products=2000)
+    out = sys.stdout
+    try:
+        with redirect_stdout(io.StringIO()):
+            import views
+            from framework.asgi import AsgiFrameworkApp
+            from framework.main import FrameworkApp
+            from patterns.pattern_creator import POOL
+            from urls import fronts
+
+            POOL.database = path
+            POOL.max_size = 2 * max(CLIENTS)
+            views.LOGGER.writer = NullWriter()
+            wsgi_app = FrameworkApp(views.routes, fronts)
+            asgi_app = AsgiFrameworkApp(views.routes, fronts, max_workers=max(CLIENTS))
+
+            print(f'{"путь":<16}{"клиенты":>8}{"WSGI, з/с":>12}{"WSGI p99, мс":>14}{"ASGI, з/с":>12}'
+                  f'{"ASGI p99, мс":>14}', file=out)
+            for url in PATHS:
+                for clients in CLIENTS:
+                    wsgi_rps, wsgi_p99 = run_wsgi(wsgi_app, url, clients)
+                    asgi_rps, asgi_p99 = asyncio.run(run_asgi(asgi_app, url, clients))
+                    print(f'{url:<16}{clients:>8}{wsgi_rps:>12.0f}{wsgi_p99 * 1000:>14.1f}{asgi_rps:>12.0f}'
+                          f'{asgi_p99 * 1000:>14.1f}', file=out)
+            asgi_app.shutdown()
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Бенчмарк загрузки каталога: прежний построчный цикл LoadData (SELECT категории и INSERT с commit на каждый товар)
+против потоковой пакетной загрузки CatalogImporter на сгенерированном файле из 100 000 товаров.
+Запуск из корня проекта: python -m benchmarks.bench_bulk_import
+"""
+import json
+import os
+import tempfile
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import create_schema, remove_database
+from patterns.bulk_import import CatalogImporter, iter_json_array
+from patterns.pattern_creator import Category, CategoryMapper, ProductsMapper, ProductFactory
+
+PRODUCTS = 100_000
+LEGACY_PRODUCTS = 5_000
+CATEGORIES = 50
+
+
+def generate_files(directory):
+    categories_path = os.path.join(directory, 'category.json')
+    products_path = os.path.join(directory, 'products.json')
+    with open(categories_path, 'w', encoding='utf-8') as f:
+        json.dump([{'name': f'Категория {i}', 'desc': '', 'img': ''} for i in range(CATEGORIES)], f,
+                  ensure_ascii=False)
+    with open(products_path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for i in range(PRODUCTS):
+            item = {'name': f'Товар {i}', 'category': f'Категория {i % CATEGORIES}', 'price': 100 + i % 900,
+                    'desc': f'Описание товара {i}', 'img': f'/static/img/{i}.jpg', 'product_type': 'product'}
+            f.write(('' if i == 0 else ',\n') + json.dumps(item, ensure_ascii=False))
+        f.write('\n]')
+    return categories_path, products_path
+
+
+def new_database(directory, name):
+    path = os.path.join(directory, name)
+    create_schema(path)
+    connection = connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return path, connection
+
+
+def legacy_load(connection, categories_path, products_path, limit):
+    """Прежний алгоритм LoadData.create_obj"""
+    with open(categories_path, 'r', encoding='utf-8') as f:
+        for item in json.load(f):
+            CategoryMapper(connection).insert(Category(item['name'], None))
+    with open(products_path, 'r', encoding='utf-8') as f:
+        items = json.load(f)[:limit]
+    for item in items:
+        category = CategoryMapper(connection).find_by_name(item['category'])
+        product = ProductFactory.create(item['product_type'], item['name'], int(category.id), item['price'])
+        ProductsMapper(connection).insert(product)
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='bench_import_')
+    try:
+        categories_path, products_path = generate_files(directory)
+        print(f'файл товаров: {os.path.getsize(products_path) / 1e6:.1f} МБ, {PRODUCTS} записей')
+
+        start = perf_counter()
+        with open(products_path, 'r', encoding='utf-8') as f:
+            count = sum(1 for _ in iter_json_array(f))
+        print(f'потоковый разбор json: {count / (perf_counter() - start):.0f} записей/с')
+
+        path, connection = new_database(directory, 'legacy.sqlite')
+        start = perf_counter()
+        legacy_load(connection, categories_path, products_path, LEGACY_PRODUCTS)
+        rate = LEGACY_PRODUCTS / (perf_counter() - start)
+        print(f'построчная загрузка ({LEGACY_PRODUCTS} товаров): {rate:.0f} строк/с, '
+              f'оценка для {PRODUCTS}: {PRODUCTS / rate:.1f} с')
+        connection.close()
+        remove_database(path)
+
+        for upsert in (False, True):
+            path, connection = new_database(directory, f'bulk_{upsert}.sqlite')
+            importer = CatalogImporter(connection, batch_size=5000, upsert=upsert)
+            with open(categories_path, 'r', encoding='utf-8') as f:
+                importer.import_categories(f)
+            start = perf_counter()
+            with open(products_path, 'r', encoding='utf-8') as f:
+                stats = importer.import_products(f)
+            elapsed = perf_counter() - start
+            print(f'пакетная загрузка, upsert={upsert}: {stats.inserted / elapsed:.0f} строк/с, {elapsed:.1f} с')
+            if upsert:
+                start = perf_counter()
+                with open(products_path, 'r', encoding='utf-8') as f:
+                    stats = importer.import_products(f)
+                elapsed = perf_counter() - start
+                print(f'повторная загрузка с обновлением: {stats.updated / elapsed:.0f} строк/с, {elapsed:.1f} с')
+            connection.close()
+            remove_database(path)
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
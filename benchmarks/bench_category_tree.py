@@ -0,0 +1,86 @@
+"""
+Бенчмарк дерева категорий: 1111 категорий (4 уровня по 10 подкатегорий) и 200 000 товаров.
+Сравниваются страница товаров поддерева через рекурсивный запрос по category_id и через таблицу замыканий,
+а также меню: чтение всех категорий на каждом запросе против снимка CategoryMapper.tree().
+Запуск из корня проекта: python -m benchmarks.bench_category_tree
+"""
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from patterns.pattern_creator import CategoryMapper, CategoryTree, ProductsMapper
+
+BRANCHING = 10
+LEVELS = 4
+PRODUCTS = 200_000
+REPEAT = 200
+
+RECURSIVE_PAGE = 'WITH RECURSIVE subtree (id) AS (SELECT ? UNION ALL SELECT category.id FROM category ' \
+                 'JOIN subtree ON category.category_id = subtree.id) ' \
+                 'SELECT * FROM product WHERE category_id IN (SELECT id FROM subtree) ORDER BY id LIMIT 21'
+
+
+def fill(connection):
+    """Заполняет дерево категорий по уровням, затем товары в листовых категориях"""
+    parents = [None]
+    for level in range(LEVELS):
+        children = []
+        for parent in parents:
+            for i in range(BRANCHING if parent is not None else 1):
+                cursor = connection.execute('INSERT INTO category (name, category_id, desc, img) VALUES (?, ?, "", "")',
+                                            (f'Категория {level}.{len(children)}', parent))
+                children.append(cursor.lastrowid)
+        parents = children
+    leaves = parents
+    connection.executemany('INSERT INTO product (product_type, name, category_id, price, desc, img) '
+                           'VALUES ("product", ?, ?, 100, "", "")',
+                           ((f'Товар {i}', leaves[i % len(leaves)]) for i in range(PRODUCTS)))
+    connection.commit()
+
+
+def timed(func, repeat=REPEAT):
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - start) / repeat * 1000
+
+
+def main():
+    path = temp_database(products=0, categories=0)
+    connection = connect(path)
+    try:
+        fill(connection)
+        categories = CategoryMapper(connection)
+        products = ProductsMapper(connection)
+        levels = {depth: connection.execute('SELECT descendant_id FROM category_tree WHERE ancestor_id = 1 '
+                                            'AND depth = ? LIMIT 1', (depth,)).fetchone()[0] for depth in range(LEVELS)}
+
+        print(f'{"уровень":<10}{"категорий":>10}{"рекурсивно, мс":>16}{"замыкания, мс":>16}')
+        for depth, category_id in levels.items():
+            size = len(categories.descendants(category_id, include_self=True))
+
+            def closure():
+                products.cache.clear()
+                products.page(20, category_id=category_id)
+
+            recursive = timed(lambda: connection.execute(RECURSIVE_PAGE, (category_id,)).fetchall())
+            print(f'{depth:<10}{size:>10}{recursive:>16.3f}{timed(closure):>16.3f}')
+
+        def rebuild():
+            CategoryTree(connection.execute('SELECT id, name, category_id FROM category').fetchall())
+
+        print(f'меню: построение дерева на каждый запрос {timed(rebuild, 50):.2f} мс, '
+              f'снимок tree() {timed(categories.tree):.3f} мс')
+
+        target = connection.execute('SELECT max(descendant_id) FROM category_tree WHERE ancestor_id = 1 '
+                                    'AND depth = 1').fetchone()[0]
+        start = perf_counter()
+        categories.move(categories.find_by_id(levels[2]), target)
+        print(f'перенос поддерева из {BRANCHING + 1} категорий: {(perf_counter() - start) * 1000:.2f} мс')
+    finally:
+        connection.close()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Бенчмарк сжатия ответов: байты на проводе и процессорное время на запрос для главных страниц и API
+без сжатия, с фиксированными уровнями gzip 1, 6, 9 (без кэша сжатых тел) и с настройками маршрутов (AppCompress)
+вместе с кэшем сжатых тел по ETag. Также замеряется пиковая память потокового сжатия большого ответа API.
+Запуск из корня проекта: python -m benchmarks.bench_compression
+"""
+import io
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from time import process_time
+
+from benchmarks.common import fill_catalog, temp_database, remove_database
+from framework.middleware import CompressionMiddleware
+
+REQUESTS = 300
+PATHS = ('/', '/products/', '/api/products/')
+API_PRODUCTS = 50_000
+
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+
+class FixedLevelCompression(CompressionMiddleware):
+    """Сжатие с одним уровнем для всех маршрутов и без кэша сжатых тел"""
+
+    def __init__(self, level):
+        super().__init__(level, cache_size=0)
+
+    def route_level(self, view):
+        return self.level
+
+
+def request(app, path):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'wsgi.input': io.BytesIO(),
+               'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'}
+    return sum(len(chunk) for chunk in app(environ, lambda status, headers: None))
+
+
+def measure(app, path, count=REQUESTS):
+    size = request(app, path)
+    start = process_time()
+    for _ in range(count):
+        request(app, path)
+    return size, (process_time() - start) / count * 1000
+
+
+def peak_memory(app, path):
+    tracemalloc.start()
+    size = request(app, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
+
+def main():
+    path = temp_database(products=2000)
+    out = sys.stdout
+    try:
+        with redirect_stdout(io.StringIO()):
+            import views
+            from framework.main import FrameworkApp
+            from patterns.pattern_creator import POOL
+            from urls import fronts
+
+            POOL.database = path
+            views.LOGGER.writer = NullWriter()
+            variants = [('без сжатия', FrameworkApp(views.routes, fronts))]
+            variants += [(f'gzip {level}', FrameworkApp(views.routes, fronts,
+                                                         middlewares=[FixedLevelCompression(level)]))
+                         for level in (1, 6, 9)]
+            variants.append(('AppCompress + кэш',
+                             FrameworkApp(views.routes, fronts, middlewares=[CompressionMiddleware()])))
+
+            print(f'{"вариант":<20}' + ''.join(f'{url + ", байт":>22}{"мс ЦП":>8}' for url in PATHS), file=out)
+            for title, app in variants:
+                line = f'{title:<20}'
+                for url in PATHS:
+                    size, cpu = measure(app, url)
+                    line += f'{size:>22}{cpu:>8.2f}'
+                print(line, file=out)
+
+            fill_catalog(path, API_PRODUCTS)
+            print(f'\n/api/products/ на {API_PRODUCTS + 2000} товаров, пиковая память:', file=out)
+            for title, app in (variants[0], variants[1]):
+                size, peak = peak_memory(app, '/api/products/')
+                print(f'{title:<20}{size / 1e6:>8.1f} МБ ответа{peak / 1e6:>8.1f} МБ памяти', file=out)
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Бенчмарк поиска: прежний линейный просмотр списков в памяти против индексов.
+1 000 000 пользователей (поиск по имени при входе) и 100 000 корзин (строки корзины пользователя) хранятся
+в базе данных и ищутся по первичным ключам таблиц shop_user и basket_item через UserMapper и BasketMapper;
+100 000 товаров в 1 000 категориях (товары категории) ищутся в коллекциях Engine с хэш-индексами.
+Запуск из корня проекта: python -m benchmarks.bench_engine
+"""
+import random
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from patterns.pattern_creator import BasketMapper, Buyer, Engine, RealProduct, UserMapper
+
+USERS = 1_000_000
+BASKETS = 100_000
+BASKET_ITEMS = 3
+PRODUCTS = 100_000
+CATEGORIES = 1000
+LINEAR_LOOKUPS = 20
+INDEXED_LOOKUPS = 100_000
+
+
+class LegacyBasket:
+    def __init__(self, user):
+        self.user = user
+        self.product_list = []
+
+
+def legacy_user(users, name):
+    for user in users:
+        if user.name == name:
+            return user
+    raise Exception(f'Не найден пользователь с именем {name}')
+
+
+def legacy_basket(baskets, user):
+    for basket in baskets:
+        if basket.user == user:
+            return basket
+    return None
+
+
+def legacy_category_products(products, category_id):
+    return [product for product in products if product.category_id == category_id]
+
+
+def per_call(func, args):
+    start = perf_counter()
+    for arg in args:
+        func(arg)
+    return (perf_counter() - start) / len(args) * 1e6
+
+
+def report(name, legacy, indexed):
+    print(f'{name:<26}{legacy:>14.1f}{indexed:>14.2f}{legacy / indexed:>12.0f}x')
+
+
+def fill_users(connection):
+    start = perf_counter()
+    connection.executemany('INSERT INTO shop_user (name, user_type, password_hash, created) '
+                           'VALUES (?, "buyer", "pbkdf2_sha256$1$salt$hash", 0)',
+                           ((f'user{i}',) for i in range(USERS)))
+    connection.executemany('INSERT INTO basket_item (user, product_id, quantity, created) VALUES (?, ?, 1, ?)',
+                           ((f'user{i}', item + 1, i) for i in range(BASKETS) for item in range(BASKET_ITEMS)))
+    connection.commit()
+    print(f'{USERS} пользователей и {BASKETS} корзин записано в базу за {perf_counter() - start:.1f} с')
+
+
+def main():
+    rng = random.Random(1)
+    engine = Engine()
+    path = temp_database(products=0)
+    connection = connect(path)
+    try:
+        fill_users(connection)
+        users = [Buyer(f'user{i}', 'pbkdf2_sha256$1$salt$hash') for i in range(USERS)]
+        legacy_baskets = [LegacyBasket(f'user{i}') for i in range(BASKETS)]
+
+        products = []
+        for i in range(PRODUCTS):
+            product = RealProduct(f'Товар {i}', i % CATEGORIES, 100)
+            product.id = i + 1
+            products.append(product)
+            engine.add_product(product)
+
+        print(f'{"поиск":<26}{"список, мкс":>14}{"индекс, мкс":>14}{"ускорение":>13}')
+        names = [f'user{rng.randrange(USERS)}' for _ in range(INDEXED_LOOKUPS)]
+        report('пользователь по имени', per_call(lambda name: legacy_user(users, name), names[:LINEAR_LOOKUPS]),
+               per_call(UserMapper(connection).find_by_name, names))
+
+        owners = [f'user{rng.randrange(BASKETS)}' for _ in range(INDEXED_LOOKUPS)]
+        report('корзина пользователя',
+               per_call(lambda user: legacy_basket(legacy_baskets, user), owners[:LINEAR_LOOKUPS]),
+               per_call(BasketMapper(connection).find_by_user, owners))
+
+        categories = [rng.randrange(CATEGORIES) for _ in range(INDEXED_LOOKUPS // 10)]
+        report('товары категории',
+               per_call(lambda category_id: legacy_category_products(products, category_id),
+                        categories[:LINEAR_LOOKUPS]),
+               per_call(engine.get_products_by_category, categories))
+    finally:
+        connection.close()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Бенчмарк изображений товаров: сохранение в хранилище с адресацией по содержимому, время построения миниатюр
+в запросе и в пуле процессов ThumbnailPool, а также байты изображений на странице списка из 20 товаров
+с оригиналами и с миниатюрами шириной 320 (sizes="295px" на обычном экране).
+Исходные изображения - static/img/*.jpg. Миниатюры требуют Pillow: без него замеряется только сохранение.
+Запуск из корня проекта: python -m benchmarks.bench_images
+"""
+import glob
+import os
+import shutil
+import tempfile
+from threading import Event
+from time import perf_counter
+
+from framework.images import Image, ImageStore, ThumbnailPool, make_thumbnails, THUMBNAIL_WIDTHS
+
+SOURCES = 'static/img/*.jp*g'
+PAGE_SIZE = 20
+ROUNDS = 10
+
+
+def main():
+    sources = sorted(glob.glob(SOURCES))
+    root = tempfile.mkdtemp(prefix='bench_images_')
+    store = ImageStore(root)
+    try:
+        start = perf_counter()
+        stored = [store.put_file(path) + (os.path.splitext(path)[1].lower(),) for path in sources * 2]
+        files = sum(len(names) for _, _, names in os.walk(root))
+        print(f'сохранение {len(stored)} загрузок: {(perf_counter() - start) / len(stored) * 1000:.2f} мс '
+              f'на файл, в хранилище {files} файлов: повторные загрузки не копируются')
+        stored = stored[:len(sources)]
+        if Image is None:
+            print('Pillow не установлен: миниатюры не строятся, страницы показывают оригиналы')
+            return
+
+        def targets(digest, ext):
+            return [(width, store.path(digest, ext, width)) for width in THUMBNAIL_WIDTHS]
+
+        start = perf_counter()
+        for _ in range(ROUNDS):
+            for digest, _, ext in stored:
+                make_thumbnails(store.path(digest, ext), targets(digest, ext))
+        inline = (perf_counter() - start) / (ROUNDS * len(stored)) * 1000
+        print(f'миниатюры {THUMBNAIL_WIDTHS} в рабочем процессе: {inline:.1f} мс на изображение')
+
+        done = Event()
+        results = []
+
+        def on_done(image_id, result, error):
+            results.append((image_id, result, error))
+            if len(results) == ROUNDS * len(stored):
+                done.set()
+
+        pool = ThumbnailPool(store, on_done, processes=os.cpu_count() or 2)
+        pool.submit(-1, *stored[0][::2]).result()
+        results.clear()
+        start = perf_counter()
+        for i in range(ROUNDS):
+            for digest, _, ext in stored:
+                pool.submit(i, digest, ext)
+        submitted = (perf_counter() - start) / (ROUNDS * len(stored)) * 1000
+        done.wait()
+        total = (perf_counter() - start) / (ROUNDS * len(stored)) * 1000
+        pool.shutdown()
+        errors = [error for _, _, error in results if error]
+        print(f'пул из {pool.processes} процессов: постановка в очередь {submitted:.3f} мс, '
+              f'пропускная способность {total:.1f} мс на изображение, ошибок {len(errors)}')
+
+        original = sum(size for _, size, _ in stored)
+        thumbnail = sum(os.path.getsize(store.path(digest, ext, 320)) for digest, _, ext in stored)
+        per_page = PAGE_SIZE / len(stored)
+        print(f'страница из {PAGE_SIZE} товаров: оригиналы {original * per_page / 1e3:.0f} КБ, '
+              f'миниатюры 320 {thumbnail * per_page / 1e3:.0f} КБ')
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Бенчмарк журнала на пути запроса: главная страница с записью контекста в журнал на каждый запрос.
+Сравниваются FileWriter (открытие и закрытие файла на каждую запись), AsyncFileWriter (очередь и фоновая
+запись пачками) и отфильтрованный по уровню DEBUG, когда запись не форматируется вовсе.
+Кэш ответов отключен. Запуск из корня проекта: python -m benchmarks.bench_logging
+"""
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+
+REQUESTS = 2000
+ROUNDS = 3
+
+
+def request(app, path):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'wsgi.input': io.BytesIO()}
+    for _ in app(environ, lambda status, headers: None):
+        pass
+
+
+def measure(app, logger, writer, level):
+    logger.writer = writer
+    logger.level = level
+    best = 0
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        for _ in range(REQUESTS):
+            request(app, '/')
+        if hasattr(writer, 'flush'):
+            writer.flush()
+        best = max(best, REQUESTS / (perf_counter() - start))
+    return best
+
+
+def call_cost(logger, writer, level, context, calls=20000):
+    """Время одного вызова логгера в вызывающем потоке, мкс"""
+    logger.writer = writer
+    logger.level = level
+    start = perf_counter()
+    for _ in range(calls):
+        logger.debug('Сформирована главная страница с контекстом: %s', context)
+    elapsed = perf_counter() - start
+    if hasattr(writer, 'flush'):
+        writer.flush()
+    return elapsed / calls * 1e6
+
+
+def count_lines(filename):
+    with open(filename, encoding='utf-8') as file:
+        return sum(1 for _ in file)
+
+
+def main():
+    path = temp_database(products=2000)
+    log_dir = tempfile.mkdtemp(prefix='bench_logging_')
+    out = sys.stdout
+    try:
+        with redirect_stdout(io.StringIO()):
+            import views
+            from framework.cache import TaggedCache
+            from framework.logs import AsyncFileWriter
+            from framework.main import FrameworkApp
+            from patterns.pattern_creator import POOL, FileWriter, DEBUG, INFO
+            from urls import fronts
+
+            POOL.database = path
+            app = FrameworkApp(views.routes, fronts, response_cache=TaggedCache(max_size=0))
+            request(app, '/')
+
+            sync_log = os.path.join(log_dir, 'sync.txt')
+            async_log = os.path.join(log_dir, 'async.txt')
+            async_writer = AsyncFileWriter(async_log, max_bytes=0)
+            results = [
+                ('FileWriter', measure(app, views.LOGGER, FileWriter(sync_log), DEBUG)),
+                ('AsyncFileWriter', measure(app, views.LOGGER, async_writer, DEBUG)),
+                ('уровень INFO', measure(app, views.LOGGER, async_writer, INFO)),
+            ]
+            lines = count_lines(sync_log), count_lines(async_log)
+            context = {'title': 'Главная', 'path': '/', 'product_list': list(range(50))}
+            costs = [
+                call_cost(views.LOGGER, FileWriter(os.path.join(log_dir, 'calls.txt')), DEBUG, context),
+                call_cost(views.LOGGER, async_writer, DEBUG, context),
+                call_cost(views.LOGGER, async_writer, INFO, context),
+            ]
+            async_writer.close()
+
+        print(f'{"журнал":<18}{"з/с":>10}{"вызов, мкс":>14}', file=out)
+        for (name, rps), cost in zip(results, costs):
+            print(f'{name:<18}{rps:>10.0f}{cost:>14.2f}', file=out)
+        print(f'строк в журнале: FileWriter {lines[0]}, AsyncFileWriter {lines[1]}, ожидалось {REQUESTS * ROUNDS}',
+              file=out)
+    finally:
+        remove_database(path)
+        for name in os.listdir(log_dir):
+            os.remove(os.path.join(log_dir, name))
+        os.rmdir(log_dir)
+
+
+if __name__ == '__main__':
+    main()
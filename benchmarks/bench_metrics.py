@@ -0,0 +1,79 @@
+"""
+Накладные расходы сбора метрик: одни и те же запросы без метрик (обычные соединения sqlite3)
+и с метриками (этапы запроса, SQL через TracedConnection, гистограммы и кольцевой буфер).
+Кэш ответов отключен, чтобы каждый запрос проходил все этапы.
+Запуск из корня проекта: python -m benchmarks.bench_metrics
+"""
+import io
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+
+REQUESTS = 1500
+ROUNDS = 5
+PATHS = ('/', '/products/', '/api/products/')
+
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+
+def request(app, path):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'wsgi.input': io.BytesIO()}
+    result = app(environ, lambda status, headers: None)
+    for _ in result:
+        pass
+    if hasattr(result, 'close'):
+        result.close()
+
+
+def measure(app, path):
+    start = perf_counter()
+    for _ in range(REQUESTS):
+        request(app, path)
+    return REQUESTS / (perf_counter() - start)
+
+
+def switch(pool, metrics, factory, enabled):
+    pool.release_thread()
+    pool.close_all()
+    pool.factory = factory
+    metrics.enabled = enabled
+
+
+def main():
+    path = temp_database(products=2000)
+    out = sys.stdout
+    try:
+        with redirect_stdout(io.StringIO()):
+            import views
+            from framework.cache import TaggedCache
+            from framework.main import FrameworkApp
+            from framework.metrics import METRICS, TracedConnection
+            from patterns.pattern_creator import POOL
+            from urls import fronts
+
+            POOL.database = path
+            views.LOGGER.writer = NullWriter()
+            app = FrameworkApp(views.routes, fronts, response_cache=TaggedCache(max_size=0))
+
+            print(f'{"путь":<18}{"без метрик, з/с":>18}{"с метриками, з/с":>18}{"накладные, %":>14}', file=out)
+            for url in PATHS:
+                request(app, url)
+                best_off = best_on = 0
+                for _ in range(ROUNDS):
+                    switch(POOL, METRICS, None, False)
+                    best_off = max(best_off, measure(app, url))
+                    switch(POOL, METRICS, TracedConnection, True)
+                    best_on = max(best_on, measure(app, url))
+                overhead = (best_off - best_on) / best_off * 100
+                print(f'{url:<18}{best_off:>18.0f}{best_on:>18.0f}{overhead:>14.1f}', file=out)
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
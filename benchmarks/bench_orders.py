@@ -0,0 +1,90 @@
+"""
+Бенчмарк заказов: прежнее хранение заказов списком в памяти процесса (id из счетчика класса, сумма в Python,
+поиск заказов пользователя просмотром списка) против таблиц shop_order и order_item
+(заказ из корзины одной транзакцией, сумма в SQL, поиск по индексу (user, created)).
+Измеряются рост памяти Python-объектов процесса на 20 000 заказов и время операций.
+Запуск из корня проекта: python -m benchmarks.bench_orders
+"""
+import random
+import tracemalloc
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from patterns.pattern_creator import BasketItem, BasketMapper, OrderMapper, ProductsMapper
+
+ORDERS = 20_000
+ITEMS = 5
+USERS = 2000
+LOOKUPS = 200
+
+
+class LegacyOrder:
+    id_count = 0
+
+    def __init__(self, user, product_list):
+        self.id = LegacyOrder.id_count
+        LegacyOrder.id_count += 1
+        self.user = user
+        self.product_list = product_list
+
+    def get_total_price(self):
+        return sum(item.price for item in self.product_list)
+
+
+def per_call(func, args):
+    start = perf_counter()
+    for arg in args:
+        func(arg)
+    return (perf_counter() - start) / len(args) * 1e6
+
+
+def main():
+    path = temp_database(products=1000)
+    connection = connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    rng = random.Random(1)
+    try:
+        products = ProductsMapper(connection).all()
+        baskets = [(f'user{rng.randrange(USERS)}', rng.sample(products, ITEMS)) for _ in range(ORDERS)]
+
+        tracemalloc.start()
+        start = perf_counter()
+        orders = [LegacyOrder(user, product_list) for user, product_list in baskets]
+        legacy_time = perf_counter() - start
+        legacy_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        basket_mapper, order_mapper = BasketMapper(connection), OrderMapper(connection)
+        tracemalloc.start()
+        start = perf_counter()
+        for user, product_list in baskets:
+            basket_mapper.insert_many([BasketItem(user, product.id) for product in product_list])
+            connection.commit()
+            order_mapper.create_from_basket(user)
+        sql_time = perf_counter() - start
+        sql_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print(f'{ORDERS} заказов по {ITEMS} товаров')
+        print(f'{"":<30}{"список":>14}{"SQLite":>14}')
+        print(f'{"создание заказа, мкс":<30}{legacy_time / ORDERS * 1e6:>14.1f}{sql_time / ORDERS * 1e6:>14.1f}')
+        print(f'{"рост памяти процесса, КБ":<30}{legacy_memory / 1024:>14.0f}{sql_memory / 1024:>14.0f}')
+
+        users = [f'user{rng.randrange(USERS)}' for _ in range(LOOKUPS)]
+        legacy_lookup = per_call(lambda user: [order for order in orders if order.user == user], users)
+        sql_lookup = per_call(order_mapper.find_by_user, users)
+        print(f'{"заказы пользователя, мкс":<30}{legacy_lookup:>14.1f}{sql_lookup:>14.1f}')
+
+        ids = [rng.randrange(1, ORDERS + 1) for _ in range(LOOKUPS)]
+        legacy_total = per_call(lambda _id: orders[_id - 1].get_total_price(), ids)
+        sql_total = per_call(order_mapper.total, ids)
+        print(f'{"сумма заказа, мкс":<30}{legacy_total:>14.1f}{sql_total:>14.1f}')
+    finally:
+        connection.close()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Бенчмарк уведомлений о заказе: прежняя отправка SMS и e-mail в потоке запроса против записи в outbox
+в транзакции оплаты и фоновой доставки. Шлюзы - локальные заглушки с задержкой GATEWAY_DELAY на вызов.
+Измеряются время оплаты заказа (то, что ждет покупатель) и пропускная способность фоновой доставки.
+Запуск из корня проекта: python -m benchmarks.bench_outbox
+"""
+from sqlite3 import connect
+from time import perf_counter, sleep
+
+from benchmarks.common import temp_database, remove_database
+from framework.db import ConnectionPool
+from framework.outbox import OutboxWorker
+from patterns.architect_pattern import UnitOfWork
+from patterns.pattern_creator import CardPayment, EmailOrderNotifier, Order, OrderMapper, OutboxMapper, \
+    OutboxMessage, SmsOrderNotifier, StubGateway
+
+GATEWAY_DELAY = 0.05
+CHECKOUTS = 20
+MESSAGES = 20_000
+
+
+class BenchMapperRegistry:
+    connection = None
+
+    @classmethod
+    def get_mapper(cls, obj):
+        return OutboxMapper(cls.connection) if isinstance(obj, OutboxMessage) else OrderMapper(cls.connection)
+
+
+class QuietCardPayment(CardPayment):
+    def pay(self, amount):
+        pass
+
+
+def inline_checkout(gateways):
+    """Прежняя оплата: уведомления отправляются в потоке запроса"""
+    order = Order('Покупатель', total=1000)
+    for gateway, text in gateways:
+        gateway.send([text.format(order_id=order.id, total=order.total)])
+
+
+def outbox_checkout(notifiers):
+    UnitOfWork.new_current()
+    UnitOfWork.get_current().set_mapper_registry(BenchMapperRegistry)
+    order = Order('Покупатель', total=1000)
+    order.id = 1
+    for notifier in notifiers:
+        order.attach(notifier)
+    order.pay(QuietCardPayment('1234'))
+    UnitOfWork.get_current().commit()
+
+
+def main():
+    path = temp_database(products=0)
+    connection = connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute("INSERT INTO shop_order (user, created) VALUES ('Покупатель', 0)")
+    connection.commit()
+    BenchMapperRegistry.connection = connection
+    pool = ConnectionPool(path)
+    try:
+        gateways = [(StubGateway(GATEWAY_DELAY), SmsOrderNotifier.template),
+                    (StubGateway(GATEWAY_DELAY), EmailOrderNotifier.template)]
+        start = perf_counter()
+        for _ in range(CHECKOUTS):
+            inline_checkout(gateways)
+        inline = (perf_counter() - start) / CHECKOUTS * 1000
+
+        notifiers = [SmsOrderNotifier(StubGateway(GATEWAY_DELAY)), EmailOrderNotifier(StubGateway(GATEWAY_DELAY))]
+        start = perf_counter()
+        for _ in range(CHECKOUTS):
+            outbox_checkout(notifiers)
+        queued = (perf_counter() - start) / CHECKOUTS * 1000
+        print(f'оплата заказа, задержка шлюза {GATEWAY_DELAY * 1000:.0f} мс: '
+              f'в потоке запроса {inline:.1f} мс, через outbox {queued:.2f} мс')
+
+        UnitOfWork.new_current()
+        UnitOfWork.get_current().set_mapper_registry(BenchMapperRegistry)
+        for i in range(MESSAGES):
+            OutboxMessage(notifiers[i % 2].topic, {'order_id': i, 'user': 'Покупатель', 'total': 1000}).mark_new()
+        UnitOfWork.get_current().commit()
+
+        worker = OutboxWorker(pool, threads=2, batch_size=500, poll_interval=0.05)
+        for notifier in notifiers:
+            worker.register(notifier.topic, notifier.deliver)
+        start = perf_counter()
+        worker.start()
+        while worker.pending():
+            sleep(0.05)
+        elapsed = perf_counter() - start
+        worker.stop()
+        sent = sum(len(notifier.gateway.sent) for notifier in notifiers)
+        calls = sum(notifier.gateway.calls for notifier in notifiers)
+        print(f'фоновая доставка: {sent} сообщений за {elapsed:.2f} с, {sent / elapsed:.0f} сообщений/с, '
+              f'{calls} вызовов шлюза')
+    finally:
+        pool.close_all()
+        connection.close()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
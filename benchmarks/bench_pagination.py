@@ -0,0 +1,40 @@
+"""
+Бенчмарк постраничного вывода: время выборки страницы товаров для каталога из 50 и из 500 000 товаров,
+для первой и для далекой страницы, по всему каталогу и по категории.
+Запуск из корня проекта: python -m benchmarks.bench_pagination
+"""
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from patterns.pattern_creator import ProductsMapper
+
+PAGE_SIZE = 20
+QUERIES = 500
+
+
+def measure(connection, after_id, category_id):
+    mapper = ProductsMapper(connection)
+    start = perf_counter()
+    for _ in range(QUERIES):
+        mapper.invalidate()
+        mapper.page(PAGE_SIZE, after_id=after_id, category_id=category_id)
+    return (perf_counter() - start) / QUERIES * 1000
+
+
+def main():
+    print(f'{"товаров":<10}{"страница":<12}{"все, мс":>10}{"категория, мс":>16}')
+    for products in (50, 500_000):
+        path = temp_database(products=products)
+        connection = connect(path)
+        try:
+            for title, after_id in (('первая', None), ('далекая', products * 9 // 10)):
+                print(f'{products:<10}{title:<12}{measure(connection, after_id, None):>10.3f}'
+                      f'{measure(connection, after_id, 3):>16.3f}')
+        finally:
+            connection.close()
+            remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Многопоточный бенчмарк доступа к таблицам product и category:
+одно общее соединение под блокировкой (прежняя схема) против пула соединений.
+Запуск из корня проекта: python -m benchmarks.bench_pool
+"""
+from sqlite3 import connect
+from threading import Lock, Thread
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from framework.db import ConnectionPool
+
+THREADS = (1, 4, 8, 16)
+QUERIES_PER_THREAD = 400
+
+
+def workload(connection, i):
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM product WHERE category_id=? LIMIT 20', (i % 20 + 1,))
+    cursor.fetchall()
+    cursor.execute('SELECT COUNT(*), MAX(price) FROM product WHERE category_id=?', (i % 20 + 1,))
+    cursor.fetchone()
+    cursor.execute('SELECT * FROM category')
+    cursor.fetchall()
+
+
+def run_threads(threads, target):
+    workers = [Thread(target=target) for _ in range(threads)]
+    start = perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * QUERIES_PER_THREAD / (perf_counter() - start)
+
+
+def shared_connection(path, threads):
+    connection = connect(path, check_same_thread=False)
+    lock = Lock()
+
+    def target():
+        for i in range(QUERIES_PER_THREAD):
+            with lock:
+                workload(connection, i)
+
+    result = run_threads(threads, target)
+    connection.close()
+    return result
+
+
+def pooled(path, threads):
+    pool = ConnectionPool(path, max_size=threads)
+
+    def target():
+        connection = pool.get_connection()
+        for i in range(QUERIES_PER_THREAD):
+            workload(connection, i)
+        pool.release_thread()
+
+    result = run_threads(threads, target)
+    pool.close_all()
+    return result
+
+
+def main():
+    path = temp_database(products=20_000)
+    try:
+        print(f'{"потоки":<10}{"общее соединение, з/с":>24}{"пул, з/с":>12}')
+        for threads in THREADS:
+            print(f'{threads:<10}{shared_connection(path, threads):>24.0f}{pooled(path, threads):>12.0f}')
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Нагрузочный стенд HTTP-серверов: однопоточный wsgiref против prefork-сервера с разным числом процессов.
+Сервер запускается в дочернем процессе, клиенты из пула потоков держат соединения keep-alive.
+Запуск из корня проекта: python -m benchmarks.bench_prefork
+"""
+import io
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from http.client import HTTPConnection
+from time import perf_counter, sleep
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+from benchmarks.common import temp_database, remove_database
+
+PORT = 18181
+WORKERS = (0, 1, 2, 4)
+CLIENTS = 16
+REQUESTS = 800
+PATHS = ('/', '/products/')
+
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def start_server(app, workers, warm_up):
+    """Запускает сервер в дочернем процессе; workers=0 - однопоточный wsgiref"""
+    pid = os.fork()
+    if pid:
+        return pid
+    try:
+        sys.stdout = io.StringIO()
+        if workers:
+            from framework.server import PreforkServer
+            PreforkServer(app, '127.0.0.1', PORT, workers=workers, warm_up=warm_up).serve_forever()
+        else:
+            warm_up()
+            with make_server('127.0.0.1', PORT, app, handler_class=QuietHandler) as httpd:
+                signal.signal(signal.SIGTERM, lambda signum, frame: os._exit(0))
+                httpd.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def wait_ready():
+    for _ in range(100):
+        try:
+            connection = HTTPConnection('127.0.0.1', PORT, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            sleep(0.05)
+    raise RuntimeError('сервер не запустился')
+
+
+def client(path, count):
+    connection = HTTPConnection('127.0.0.1', PORT, timeout=10)
+    latencies = []
+    for _ in range(count):
+        start = perf_counter()
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(perf_counter() - start)
+        if response.will_close:
+            connection.close()
+            connection = HTTPConnection('127.0.0.1', PORT, timeout=10)
+    connection.close()
+    return latencies
+
+
+def run_clients(path):
+    per_client = REQUESTS // CLIENTS
+    with ThreadPoolExecutor(max_workers=CLIENTS) as executor:
+        start = perf_counter()
+        results = list(executor.map(client, [path] * CLIENTS, [per_client] * CLIENTS))
+        elapsed = perf_counter() - start
+    latencies = [latency for result in results for latency in result]
+    return len(latencies) / elapsed, percentile(latencies, 0.99)
+
+
+def main():
+    path = temp_database(products=2000)
+    out = sys.stdout
+    try:
+        with redirect_stdout(io.StringIO()):
+            import views
+            from framework.main import FrameworkApp
+            from framework.templator import TemplateEngine
+            from patterns.pattern_creator import POOL, MapperRegistry
+            from urls import fronts
+
+            POOL.database = path
+            views.LOGGER.writer = NullWriter()
+            app = FrameworkApp(views.routes, fronts)
+
+            def warm_up():
+                TemplateEngine.warm_up()
+                MapperRegistry.get_current_mapper('category').all()
+                POOL.release_thread()
+                POOL.close_all()
+
+        print(f'{"сервер":<14}{"путь":<14}{"з/с":>10}{"p99, мс":>10}', file=out)
+        for workers in WORKERS:
+            name = f'prefork x{workers}' if workers else 'wsgiref'
+            pid = start_server(app, workers, warm_up)
+            try:
+                wait_ready()
+                for url in PATHS:
+                    rps, p99 = run_clients(url)
+                    print(f'{name:<14}{url:<14}{rps:>10.0f}{p99 * 1000:>10.1f}', file=out)
+            finally:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Бенчмарк объектов запроса и ответа: прежний словарь запроса (строка запроса разбирается сразу,
+передние контроллеры year и user выполняются на каждом запросе, ответ - кортеж) против Request и Response
+со __slots__, ленивым разбором и ленивыми передними контроллерами.
+Измеряются время подготовки запроса и ответа и число блоков памяти, выделенных на один запрос и удерживаемых им.
+Запуск из корня проекта: python -m benchmarks.bench_request_objects
+"""
+import io
+import sys
+from datetime import date
+from time import perf_counter
+
+from framework.main import FrameworkApp, lazy_front
+from framework.requests import parse_query_string
+
+REQUESTS = 20000
+ROUNDS = 5
+AUTH_USER = 'Анонимный'
+
+
+def legacy_year(request):
+    request['year'] = date.today().year
+
+
+def legacy_user(request):
+    request['user'] = AUTH_USER
+
+
+@lazy_front('year')
+def lazy_year(request):
+    return date.today().year
+
+
+@lazy_front('user')
+def lazy_user(request):
+    return AUTH_USER
+
+
+def legacy_request(environ):
+    """Прежняя подготовка запроса: словарь, разбор строки запроса и все передние контроллеры сразу"""
+    request = {}
+    request['method'] = environ['REQUEST_METHOD']
+    request['path'] = environ['PATH_INFO']
+    request['if_none_match'] = environ.get('HTTP_IF_NONE_MATCH', '')
+    request['request_params'] = parse_query_string(environ)
+    request['path_params'] = {}
+    for front in (legacy_year, legacy_user):
+        front(request)
+    return request
+
+
+def legacy_response(result):
+    code, body = result[0], result[1]
+    if code == '302 Found':
+        return code, body, []
+    return code, [('Content-Type', 'text/html')], body
+
+
+def make_environ(query):
+    return {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/products/', 'QUERY_STRING': query, 'wsgi.input': io.BytesIO()}
+
+
+def legacy_cycle(environ, view):
+    request = legacy_request(environ)
+    return request, legacy_response(view(request))
+
+
+def make_cycle(app):
+    def cycle(environ, view):
+        request = app.request_class(environ, environ['PATH_INFO'])
+        for front in app.fronts:
+            front(request)
+        return request, app.make_response(view(request))
+    return cycle
+
+
+def redirect_view(request):
+    return '302 Found', [('Location', '/')]
+
+
+def page_view(request):
+    return '200 OK', f'{request.get("year")} {request.get("user")} {request.get("request_params").get("page")}'
+
+
+def timing(cycle, environ, view):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        for _ in range(REQUESTS):
+            cycle(environ, view)
+        best = min(best, (perf_counter() - start) / REQUESTS)
+    return best * 1e6
+
+
+def blocks(cycle, environ, view, count=2000):
+    """Количество блоков памяти, удерживаемых запросом и ответом"""
+    kept = []
+    before = sys.getallocatedblocks()
+    for _ in range(count):
+        kept.append(cycle(environ, view))
+    return (sys.getallocatedblocks() - before) / count
+
+
+def main():
+    app = FrameworkApp({}, [lazy_year, lazy_user])
+    cycle = make_cycle(app)
+    environ = make_environ('page=2&sort=price&per_page=20')
+
+    print(f'{"представление":<28}{"прежний, мкс":>14}{"Request, мкс":>14}{"блоков было":>13}{"стало":>8}')
+    for name, view in [('редирект, контекст не нужен', redirect_view), ('страница с year, user, page', page_view)]:
+        legacy_time, new_time = timing(legacy_cycle, environ, view), timing(cycle, environ, view)
+        legacy_blocks, new_blocks = blocks(legacy_cycle, environ, view), blocks(cycle, environ, view)
+        print(f'{name:<28}{legacy_time:>14.2f}{new_time:>14.2f}{legacy_blocks:>13.1f}{new_blocks:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Бенчмарк разбора параметров запроса: прежний разбор (split('=') и декодирование значений через quopri)
+против framework.requests.parse_qs на маленькой форме с кириллицей, на большой ASCII-форме
+и на строке запроса без кодированных символов. Отдельно измеряется скорость потокового разбора
+multipart/form-data с файлом. Запуск из корня проекта: python -m benchmarks.bench_request_parser
+"""
+import io
+from quopri import decodestring
+from time import perf_counter
+from urllib.parse import quote_plus
+
+from framework.requests import MultipartParser, parse_qs
+
+ROUNDS = 5
+UPLOAD_SIZE = 8 * 1024 * 1024
+
+
+def legacy_parse(data):
+    """Прежний разбор: значения с '=' внутри и ключи без '=' приводили к ValueError"""
+    result = {}
+    if data:
+        for item in data.split('&'):
+            key, value = item.split('=')
+            result[key] = value
+    return result
+
+
+def legacy_decode(value):
+    value_bytes = bytes(value.replace('%', '=').replace('+', ' '), 'UTF-8')
+    return decodestring(value_bytes).decode('UTF-8')
+
+
+def legacy(data):
+    return {key: legacy_decode(value) for key, value in legacy_parse(data).items()}
+
+
+def best_rate(func, data, calls):
+    best = 0
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        for _ in range(calls):
+            func(data)
+        best = max(best, calls / (perf_counter() - start))
+    return best
+
+
+def multipart_body(size):
+    boundary = 'BenchBoundary'
+    payload = bytes(range(256)) * (size // 256)
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="name"\r\n\r\nТовар\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="img"; filename="a.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + payload + f'\r\n--{boundary}--\r\n'.encode()
+    return boundary, body
+
+
+def main():
+    small = '&'.join(f'{key}={quote_plus(value)}' for key, value in
+                     [('name', 'Швабра обычная'), ('desc', 'Для уборки дома и офиса'), ('price', '150'),
+                      ('category_id', '3'), ('product_type', 'product')])
+    large = '&'.join(f'field{i}=value+{i}' for i in range(500))
+    plain = 'page=2&per_page=20&sort=price&fields=id,name,price'
+
+    assert legacy(small) == parse_qs(small)
+    print(f'{"данные":<22}{"прежний, р/с":>14}{"parse_qs, р/с":>15}{"ускорение":>11}')
+    for name, data, calls in [('маленькая форма', small, 20000), ('500 полей', large, 200),
+                              ('строка запроса', plain, 50000)]:
+        old, new = best_rate(legacy, data, calls), best_rate(parse_qs, data, calls)
+        print(f'{name:<22}{old:>14.0f}{new:>15.0f}{new / old:>10.1f}x')
+
+    boundary, body = multipart_body(UPLOAD_SIZE)
+    best = 0
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        data, files = MultipartParser(io.BytesIO(body), boundary, len(body)).parse()
+        elapsed = perf_counter() - start
+        files['img'].close()
+        best = max(best, len(body) / elapsed / 1024 / 1024)
+    print(f'multipart, файл {UPLOAD_SIZE // 1024 // 1024} МБ: {best:.0f} МБ/с')
+
+
+if __name__ == '__main__':
+    main()
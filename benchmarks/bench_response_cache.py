@@ -0,0 +1,64 @@
+"""
+Бенчмарк кэша ответов: рендер страницы на каждый запрос, ответ из кэша и повторная проверка по ETag (304).
+Запуск из корня проекта: python -m benchmarks.bench_response_cache
+"""
+import io
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+
+REQUESTS = 2000
+PATHS = ('/', '/products/', '/products/category/3/')
+
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+
+def request(app, path, etag=None):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'wsgi.input': io.BytesIO()}
+    if etag:
+        environ['HTTP_IF_NONE_MATCH'] = etag
+    headers = {}
+    body = b''.join(app(environ, lambda status, response_headers: headers.update(response_headers)))
+    return headers.get('ETag'), body
+
+
+def measure(app, path, revalidate=False):
+    etag, _ = request(app, path)
+    etag = etag if revalidate else None
+    start = perf_counter()
+    for _ in range(REQUESTS):
+        request(app, path, etag)
+    return REQUESTS / (perf_counter() - start)
+
+
+def main():
+    path = temp_database(products=2000)
+    out = sys.stdout
+    try:
+        with redirect_stdout(io.StringIO()):
+            import views
+            from framework.cache import TaggedCache
+            from framework.main import FrameworkApp
+            from patterns.pattern_creator import POOL
+            from urls import fronts
+
+            POOL.database = path
+            views.LOGGER.writer = NullWriter()
+            uncached = FrameworkApp(views.routes, fronts, response_cache=TaggedCache(max_size=0))
+            cached = FrameworkApp(views.routes, fronts)
+
+            print(f'{"путь":<24}{"без кэша, з/с":>16}{"из кэша, з/с":>16}{"304, з/с":>12}', file=out)
+            for url in PATHS:
+                print(f'{url:<24}{measure(uncached, url):>16.0f}{measure(cached, url):>16.0f}'
+                      f'{measure(cached, url, revalidate=True):>12.0f}', file=out)
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Бенчмарк маршрутизатора: поиск по текущей таблице маршрутов приложения
+и по синтетической таблице из 1000 маршрутов (статических и с параметрами).
+Запуск из корня проекта: python -m benchmarks.bench_router
+"""
+from time import perf_counter
+
+from framework.router import Router, RouteNotFound
+
+ITERATIONS = 200_000
+
+
+def view(request):
+    return '200 OK', ''
+
+
+def synthetic_routes(count=1000):
+    routes = {}
+    for i in range(count // 2):
+        routes[f'/section-{i}/page/'] = view
+        routes[f'/section-{i}/items/<int:id>/'] = view
+    return routes
+
+
+def measure(router, paths):
+    start = perf_counter()
+    for i in range(ITERATIONS):
+        path = paths[i % len(paths)]
+        try:
+            router.match(path, 'GET')
+        except RouteNotFound:
+            pass
+    elapsed = perf_counter() - start
+    return elapsed / ITERATIONS * 1e9
+
+
+def legacy_lookup(routes, paths):
+    """Прежний поиск: точное совпадение в словаре routes"""
+    start = perf_counter()
+    for i in range(ITERATIONS):
+        path = paths[i % len(paths)]
+        if path in routes:
+            routes[path]
+    elapsed = perf_counter() - start
+    return elapsed / ITERATIONS * 1e9
+
+
+def main():
+    from views import routes
+
+    app_paths = list(routes) + ['/products/category/3/', '/missing/']
+    app_router = Router(routes)
+    print(f'маршруты приложения ({len(routes)}): dict {legacy_lookup(routes, app_paths):.0f} нс, '
+          f'Router {measure(app_router, app_paths):.0f} нс на поиск')
+
+    big = synthetic_routes()
+    big_router = Router(big)
+    static_paths = [f'/section-{i}/page/' for i in range(0, 500, 7)]
+    dynamic_paths = [f'/section-{i}/items/{i * 3}/' for i in range(0, 500, 7)]
+    print(f'1000 маршрутов, статические пути: {measure(big_router, static_paths):.0f} нс на поиск')
+    print(f'1000 маршрутов, пути с параметрами: {measure(big_router, dynamic_paths):.0f} нс на поиск')
+    print(f'1000 маршрутов, 404: {measure(big_router, ["/section-1/unknown/x/"]):.0f} нс на поиск')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Бенчмарк выборок по каталогу из 1 000 000 товаров: исходная схема (без индексов, цена строкой)
+против схемы после миграций (индексы по category_id и name, цена целым числом).
+Запуск из корня проекта: python -m benchmarks.bench_schema
+"""
+import os
+import tempfile
+from sqlite3 import connect
+from time import perf_counter
+
+from create_db import migrate, get_migrations, MIGRATIONS_DIR
+from benchmarks.common import fill_catalog, remove_database
+
+PRODUCTS = 1_000_000
+CATEGORIES = 1000
+QUERIES = 200
+
+
+def create_database(directory, version):
+    """Создает базу со схемой заданной версии"""
+    path = os.path.join(directory, f'schema_{version}.sqlite')
+    migrations = os.path.join(directory, f'migrations_{version}')
+    os.makedirs(migrations)
+    for number, source in get_migrations(MIGRATIONS_DIR):
+        if number <= version:
+            os.symlink(source, os.path.join(migrations, os.path.basename(source)))
+    migrate(path, migrations)
+    fill_catalog(path, products=PRODUCTS, categories=CATEGORIES)
+    return path
+
+
+def measure(connection, statement, params):
+    start = perf_counter()
+    for i in range(QUERIES):
+        connection.execute(statement, params(i)).fetchall()
+    return (perf_counter() - start) / QUERIES * 1000
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='bench_schema_')
+    queries = [
+        ('find_by_category', 'SELECT * FROM product WHERE category_id=?', lambda i: (i % CATEGORIES + 1,)),
+        ('товар по имени', 'SELECT * FROM product WHERE name=?', lambda i: (f'Товар {i * 4999}',)),
+        ('find_by_name', 'SELECT * FROM category WHERE name=?', lambda i: (f'Категория {i % CATEGORIES + 1}',)),
+        ('сумма цен категории', 'SELECT SUM(price) FROM product WHERE category_id=?', lambda i: (i % CATEGORIES + 1,)),
+    ]
+    try:
+        before = connect(create_database(directory, 1))
+        after = connect(create_database(directory, max(number for number, _ in get_migrations())))
+        print(f'{"запрос":<24}{"до, мс":>10}{"после, мс":>12}')
+        for title, statement, params in queries:
+            print(f'{title:<24}{measure(before, statement, params):>10.2f}{measure(after, statement, params):>12.2f}')
+        before.close()
+        after.close()
+    finally:
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                for link in os.listdir(path):
+                    os.remove(os.path.join(path, link))
+                os.rmdir(path)
+            else:
+                remove_database(path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк поиска товаров на 1 000 000 товаров: SearchMapper (FTS5, BM25) против LIKE '%...%' по названию и описанию.
+Названия и описания собираются из случайных слов словаря, чтобы запросы находили разное количество товаров.
+LIKE возвращает первые попавшиеся 20 строк без ранжирования и без учета ё, поэтому на частых словах
+он останавливается рано, а на редких и отсутствующих сканирует всю таблицу.
+Запуск из корня проекта: python -m benchmarks.bench_search
+"""
+import random
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from patterns.pattern_creator import SearchMapper
+
+PRODUCTS = 1_000_000
+REPEAT = 20
+NOUNS = ('молоток', 'лопата', 'ведро', 'плед', 'полка', 'вешалка', 'качели', 'гирлянда', 'тарелка', 'кастрюля',
+         'сковорода', 'щетка', 'швабра', 'корзина', 'табурет', 'зеркало', 'лампа', 'подушка', 'одеяло', 'штора')
+ADJECTIVES = ('садовый', 'стальной', 'деревянный', 'пластиковый', 'большой', 'малый', 'складной', 'белый',
+              'черный', 'красный', 'зеленый', 'металлический', 'стеклянный', 'плетеный', 'мягкий', 'ёлочный')
+RARE = tuple(f'артикул{i}' for i in range(1000))
+QUERIES = ('артикул777', 'стальн кастрюл', 'плетен корзин', 'ёлочн', 'зеркало')
+
+
+def describe(rnd):
+    words = [rnd.choice(ADJECTIVES), rnd.choice(NOUNS)]
+    if rnd.random() < 0.01:
+        words.append(rnd.choice(RARE))
+    return ' '.join(words)
+
+
+def fill(path):
+    rnd = random.Random(1)
+    connection = connect(path)
+    connection.executemany('INSERT INTO product (product_type, name, category_id, price, desc, img) '
+                           'VALUES ("product", ?, 1, ?, ?, "")',
+                           ((describe(rnd), 100 + i % 5000, f'{describe(rnd)}, {describe(rnd)}')
+                            for i in range(PRODUCTS)))
+    connection.commit()
+    connection.close()
+
+
+def like_search(connection, text, limit=20):
+    """Прежний способ поиска: сканирование таблицы, каждое слово должно встретиться в названии или описании"""
+    words = text.lower().split()
+    where = ' AND '.join('(lower(name) LIKE ? OR lower(desc) LIKE ?)' for _ in words)
+    params = [value for word in words for value in (f'%{word}%', f'%{word}%')]
+    return connection.execute(f'SELECT * FROM product WHERE {where} LIMIT ?', params + [limit]).fetchall()
+
+
+def timed(func, repeat=REPEAT):
+    start = perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    path = temp_database(products=0)
+    try:
+        start = perf_counter()
+        fill(path)
+        print(f'заполнение {PRODUCTS} товаров вместе с индексом FTS5: {perf_counter() - start:.1f} с')
+        connection = connect(path)
+        mapper = SearchMapper(connection)
+        total = f'SELECT COUNT(*) FROM {SearchMapper.index} WHERE {SearchMapper.index} MATCH ?'
+
+        print(f'{"запрос":<20}{"найдено":>9}{"FTS5, мс":>10}{"стр. 100, мс":>14}{"LIKE, мс":>10}{"найдено LIKE":>14}')
+        for text in QUERIES:
+            found = connection.execute(total, (mapper.match_query(text),)).fetchone()[0]
+
+            def search(page=1):
+                mapper.cache.clear()
+                return mapper.search(text, page)
+
+            fts, _ = timed(search)
+            deep, _ = timed(lambda: search(100))
+            like, rows = timed(lambda: like_search(connection, text), repeat=3)
+            print(f'{text:<20}{found:>9}{fts:>10.2f}{deep:>14.2f}{like:>10.1f}{len(rows):>14}')
+        connection.close()
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
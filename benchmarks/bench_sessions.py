@@ -0,0 +1,53 @@
+"""
+Бенчмарк хранилищ сессий: время загрузки и записи сессии с пользователем и корзиной в памяти процесса,
+в общей памяти (mmap) и в SQLite, а также проверка подписи cookie.
+Запуск из корня проекта: python -m benchmarks.bench_sessions
+"""
+import secrets
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from framework.db import ConnectionPool
+from framework.sessions import MemorySessionStore, SessionManager, SharedMemorySessionStore, SqliteSessionStore
+
+SESSIONS = 2000
+MAX_AGE = 3600
+
+
+def measure(store, sids, data):
+    start = perf_counter()
+    for sid in sids:
+        store.save(sid, data, MAX_AGE)
+    saved = perf_counter() - start
+    start = perf_counter()
+    for sid in sids:
+        assert store.load(sid) == data
+    loaded = perf_counter() - start
+    return saved / len(sids) * 1e6, loaded / len(sids) * 1e6
+
+
+def main():
+    path = temp_database(products=0)
+    pool = ConnectionPool(path)
+    try:
+        sids = [secrets.token_urlsafe(24) for _ in range(SESSIONS)]
+        data = {'user': 'Покупатель', 'basket': list(range(20))}
+        print(f'{"хранилище":<14}{"запись, мкс":>13}{"загрузка, мкс":>15}')
+        for name, store in [('memory', MemorySessionStore()), ('shared', SharedMemorySessionStore()),
+                            ('sqlite', SqliteSessionStore(pool))]:
+            saved, loaded = measure(store, sids, data)
+            print(f'{name:<14}{saved:>13.1f}{loaded:>15.1f}')
+
+        manager = SessionManager(MemorySessionStore(), secret=secrets.token_bytes(32))
+        cookies = [f'{sid}.{manager.sign(sid)}' for sid in sids]
+        start = perf_counter()
+        for cookie in cookies:
+            manager.unsign(cookie)
+        print(f'проверка подписи cookie: {(perf_counter() - start) / len(cookies) * 1e6:.1f} мкс')
+    finally:
+        pool.close_all()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Бенчмарк статических файлов на prefork-сервере: прежний путь через стек представлений (файл читается в Python
+и возвращается телом ответа) против middleware StaticFiles (манифест, sendfile, условные запросы).
+Измеряются запросы в секунду для маленького файла, 4 МБ файла и повторной проверки по ETag (304).
+Запуск из корня проекта: python -m benchmarks.bench_static
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+from http.client import HTTPConnection
+from time import perf_counter, sleep
+
+from framework.main import FrameworkApp
+from framework.requests import Response
+from framework.static import StaticFiles, StaticManifest
+from urls import fronts
+
+PORT = 18182
+REQUESTS = {'small.png': 3000, 'large.bin': 200}
+LARGE_SIZE = 4 * 1024 * 1024
+
+
+class FileView:
+    """Прежний способ: файл читается целиком и проходит через передние контроллеры приложения и представление"""
+    directory = ''
+
+    def __call__(self, request):
+        name = request.path.rstrip('/').rsplit('/', 1)[-1]
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return Response(f.read(), content_type='application/octet-stream')
+
+
+def start_server(app):
+    pid = os.fork()
+    if pid:
+        return pid
+    try:
+        sys.stdout = io.StringIO()
+        from framework.server import PreforkServer
+        PreforkServer(app, '127.0.0.1', PORT, workers=1).serve_forever()
+    finally:
+        os._exit(0)
+
+
+def wait_ready():
+    for _ in range(100):
+        try:
+            connection = HTTPConnection('127.0.0.1', PORT, timeout=1)
+            connection.request('GET', '/legacy/small.png')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            sleep(0.05)
+    raise RuntimeError('сервер не запустился')
+
+
+def rate(path, count, headers=None):
+    connection = HTTPConnection('127.0.0.1', PORT, timeout=10)
+    start = perf_counter()
+    for _ in range(count):
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+    elapsed = perf_counter() - start
+    connection.close()
+    return count / elapsed, response
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='bench_static_')
+    shutil.copy('templates/style/back.png', os.path.join(directory, 'small.png'))
+    with open(os.path.join(directory, 'large.bin'), 'wb') as f:
+        f.write(os.urandom(LARGE_SIZE))
+    FileView.directory = directory
+    manifest = StaticManifest({'/static/': directory})
+    manifest.build()
+    app = StaticFiles(FrameworkApp({'/legacy/<name>/': FileView()}, fronts), manifest)
+    pid = start_server(app)
+    try:
+        wait_ready()
+        print(f'{"файл":<12}{"представление, р/с":>20}{"StaticFiles, р/с":>18}')
+        for name, count in REQUESTS.items():
+            legacy, _ = rate(f'/legacy/{name}', count)
+            static, response = rate(f'/static/{name}', count)
+            print(f'{name:<12}{legacy:>20.0f}{static:>18.0f}')
+        etag = response.getheader('ETag')
+        revalidated, response = rate('/static/large.bin', REQUESTS['small.png'], {'If-None-Match': etag})
+        print(f'повторная проверка large.bin по ETag: {revalidated:.0f} р/с, ответ {response.status}')
+    finally:
+        os.kill(pid, 15)
+        os.waitpid(pid, 0)
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
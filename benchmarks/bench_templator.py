@@ -0,0 +1,97 @@
+"""
+Бенчмарк шаблонизатора: сравнение рендера с созданием окружения на каждый вызов (холодный режим)
+и рендера через общий для процесса TemplateEngine (теплый режим). Оба окружения получают те же глобальные
+функции и кэш фрагментов, что и приложение; версии данных для кэша фрагментов читаются из временной базы.
+Запуск из корня проекта: python -m benchmarks.bench_templator
+"""
+import shutil
+import tempfile
+from time import perf_counter
+
+from jinja2 import FileSystemLoader
+from jinja2.environment import Environment
+
+from benchmarks.common import temp_database, remove_database
+from framework.static import STATIC_MANIFEST
+from framework.templator import FragmentCacheExtension, TemplateEngine, render
+from patterns.pattern_creator import CategoryTree, Page, POOL
+
+ITERATIONS = 300
+
+
+class FakeItem:
+    def __init__(self, _id, name):
+        self.id = _id
+        self.name = name
+        self.desc = f'Описание {name}'
+        self.img = f'/static/img/{_id}.jpg'
+        self.price = 100 + _id
+
+
+PRODUCTS = [FakeItem(i, f'Товар {i}') for i in range(20)]
+
+CONTEXT = {
+    'title': 'Продукты',
+    'year': 2022,
+    'path': '/products/',
+    'user': 'Анонимный',
+    'product_list': PRODUCTS,
+    'category_list': [FakeItem(i, f'Категория {i}') for i in range(5)],
+    'category_tree': CategoryTree([(i, f'Категория {i}', None) for i in range(1, 6)], version=1),
+    'category_path': [],
+    'page': Page(PRODUCTS, has_next=True),
+    'page_query': '',
+}
+
+
+def product_images(products):
+    """Изображения товаров без обращения к базе данных"""
+    return {}
+
+TEMPLATES = ['index.html', 'products.html', 'contact.html']
+
+
+def cold_render(template_name, context, folder='templates'):
+    """Прежняя реализация render: новое окружение на каждый вызов"""
+    env = Environment(extensions=[FragmentCacheExtension])
+    env.loader = FileSystemLoader(folder)
+    env.globals['static_url'] = STATIC_MANIFEST.url
+    env.globals['product_images'] = product_images
+    return env.get_template(template_name).render(**context)
+
+
+def measure(func, template_name):
+    start = perf_counter()
+    for _ in range(ITERATIONS):
+        func(template_name, CONTEXT)
+    elapsed = perf_counter() - start
+    return ITERATIONS / elapsed
+
+
+def main():
+    bytecode_dir = tempfile.mkdtemp(prefix='jinja_bc_')
+    path = temp_database(products=0)
+    POOL.database = path
+    TemplateEngine.register_global('product_images', product_images)
+    try:
+        print(f'{"шаблон":<16}{"холодный, р/с":>16}{"теплый, р/с":>16}{"байт-код, р/с":>16}')
+        for template_name in TEMPLATES:
+            cold = measure(cold_render, template_name)
+
+            TemplateEngine.configure(bytecode_dir='')
+            warm = measure(render, template_name)
+
+            TemplateEngine.configure(bytecode_dir=bytecode_dir)
+            bytecode = measure(render, template_name)
+
+            print(f'{template_name:<16}{cold:>16.0f}{warm:>16.0f}{bytecode:>16.0f}')
+    finally:
+        shutil.rmtree(bytecode_dir, ignore_errors=True)
+        POOL.release_thread()
+        POOL.close_all()
+        remove_database(path)
+        TemplateEngine.configure(bytecode_dir='')
+
+
+if __name__ == '__main__':
+    main()
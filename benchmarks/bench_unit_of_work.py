@@ -0,0 +1,66 @@
+"""
+Бенчмарк фиксации UnitOfWork для 10 000 измененных объектов:
+прежняя схема (UPDATE и commit на каждый объект) против пакетной фиксации одной транзакцией.
+Запуск из корня проекта: python -m benchmarks.bench_unit_of_work
+"""
+from sqlite3 import connect
+from time import perf_counter
+
+from benchmarks.common import temp_database, remove_database
+from patterns.architect_pattern import UnitOfWork
+from patterns.pattern_creator import ProductsMapper, ProductFactory
+
+OBJECTS = 10_000
+
+
+class BenchMapperRegistry:
+    connection = None
+
+    @classmethod
+    def get_mapper(cls, obj):
+        return ProductsMapper(cls.connection)
+
+
+def main():
+    path = temp_database(products=OBJECTS)
+    connection = connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    BenchMapperRegistry.connection = connection
+    try:
+        products = ProductsMapper(connection).all()
+
+        start = perf_counter()
+        mapper = ProductsMapper(connection)
+        for product in products:
+            product.desc = product.desc + '!'
+            mapper.update(product)
+        legacy = perf_counter() - start
+        print(f'по одному объекту: {legacy:.2f} с, {OBJECTS / legacy:.0f} объектов/с')
+
+        UnitOfWork.new_current()
+        UnitOfWork.get_current().set_mapper_registry(BenchMapperRegistry)
+        start = perf_counter()
+        for product in products:
+            product.desc = product.desc + '!'
+            product.mark_dirty()
+        UnitOfWork.get_current().commit()
+        batched = perf_counter() - start
+        print(f'UnitOfWork.commit: {batched:.2f} с, {OBJECTS / batched:.0f} объектов/с')
+
+        new_products = [ProductFactory.create('product', f'Новый {i}', 1, 10) for i in range(OBJECTS)]
+        start = perf_counter()
+        for product in new_products:
+            product.mark_new()
+        for product in new_products[::10]:
+            product.mark_removed()
+        UnitOfWork.get_current().commit()
+        elapsed = perf_counter() - start
+        print(f'UnitOfWork.commit вставки: {elapsed:.2f} с, {OBJECTS / elapsed:.0f} объектов/с')
+    finally:
+        connection.close()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Общие функции бенчмарков: создание временной базы данных с тестовым каталогом"""
+import os
+import tempfile
+from sqlite3 import connect
+
+from create_db import migrate
+
+
+def create_schema(path):
+    """Создает таблицы приложения в базе path"""
+    migrate(path)
+
+
+def fill_catalog(path, products=10_000, categories=20):
+    """
+    Заполняет базу тестовыми категориями и товарами
+    :param path: путь к файлу базы данных
+    :param products: количество товаров
+    :param categories: количество категорий
+    """
+    connection = connect(path)
+    connection.executemany('INSERT INTO category (name, category_id, desc, img) VALUES (?, NULL, "", "")',
+                           ((f'Категория {i}',) for i in range(1, categories + 1)))
+    connection.executemany('INSERT INTO product (product_type, name, category_id, price, desc, img) '
+                           'VALUES ("product", ?, ?, ?, ?, "")',
+                           ((f'Товар {i}', i % categories + 1, 100 + i % 5000, f'Описание товара {i}')
+                            for i in range(products)))
+    connection.commit()
+    connection.close()
+
+
+def temp_database(products=10_000, categories=20):
+    """
+    Создает временную базу данных с каталогом
+    :return: путь к файлу базы данных
+    """
+    fd, path = tempfile.mkstemp(prefix='bench_', suffix='.sqlite')
+    os.close(fd)
+    create_schema(path)
+    fill_catalog(path, products, categories)
+    return path
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
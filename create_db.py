@@ -1,9 +1,62 @@
+"""Применение миграций схемы базы данных"""
+import os
+import re
 from sqlite3 import connect
 
-connection = connect('store.sqlite')
-curs = connection.cursor()
-with open('create_db.sql', 'r') as f:
-    text = f.read()
-curs.executescript(text)
-curs.close()
-connection.close()
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_NAME = re.compile(r'^(\d+)_.*\.sql$')
+
+
+def get_migrations(directory=MIGRATIONS_DIR):
+    """
+    Находит файлы миграций вида 0001_name.sql
+    :param directory: папка с миграциями
+    :return: список пар (номер версии, путь к файлу), упорядоченный по версии
+    """
+    migrations = []
+    for name in os.listdir(directory):
+        match = MIGRATION_NAME.match(name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(migrations)
+
+
+def get_version(connection):
+    return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(database='store.sqlite', directory=MIGRATIONS_DIR):
+    """
+    Доводит схему базы данных до последней версии. Номер примененной миграции хранится в PRAGMA user_version,
+    каждая миграция выполняется в отдельной транзакции вместе с обновлением версии
+    :param database: путь к файлу базы данных
+    :param directory: папка с миграциями
+    :return: список примененных версий
+    """
+    connection = connect(database)
+    applied = []
+    try:
+        version = get_version(connection)
+        for number, path in get_migrations(directory):
+            if number <= version:
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            try:
+                connection.executescript(f'BEGIN;\n{text}\nPRAGMA user_version = {number};\nCOMMIT;')
+            except Exception:
+                if connection.in_transaction:
+                    connection.rollback()
+                raise
+            applied.append(number)
+    finally:
+        connection.close()
+    return applied
+
+
+if __name__ == '__main__':
+    versions = migrate()
+    if versions:
+        print(f'Применены миграции: {", ".join(map(str, versions))}')
+    else:
+        print('Схема базы данных актуальна')
@@ -19,3 +19,13 @@ class DbUpdateException(Exception):
 class DbDeleteException(Exception):
     def __init__(self, message):
         super().__init__(f'Ошибка удаления данных: {message}')
+
+
+class DbPoolTimeoutException(Exception):
+    def __init__(self, message):
+        super().__init__(f'Превышено время ожидания соединения с БД: {message}')
+
+
+class DuplicateKeyException(Exception):
+    def __init__(self, message):
+        super().__init__(f'Запись с таким ключом уже существует: {message}')
@@ -0,0 +1,239 @@
+"""Асинхронная точка входа фреймворка (ASGI)"""
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from framework.main import FrameworkApp
+from framework.middleware import build_chain
+from framework.static import StaticFiles
+
+
+class AsgiFrameworkApp:
+    """
+    ASGI-вариант FrameworkApp с теми же маршрутами и передними контроллерами.
+    Представления с async def выполняются в цикле событий. Синхронные представления вместе
+    с передними контроллерами и чтением тела ответа выполняются в ограниченном пуле потоков,
+    чтобы блокирующие вызовы мапперов не останавливали цикл событий
+    """
+
+    def __init__(self, routes, fronts, max_workers=8, middlewares=(), startup=(), static_manifest=None):
+        """
+        :param routes: словарь маршрутов
+        :param fronts: список передних контроллеров
+        :param max_workers: размер пула потоков для синхронных представлений
+        :param middlewares: список middleware, как у FrameworkApp
+        :param startup: функции запуска (миграции, прогрев), выполняются один раз в пуле потоков
+            при событии lifespan.startup или, если сервер не поддерживает lifespan, перед первым запросом
+        :param static_manifest: манифест статических файлов; запросы к его префиксам отдает WSGI-middleware
+            StaticFiles в пуле потоков, None - статика не отдается
+        """
+        self.app = FrameworkApp(routes, fronts, middlewares=middlewares)
+        self.static = StaticFiles(self.app, static_manifest) if static_manifest is not None else None
+        self.max_workers = max_workers
+        self.executor = None
+        self.startup = list(startup)
+        self.started = False
+        self.start_lock = asyncio.Lock()
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='asgi-view')
+        return self.executor
+
+    async def start(self):
+        """Выполняет функции запуска, если они еще не выполнены"""
+        if self.started:
+            return
+        async with self.start_lock:
+            if self.started:
+                return
+            loop = asyncio.get_running_loop()
+            for func in self.startup:
+                await loop.run_in_executor(self.get_executor(), func)
+            self.started = True
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    @staticmethod
+    async def read_body(receive):
+        """Считывает тело запроса целиком"""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    @staticmethod
+    def wsgi_str(value):
+        """
+        Путь из scope уже раскодирован из %XX и представлен строкой UTF-8; в WSGI (PEP 3333) путь передается
+        байтами, прочитанными как latin-1, как его формирует wsgiref
+        """
+        return value.encode('utf-8').decode('latin-1')
+
+    @staticmethod
+    def build_environ(scope, body):
+        """
+        Преобразует ASGI scope в словарь переменных окружения WSGI, который понимает FrameworkApp
+        :param scope: ASGI scope
+        :param body: тело запроса
+        :return: словарь переменных окружения
+        """
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': AsgiFrameworkApp.wsgi_str(scope.get('root_path', '')),
+            'PATH_INFO': AsgiFrameworkApp.wsgi_str(scope['path']),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+        }
+        server = scope.get('server')
+        if server:
+            environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1])
+        client = scope.get('client')
+        if client:
+            environ['REMOTE_ADDR'] = client[0]
+        for name, value in scope.get('headers', []):
+            key = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if key == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif key != 'CONTENT_LENGTH':
+                key = f'HTTP_{key}'
+                environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    @staticmethod
+    def start_message(response):
+        return {
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers]
+        }
+
+    def run_static(self, environ, send, loop):
+        """
+        Выполняется в потоке пула: отдает статический файл через StaticFiles. Файл читается блоками,
+        каждый блок отправляется с ожиданием, как тело синхронного представления
+        """
+        def push(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            push({'type': 'http.response.start', 'status': int(status[:3]),
+                  'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+
+        body = self.static.serve(environ, start_response, environ['PATH_INFO'])
+        try:
+            for chunk in body:
+                if chunk:
+                    push({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        push({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    @staticmethod
+    def is_async(view):
+        return inspect.iscoroutinefunction(view) or inspect.iscoroutinefunction(getattr(view, '__call__', None))
+
+    def run_sync(self, request, view, send, loop, trace=None):
+        """
+        Выполняется в потоке пула: передние контроллеры, представление и отправка тела ответа.
+        Тело читается в том же потоке, что и представление, поэтому генераторы, читающие курсор,
+        работают со своим соединением. Каждая часть ответа отправляется с ожиданием, что дает
+        обратное давление на медленных клиентов
+        """
+        def push(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        self.app.metrics.attach(trace)
+        response = self.app.respond(request, view)
+        push(self.start_message(response))
+        body = self.app.encode_body(response.body)
+        route = self.app.route_name(view)
+        for chunk in self.app.metrics.track_body(trace, route, request.method, response.status, body):
+            if chunk:
+                push({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        push({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def run_async(self, request, view, send, trace=None):
+        """
+        Выполняет async-представление в цикле событий. Middleware применяются к уже готовому ответу:
+        цепочка синхронная, а итерируемое тело (например, потоковое сжатие) читается в пуле потоков
+        """
+        try:
+            self.app.run_fronts(request)
+            response = self.app.make_response(await view(request))
+            response = build_chain(self.app.middlewares, lambda request, view: response)(request, view)
+            if request.method == 'HEAD':
+                self.app.drop_body(response)
+            self.app.finish(request, response)
+        except Exception:
+            self.app.fail(request)
+            raise
+        body = response.body
+        await send(self.start_message(response))
+        if hasattr(body, '__aiter__'):
+            async for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        else:
+            loop = asyncio.get_running_loop()
+            chunks = iter(self.app.encode_body(body))
+            while True:
+                chunk = await loop.run_in_executor(self.get_executor(), next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        self.app.metrics.end(trace, self.app.route_name(view), request.method, response.status)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.start()
+                except Exception as err:
+                    await send({'type': 'lifespan.startup.failed', 'message': repr(err)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        await self.start()
+        body = await self.read_body(receive)
+        if self.static is not None and scope['path'].startswith(self.static.prefixes):
+            loop = asyncio.get_running_loop()
+            environ = self.build_environ(scope, body)
+            await loop.run_in_executor(self.get_executor(), self.run_static, environ, send, loop)
+            return
+        trace = self.app.metrics.begin()
+        request, view = self.app.build_request(self.build_environ(scope, body))
+
+        if self.is_async(view):
+            await self.run_async(request, view, send, trace)
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.get_executor(), self.run_sync, request, view, send, loop, trace)
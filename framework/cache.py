@@ -0,0 +1,215 @@
+"""Кэши фреймворка"""
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock, RLock
+from time import monotonic
+
+
+class LRUCache:
+    """
+    Потокобезопасный кэш с ограничением размера (вытесняются давно не использованные записи)
+    и временем жизни записей. Ведет счетчики попаданий и промахов
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        """
+        :param max_size: максимальное количество записей
+        :param ttl: время жизни записи в секундах, None - без ограничения
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Возвращает значение по ключу
+        :param key: ключ
+        :param default: значение при отсутствии или устаревании записи
+        """
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > monotonic():
+                    self.data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self.forget(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """
+        Сохраняет значение
+        :param key: ключ
+        :param value: значение
+        :param ttl: время жизни записи, по умолчанию ttl кэша
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            self.data[key] = (value, expires)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.forget(next(iter(self.data)))
+
+    def forget(self, key):
+        """Удаляет запись; вызывается под блокировкой"""
+        self.data.pop(key, None)
+
+    def delete(self, key):
+        with self.lock:
+            self.forget(key)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        """Возвращает счетчики кэша"""
+        return {'size': len(self.data), 'hits': self.hits, 'misses': self.misses}
+
+
+class TaggedCache(LRUCache):
+    """
+    LRU-кэш, записи которого помечаются тегами. Все записи с тегом сбрасываются разом,
+    например при изменении таблицы, из которой собраны страницы.
+    invalidate сбрасывает записи только в текущем процессе; чтобы записи других процессов сервера тоже
+    устаревали, ключ дополняется версиями данных тегов из источника version_source (см. versioned)
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        super().__init__(max_size, ttl)
+        self.lock = RLock()
+        self.tags = {}
+        self.key_tags = {}
+        self.version_source = None
+
+    def versioned(self, key, tags):
+        """
+        Дополняет ключ версиями данных, от которых зависит запись
+        :param key: ключ
+        :param tags: теги записи
+        :return: ключ; без тегов или без источника версий - исходный
+        """
+        if self.version_source is None or not tags:
+            return key
+        return key, self.version_source(tuple(tags))
+
+    def set(self, key, value, ttl=None, tags=()):
+        """
+        Сохраняет значение
+        :param key: ключ
+        :param value: значение
+        :param ttl: время жизни записи, по умолчанию ttl кэша
+        :param tags: теги записи
+        """
+        with self.lock:
+            self.forget(key)
+            tags = tuple(tags)
+            if tags:
+                self.key_tags[key] = tags
+                for tag in tags:
+                    self.tags.setdefault(tag, set()).add(key)
+            super().set(key, value, ttl)
+
+    def forget(self, key):
+        super().forget(key)
+        for tag in self.key_tags.pop(key, ()):
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def invalidate(self, *tags):
+        """
+        Сбрасывает записи с любым из тегов
+        :param tags: теги
+        :return: количество сброшенных записей
+        """
+        with self.lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self.tags.get(tag, ()))
+            for key in keys:
+                self.forget(key)
+        return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.tags.clear()
+            self.key_tags.clear()
+
+
+class CachePolicy:
+    """Параметры кэширования ответов представления"""
+
+    def __init__(self, ttl=60, tags=(), vary_user=True, params=None):
+        """
+        :param ttl: время жизни ответа в кэше, секунды
+        :param tags: теги, по которым ответ сбрасывается при изменении данных
+        :param vary_user: хранить отдельный ответ для каждого пользователя
+        :param params: параметры запроса, от которых зависит ответ; остальные не создают отдельных записей.
+            None - все параметры
+        """
+        self.ttl = ttl
+        self.tags = tuple(tags)
+        self.vary_user = vary_user
+        self.params = None if params is None else frozenset(params)
+
+    def make_key(self, request):
+        """
+        Ключ ответа: путь, все значения учитываемых параметров запроса и, при необходимости, пользователь
+        :param request: запрос
+        :return: ключ кэша
+        """
+        query = request.query
+        names = sorted(query if self.params is None else self.params.intersection(query))
+        params = tuple((name, tuple(query.getlist(name))) for name in names)
+        user = request.get('user') if self.vary_user else None
+        return request.path, params, user
+
+
+def make_etag(body):
+    """Вычисляет ETag по содержимому тела ответа"""
+    return f'"{blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(header, etag):
+    """
+    Проверяет заголовок If-None-Match
+    :param header: значение заголовка, может содержать несколько тегов через запятую
+    :param etag: текущий ETag ответа
+    """
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+RESPONSE_CACHE = TaggedCache(max_size=512, ttl=60)
+FRAGMENT_CACHE = TaggedCache(max_size=256, ttl=300)
+
+
+def set_version_source(source):
+    """
+    Задает источник версий данных для кэшей страниц и фрагментов
+    :param source: функция, которая по кортежу тегов возвращает кортеж их текущих версий
+    """
+    RESPONSE_CACHE.version_source = source
+    FRAGMENT_CACHE.version_source = source
+
+
+def invalidate_tags(*tags):
+    """Сбрасывает закэшированные страницы и фрагменты шаблонов с указанными тегами"""
+    RESPONSE_CACHE.invalidate(*tags)
+    FRAGMENT_CACHE.invalidate(*tags)
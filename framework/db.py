@@ -0,0 +1,241 @@
+"""Пул соединений с базой данных SQLite"""
+import os
+from contextlib import contextmanager
+from sqlite3 import connect, Error
+from threading import Condition, local
+from time import monotonic
+
+from errors import DbPoolTimeoutException
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000
+}
+
+
+class Lease:
+    """
+    Соединение, закрепленное за потоком. Возвращается в пул после запроса (ConnectionRelease), явно через
+    ConnectionPool.release_thread или при завершении потока
+    """
+
+    def __init__(self, pool, connection):
+        self.pool = pool
+        self.connection = connection
+        self.generation = pool.generation
+
+    def release(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            if self.generation == self.pool.generation:
+                self.pool.release(connection)
+
+    def __del__(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Пул соединений. Каждый поток получает собственное соединение на время работы,
+    общее число соединений ограничено max_size: при исчерпании пула поток ждет освобождения соединения
+    """
+
+    def __init__(self, database, max_size=8, timeout=5.0, pragmas=None, check_interval=30.0, factory=None):
+        """
+        :param database: путь к файлу базы данных
+        :param max_size: максимальное количество открытых соединений
+        :param timeout: время ожидания свободного соединения, секунды
+        :param pragmas: PRAGMA, применяемые к каждому новому соединению
+        :param check_interval: через сколько секунд простоя соединение проверяется перед выдачей
+        :param factory: класс соединения sqlite3
+        """
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.check_interval = check_interval
+        self.factory = factory
+        self.condition = Condition()
+        self.idle = []
+        self.size = 0
+        self.local = local()
+        self.generation = 0
+        os.register_at_fork(after_in_child=self.reset)
+
+    def create_connection(self):
+        """Открывает новое соединение и применяет к нему PRAGMA"""
+        kwargs = {'check_same_thread': False}
+        if self.factory is not None:
+            kwargs['factory'] = self.factory
+        connection = connect(self.database, **kwargs)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name}={value}')
+        return connection
+
+    @staticmethod
+    def is_healthy(connection):
+        """Проверяет, что соединение живо и не находится в незавершенной транзакции"""
+        try:
+            connection.execute('SELECT 1').fetchone()
+        except Error:
+            return False
+        return not connection.in_transaction
+
+    @staticmethod
+    def close_connection(connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def acquire(self, timeout=None):
+        """
+        Выдает соединение из пула, при необходимости открывая новое
+        :param timeout: время ожидания свободного соединения, по умолчанию self.timeout
+        :return: соединение sqlite3
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.idle:
+                    connection, released_at = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    connection = None
+                    break
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise DbPoolTimeoutException(f'нет свободных соединений из {self.max_size}')
+                self.condition.wait(remaining)
+
+        if connection is not None:
+            if monotonic() - released_at < self.check_interval or self.is_healthy(connection):
+                return connection
+            self.close_connection(connection)
+
+        try:
+            return self.create_connection()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, connection):
+        """
+        Возвращает соединение в пул. Незавершенная транзакция откатывается
+        :param connection: соединение, полученное через acquire
+        """
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Error:
+            self.close_connection(connection)
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            return
+        with self.condition:
+            self.idle.append((connection, monotonic()))
+            self.condition.notify()
+
+    def get_connection(self):
+        """Возвращает соединение, закрепленное за текущим потоком"""
+        lease = getattr(self.local, 'lease', None)
+        if lease is None or lease.connection is None:
+            lease = Lease(self, self.acquire())
+            self.local.lease = lease
+        return lease.connection
+
+    def release_thread(self):
+        """Возвращает в пул соединение текущего потока"""
+        lease = getattr(self.local, 'lease', None)
+        if lease is not None:
+            lease.release()
+            self.local.lease = None
+
+    def detach(self):
+        """
+        Открепляет соединение от текущего потока: следующий вызов get_connection в этом потоке получит
+        соединение заново
+        :return: Lease или None; вернуть соединение в пул должен вызвавший через lease.release()
+        """
+        lease = getattr(self.local, 'lease', None)
+        self.local.lease = None
+        return lease if lease is not None and lease.connection is not None else None
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер, выдающий соединение на время блока with"""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close_all(self):
+        """Закрывает все простаивающие соединения"""
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.condition.notify_all()
+        for connection, _ in idle:
+            self.close_connection(connection)
+
+    def reset(self):
+        """
+        Забывает все соединения без их закрытия. Вызывается в дочернем процессе после fork:
+        соединения SQLite нельзя использовать в двух процессах одновременно
+        """
+        self.generation += 1
+        self.condition = Condition()
+        self.idle = []
+        self.size = 0
+        self.local = local()
+
+
+class ConnectionRelease:
+    """
+    Передний контроллер, который после ответа возвращает в пул соединение потока запроса, чтобы долгоживущие
+    потоки сервера не удерживали соединения между запросами. Потоковое тело ответа читает из базы при отправке,
+    поэтому для него соединение возвращается после отправки тела. Если представление или middleware бросили
+    исключение, соединение возвращается сразу (fail). Должен стоять последним в списке контроллеров
+    """
+
+    def __init__(self, pool):
+        """
+        :param pool: пул соединений ConnectionPool
+        """
+        self.pool = pool
+
+    def __call__(self, request):
+        pass
+
+    def finish(self, request, response):
+        lease = self.pool.detach()
+        if lease is None:
+            return
+        if isinstance(response.body, (str, bytes, list, tuple)):
+            lease.release()
+        else:
+            response.body = self.release_after(response.body, lease)
+
+    def fail(self, request):
+        lease = self.pool.detach()
+        if lease is not None:
+            lease.release()
+
+    @staticmethod
+    def release_after(body, lease):
+        try:
+            yield from body
+        finally:
+            lease.release()
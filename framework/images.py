@@ -0,0 +1,208 @@
+"""
+Изображения: хранилище файлов с адресацией по содержимому и уменьшенные копии (миниатюры),
+которые строятся в отдельных процессах, чтобы не занимать рабочие процессы сервера.
+Миниатюры требуют Pillow; без него в хранилище попадают только оригиналы
+"""
+import atexit
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+from threading import Lock
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+IMAGE_ROOT = 'static/img/store'
+IMAGE_URL = '/static/img/store/'
+THUMBNAIL_WIDTHS = (160, 320, 640)
+THUMBNAIL_QUALITY = 82
+IMAGE_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP', '.gif': 'PNG'}
+BLOCK_SIZE = 256 * 1024
+
+
+def thumbnail_ext(ext):
+    """Расширение миниатюры: анимированный gif уменьшается до первого кадра в png"""
+    return '.png' if ext == '.gif' else ext
+
+
+class ImageStore:
+    """
+    Хранилище изображений с адресацией по содержимому: файл называется хэшем своего содержимого,
+    поэтому одинаковые загрузки хранятся один раз, а адрес файла никогда не меняет содержимое.
+    Файлы раскладываются по подпапкам первых символов хэша: static/img/store/ab/abcd....jpg,
+    миниатюры лежат рядом: abcd....w320.jpg
+    """
+
+    def __init__(self, root=IMAGE_ROOT, url_prefix=IMAGE_URL):
+        """
+        :param root: папка хранилища
+        :param url_prefix: адрес папки хранилища для шаблонов
+        """
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def relative(self, digest, ext, width=None):
+        name = f'{digest}.w{width}{thumbnail_ext(ext)}' if width else f'{digest}{ext}'
+        return f'{digest[:2]}/{name}'
+
+    def path(self, digest, ext, width=None):
+        """Путь к оригиналу или к миниатюре шириной width"""
+        return os.path.join(self.root, *self.relative(digest, ext, width).split('/'))
+
+    def url(self, digest, ext, width=None):
+        return self.url_prefix + self.relative(digest, ext, width)
+
+    def put(self, file, ext):
+        """
+        Сохраняет файл в хранилище, считая хэш при копировании
+        :param file: файловый объект, открытый в двоичном режиме
+        :param ext: расширение файла с точкой
+        :return: кортеж (хэш, размер в байтах)
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = blake2b(digest_size=16)
+        size = 0
+        temp_path = os.path.join(self.root, f'.upload-{os.getpid()}-{id(file)}')
+        try:
+            with open(temp_path, 'wb') as temp:
+                for block in iter(lambda: file.read(BLOCK_SIZE), b''):
+                    digest.update(block)
+                    temp.write(block)
+                    size += len(block)
+            digest = digest.hexdigest()
+            path = self.path(digest, ext)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return digest, size
+
+    def put_file(self, path):
+        """Копирует в хранилище файл с диска, например изображение из каталога для загрузки"""
+        with open(path, 'rb') as f:
+            return self.put(f, os.path.splitext(path)[1].lower())
+
+    def remove(self, digest, ext, widths=THUMBNAIL_WIDTHS):
+        for width in (None,) + tuple(widths):
+            try:
+                os.remove(self.path(digest, ext, width))
+            except FileNotFoundError:
+                pass
+
+
+def make_thumbnails(source, targets, quality=THUMBNAIL_QUALITY):
+    """
+    Строит миниатюры изображения. Выполняется в процессе пула, поэтому принимает и возвращает только простые значения.
+    Миниатюры не шире оригинала не строятся
+    :param source: путь к оригиналу
+    :param targets: список пар (ширина, путь миниатюры)
+    :param quality: качество JPEG и WEBP
+    :return: кортеж (ширина, высота оригинала, список ширин построенных миниатюр)
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        made = []
+        for target_width, path in targets:
+            if target_width >= width:
+                continue
+            thumbnail = image.copy()
+            thumbnail.thumbnail((target_width, height), Image.LANCZOS)
+            image_format = IMAGE_FORMATS.get(os.path.splitext(path)[1].lower(), 'PNG')
+            if image_format == 'JPEG' and thumbnail.mode not in ('RGB', 'L'):
+                thumbnail = thumbnail.convert('RGB')
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            thumbnail.save(temp_path, format=image_format, quality=quality, optimize=True)
+            os.replace(temp_path, path)
+            made.append(target_width)
+    return width, height, made
+
+
+IMAGE_STORE = ImageStore()
+
+
+class ThumbnailPool:
+    """
+    Пул процессов для построения миниатюр. Процессы создаются при первой задаче через forkserver:
+    дочерний процесс не наследует потоки, сокеты и соединения с БД рабочего процесса сервера.
+    Результат передается функции on_done(image_id, результат make_thumbnails или None, ошибка или None),
+    которая вызывается в служебном потоке пула
+    """
+
+    def __init__(self, store, on_done, processes=2, widths=THUMBNAIL_WIDTHS, logger=None):
+        """
+        :param store: хранилище изображений ImageStore
+        :param on_done: функция записи результата
+        :param processes: количество процессов, 0 - миниатюры не строятся
+        :param widths: ширины миниатюр
+        :param logger: логгер для ошибок записи результата; без него ошибки пишутся в stderr
+        """
+        self.store = store
+        self.on_done = on_done
+        self.processes = processes
+        self.widths = tuple(widths)
+        self.logger = logger
+        self.executor = None
+        self.lock = Lock()
+        atexit.register(self.shutdown)
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    @property
+    def enabled(self):
+        return Image is not None and self.processes > 0
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+                self.executor = ProcessPoolExecutor(self.processes, mp_context=context)
+            return self.executor
+
+    def submit(self, image_id, digest, ext):
+        """
+        Ставит в очередь построение миниатюр изображения
+        :return: Future или None, если миниатюры отключены
+        """
+        if not self.enabled:
+            return None
+        targets = [(width, self.store.path(digest, ext, width)) for width in self.widths]
+        future = self.get_executor().submit(make_thumbnails, self.store.path(digest, ext), targets)
+        future.add_done_callback(lambda done: self.complete(image_id, done))
+        return future
+
+    def complete(self, image_id, future):
+        try:
+            result, error = future.result(), None
+        except Exception as err:
+            result, error = None, repr(err)
+        try:
+            self.on_done(image_id, result, error)
+        except Exception as err:
+            self.report('Ошибка записи миниатюр изображения %s: %r', image_id, err)
+
+    def report(self, text, *args):
+        if self.logger is not None:
+            self.logger.error(text, *args)
+        else:
+            sys.stderr.write(text % args + '\n')
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def after_fork(self):
+        """Пул процессов родителя не переходит в дочерний процесс: он создаст собственный при первой задаче"""
+        self.executor = None
+        self.lock = Lock()
@@ -0,0 +1,187 @@
+"""Фоновая запись журнала в файл"""
+import atexit
+import os
+import sys
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+from time import monotonic
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STOP = object()
+
+
+class AsyncFileWriter:
+    """
+    Неблокирующая запись журнала: записи складываются в очередь, фоновый поток пишет их в файл пачками.
+    Пачка записывается, когда набралось batch_size записей или прошло flush_interval секунд с первой записи пачки.
+    Записи приводятся к строке (и форматируются) уже в фоновом потоке.
+    Файл ротируется по размеру: log.txt -> log.txt.1 -> ... -> log.txt.<backup_count>.
+    Рабочие процессы пишут в общий файл, ротация выполняется под блокировкой файла log.txt.lock:
+    ротирует только первый процесс, заметивший превышение размера, остальные переоткрывают новый файл.
+    При завершении процесса очередь дописывается до конца
+    """
+
+    def __init__(self, filename='log.txt', max_bytes=10 * 1024 * 1024, backup_count=5, batch_size=512,
+                 flush_interval=0.2):
+        """
+        :param filename: файл журнала
+        :param max_bytes: размер файла, после которого он ротируется, 0 - без ротации
+        :param backup_count: количество хранимых старых файлов
+        :param batch_size: максимальное количество записей в одной пачке
+        :param flush_interval: сколько секунд копить пачку, прежде чем записать ее
+        """
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = SimpleQueue()
+        self.thread = None
+        self.file = None
+        self.closed = False
+        self.lock = Lock()
+        self.write_lock = Lock()
+        atexit.register(self.close)
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def write(self, record):
+        """
+        Ставит запись в очередь
+        :param record: строка или объект, приводимый к строке при записи
+        """
+        if self.thread is None:
+            if self.closed:
+                self.write_batch([record])
+                return
+            self.start()
+        self.queue.put(record)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name='log-writer', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            batch = [record]
+            deadline = monotonic() + self.flush_interval
+            while record is not STOP and len(batch) < self.batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=remaining)
+                except Empty:
+                    break
+                batch.append(record)
+            if record is STOP:
+                self.write_batch(batch[:-1])
+                return
+            self.write_batch(batch)
+
+    @staticmethod
+    def format(record):
+        try:
+            return f'{record}\n'
+        except Exception as err:
+            return f'Ошибка форматирования записи журнала: {err!r}\n'
+
+    def write_batch(self, batch):
+        """Записывает пачку одним системным вызовом"""
+        if not batch:
+            return
+        data = ''.join(map(self.format, batch)).encode('utf-8')
+        with self.write_lock:
+            try:
+                self.ensure_file(len(data))
+                self.file.write(data)
+            except OSError as err:
+                sys.stderr.write(f'Не удалось записать журнал {self.filename}: {err}\n')
+
+    def ensure_file(self, incoming):
+        """Открывает файл журнала, переоткрывает его после ротации другим процессом и ротирует по размеру"""
+        if self.file is not None:
+            try:
+                moved = os.stat(self.filename).st_ino != os.fstat(self.file.fileno()).st_ino
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                self.close_file()
+        if self.file is None:
+            self.file = open(self.filename, 'ab', buffering=0)
+        if self.max_bytes and os.fstat(self.file.fileno()).st_size + incoming > self.max_bytes:
+            self.rotate(incoming)
+
+    def rotate(self, incoming=0):
+        """
+        Ротирует файл под блокировкой, общей для процессов. Под блокировкой файл переоткрывается и размер
+        проверяется заново: если другой процесс уже ротировал файл, повторная ротация сдвинула бы
+        свежий файл в архив и вытеснила бы старые записи
+        """
+        with open(f'{self.filename}.lock', 'ab') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            self.close_file()
+            self.file = open(self.filename, 'ab', buffering=0)
+            if os.fstat(self.file.fileno()).st_size + incoming > self.max_bytes:
+                self.close_file()
+                self.shift_files()
+                self.file = open(self.filename, 'ab', buffering=0)
+
+    def shift_files(self):
+        if self.backup_count:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f'{self.filename}.{index}'
+                if os.path.exists(source):
+                    os.replace(source, f'{self.filename}.{index + 1}')
+            if os.path.exists(self.filename):
+                os.replace(self.filename, f'{self.filename}.1')
+        else:
+            open(self.filename, 'wb').close()
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def flush(self, timeout=None):
+        """Дожидается записи всех поставленных в очередь записей и перезапускает фоновый поток"""
+        self.close(timeout)
+        self.closed = False
+
+    def close(self, timeout=None):
+        """Дописывает очередь и останавливает фоновый поток"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+            self.closed = True
+        if thread is not None:
+            self.queue.put(STOP)
+            thread.join(timeout)
+        leftover = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except Empty:
+                break
+            if record is not STOP:
+                leftover.append(record)
+        self.write_batch(leftover)
+        with self.write_lock:
+            self.close_file()
+
+    def after_fork(self):
+        """
+        В дочернем процессе поток записи не существует, а очередь содержит записи, которые допишет родитель:
+        начинаем с пустой очереди и собственного файла
+        """
+        self.queue = SimpleQueue()
+        self.thread = None
+        self.file = None
+        self.lock = Lock()
+        self.write_lock = Lock()
@@ -1,70 +1,256 @@
 """Главный модуль фреймворка"""
-from quopri import decodestring
+from time import perf_counter_ns
 
-from framework.requests import PostRequest, GetRequest
+from framework.cache import RESPONSE_CACHE, make_etag, etag_matches
+from framework.metrics import METRICS
+from framework.middleware import build_chain
+from framework.requests import Request, Response, BadRequest, RequestTooLarge
+from framework.router import Router, RouteNotFound, MethodNotAllowed
+
+
+def lazy_front(name):
+    """
+    Декоратор переднего контроллера, который не выполняется на каждом запросе, а вычисляет значение
+    контекста запроса при первом обращении к request[name]. Функция получает запрос и возвращает значение
+    :param name: ключ контекста запроса
+    """
+    def decorator(func):
+        func.lazy_name = name
+        return func
+
+    return decorator
 
 
 class PageNotFound404:
     """Класс-описывает обработку запроса к несуществующей странице"""
 
     def __call__(self, request):
-        return '404 WHAT', 'Page not found'
+        return Response('Page not found', '404 WHAT')
+
+
+class MethodNotAllowed405:
+    """Класс-описывает обработку запроса с неподдерживаемым методом, заголовок Allow перечисляет допустимые"""
+
+    def __init__(self, allowed=()):
+        self.allowed = allowed
+
+    def __call__(self, request):
+        return Response('Method not allowed', 405, [('Allow', ', '.join(self.allowed))])
+
+
+class RequestError:
+    """Класс-описывает ответ на запрос, который не удалось разобрать (400) или который слишком велик (413)"""
+
+    def __call__(self, request):
+        code, text = request.error
+        return Response.text(text, code)
 
 
 class FrameworkApp:
     """Класс-основа фреймворка"""
 
-    def __init__(self, routes, fronts):
+    def __init__(self, routes, fronts, response_cache=RESPONSE_CACHE, metrics=METRICS, middlewares=()):
+        """
+        :param routes: словарь маршрутов
+        :param fronts: список передних контроллеров; объявленные через lazy_front выполняются при обращении,
+            метод finish(request, response) контроллера, если он есть, вызывается после формирования ответа,
+            метод fail(request) - если обработка запроса завершилась исключением
+        :param response_cache: кэш ответов представлений с cache_policy
+        :param metrics: сборщик метрик
+        :param middlewares: список middleware(request, view, get_response) вокруг передних контроллеров,
+            кэша ответов и представления; первый в списке - внешний (см. framework.middleware)
+        """
         self.routes = routes
-        self.fronts = fronts
+        self.fronts = [front for front in fronts if not hasattr(front, 'lazy_name')]
+        self.lazy_fronts = {front.lazy_name: front for front in fronts if hasattr(front, 'lazy_name')}
+        self.request_class = Request.with_lazy(self.lazy_fronts)
+        self.finishers = [front.finish for front in fronts if hasattr(front, 'finish')]
+        self.failers = [front.fail for front in fronts if hasattr(front, 'fail')]
+        self.response_cache = response_cache
+        self.metrics = metrics
+        self.metrics.register_cache('response', response_cache)
+        self.router = Router(routes)
+        self.not_found = PageNotFound404()
+        self.request_error = RequestError()
+        self.middlewares = list(middlewares)
+        self.handler = build_chain(self.middlewares, self.get_response)
 
-    def __call__(self, environ, start_response):
-        path = environ['PATH_INFO']
-
-        if not path.endswith('/'):
-            path = path + '/'
-
-        request = {}
-        method = environ['REQUEST_METHOD']
-        request['method'] = method
-        request['path'] = path
-
-        if method == 'POST':
-            data = PostRequest().get_request_params(environ)
-            request['data'] = self.decode_value(data)
-            print(f"Получен POST-запрос: {request['data']}")
-        elif method == "GET":
-            request_params = GetRequest().get_request_params(environ)
-            request['request_params'] = self.decode_value(request_params)
-            print(f"Получен GET-запрос: {request['request_params']}")
-
-        if path in self.routes:
-            view = self.routes[path]
-        else:
-            view = PageNotFound404()
+    def resolve(self, path, method):
+        """
+        Находит представление для запроса
+        :param path: нормализованный путь запроса
+        :param method: метод запроса
+        :return: кортеж (представление, словарь параметров пути)
+        """
+        start = perf_counter_ns()
+        try:
+            return self.router.match(path, method)
+        except RouteNotFound:
+            return self.not_found, {}
+        except MethodNotAllowed as err:
+            return MethodNotAllowed405(err.allowed), {}
+        finally:
+            self.metrics.span('route', perf_counter_ns() - start)
 
+    def build_request(self, environ):
+        """
+        Создает запрос и находит для него представление. Параметры и тело запроса разбираются лениво
+        :param environ: переменные окружения
+        :return: кортеж (запрос, представление)
+        """
+        start = perf_counter_ns()
+        path = Router.normalize(environ['PATH_INFO'])
+        request = self.request_class(environ, path)
+        self.metrics.span('parse', perf_counter_ns() - start)
+
+        view, request.path_params = self.resolve(path, request.method)
+        return request, view
+
+    def run_fronts(self, request):
+        start = perf_counter_ns()
         for front in self.fronts:
             front(request)
+        self.metrics.span('fronts', perf_counter_ns() - start)
+
+    def run_view(self, request, view):
+        """Вызывает представление, при необходимости под выборочным профилировщиком"""
+        profiler = self.metrics.start_profiler(request)
+        start = perf_counter_ns()
+        try:
+            return self.make_response(view(request))
+        finally:
+            self.metrics.span('view', perf_counter_ns() - start)
+            if profiler is not None:
+                self.metrics.stop_profiler(profiler, request)
+
+    def error_response(self, request, err):
+        """
+        Ответ 413 или 400 на запрос, параметры или тело которого не удалось разобрать.
+        Разбор ленивый, поэтому ошибка возникает там, где к ним впервые обратились
+        """
+        code = '413 Payload Too Large' if isinstance(err, RequestTooLarge) else '400 Bad Request'
+        request.error = (code, str(err))
+        return self.make_response(self.request_error(request))
+
+    @staticmethod
+    def route_name(view):
+        """Имя маршрута для метрик: класс представления"""
+        return type(view).__name__
 
-        code, body = view(request)
-        if code == '302 Found':
-            start_response(code, body)
-            return []
-        start_response(code, [('Content-Type', 'text/html')])
+    @staticmethod
+    def make_response(result):
+        """
+        Приводит результат представления к Response
+        :param result: Response или, для совместимости, кортеж (код, тело) или (код, тело, заголовки);
+            для редиректа в кортеже вместо тела передается список заголовков
+        :return: Response
+        """
+        if isinstance(result, Response):
+            return result
+        code, body = result[0], result[1]
+        if code[0] == '3' and isinstance(body, list):
+            return Response(b'', code, body, content_type=None)
+        if len(result) > 2:
+            return Response(body, code, result[2], content_type=None)
+        return Response(body, code)
 
-        return [body.encode('utf-8')]
+    def respond(self, request, view):
+        """
+        Выполняет цепочку middleware, передние контроллеры и представление, затем завершающие действия
+        контроллеров (например, запись сессии). При исключении вызываются обработчики fail контроллеров
+        (например, возврат соединения в пул), и исключение передается дальше
+        :param request: запрос
+        :param view: представление
+        :return: Response
+        """
+        try:
+            response = self.handler(request, view)
+            if request.method == 'HEAD':
+                self.drop_body(response)
+            self.finish(request, response)
+        except Exception:
+            self.fail(request)
+            raise
+        return response
 
     @staticmethod
-    def decode_value(data: dict):
+    def drop_body(response):
+        """Ответ на HEAD: заголовки как у GET, тело не отправляется; потоковое тело закрывается без чтения"""
+        close = getattr(response.body, 'close', None)
+        if close is not None:
+            close()
+        response.body = b''
+
+    def get_response(self, request, view):
         """
-        Осуществляет декодирование кириллицы и специальных символов
-        :param data: словарь с кодированными значениями
-        :return: словарь с декодированными значениями
+        GET- и HEAD-запросы к представлениям с cache_policy отдаются из кэша ответов;
+        если ETag совпадает с If-None-Match, возвращается 304 без тела
         """
-        decode_data = {}
-        for key, value in data.items():
-            value_bytes = bytes(value.replace('%', '=').replace('+', ' '), 'UTF-8')
-            value_decode_str = decodestring(value_bytes).decode('UTF-8')
-            decode_data[key] = value_decode_str
+        try:
+            self.run_fronts(request)
+            policy = getattr(view, 'cache_policy', None)
+            if policy is None or request.method not in ('GET', 'HEAD'):
+                return self.run_view(request, view)
+            key = self.response_cache.versioned(policy.make_key(request), policy.tags)
+        except (RequestTooLarge, BadRequest) as err:
+            return self.error_response(request, err)
+
+        entry = self.response_cache.get(key)
+        if entry is None:
+            response = self.run_view(request, view)
+            if response.status_code != 200:
+                return response
+            body = b''.join(self.encode_body(response.body))
+            etag = make_etag(body)
+            headers = response.headers + [('ETag', etag), ('Cache-Control', 'private, no-cache')]
+            entry = (response.status, headers, body, etag)
+            self.response_cache.set(key, entry, policy.ttl, policy.tags)
+
+        status, headers, body, etag = entry
+        if etag_matches(request.if_none_match, etag):
+            headers = [header for header in headers if header[0] != 'Content-Type']
+            return Response(b'', '304 Not Modified', headers, content_type=None)
+        return Response(body, status, headers, content_type=None)
 
-        return decode_data
+    def finish(self, request, response):
+        for finish in self.finishers:
+            finish(request, response)
+
+    def fail(self, request):
+        for fail in self.failers:
+            fail(request)
+
+    def handle(self, environ):
+        """
+        Обрабатывает запрос: разбор, передние контроллеры, представление
+        :param environ: переменные окружения
+        :return: Response
+        """
+        request, view = self.build_request(environ)
+        return self.respond(request, view)
+
+    def __call__(self, environ, start_response):
+        trace = self.metrics.begin()
+        request, view = self.build_request(environ)
+        response = self.respond(request, view)
+        start_response(response.status, response.headers)
+
+        start = perf_counter_ns()
+        body = self.encode_body(response.body)
+        self.metrics.span('encode', perf_counter_ns() - start)
+        return self.metrics.track_body(trace, self.route_name(view), request.method, response.status, body)
+
+    @staticmethod
+    def encode_body(body):
+        """
+        Приводит тело ответа к итерируемому объекту с байтами.
+        Представление может вернуть строку, байты или итерируемый объект с частями ответа,
+        который передается серверу без сборки в одну строку
+        :param body: тело ответа
+        :return: итерируемый объект с байтами
+        """
+        if isinstance(body, str):
+            return [body.encode('utf-8')]
+        if isinstance(body, bytes):
+            return [body]
+        return (chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in body)
@@ -0,0 +1,385 @@
+"""Метрики и профилирование фреймворка"""
+import os
+import sys
+from bisect import bisect_left
+from collections import deque
+from sqlite3 import Connection, Cursor
+from threading import Event, Lock, Thread, get_ident, local
+from time import perf_counter_ns, time
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с фиксированными границами корзин.
+    Последние значения хранятся в кольцевом буфере для расчета перцентилей.
+    Изменяется только под блокировкой Metrics
+    """
+
+    def __init__(self, sample_size=1024):
+        self.bounds = tuple(int(bound * 1e9) for bound in BUCKETS)
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0
+        self.count = 0
+        self.samples = deque(maxlen=sample_size) if sample_size else None
+
+    def observe(self, elapsed_ns):
+        """
+        Учитывает одно значение
+        :param elapsed_ns: длительность в наносекундах
+        """
+        self.counts[bisect_left(self.bounds, elapsed_ns)] += 1
+        self.total += elapsed_ns
+        self.count += 1
+        if self.samples is not None:
+            self.samples.append(elapsed_ns)
+
+    def quantiles(self, quantiles=QUANTILES):
+        """
+        Перцентили по последним значениям
+        :param quantiles: доли от 0 до 1
+        :return: словарь {доля: длительность в секундах}
+        """
+        samples = sorted(self.samples or ())
+        if not samples:
+            return {quantile: 0.0 for quantile in quantiles}
+        return {quantile: samples[min(len(samples) - 1, int(len(samples) * quantile))] / 1e9
+                for quantile in quantiles}
+
+    def snapshot(self):
+        """Возвращает накопленные корзины, сумму в секундах и количество"""
+        cumulative, buckets = 0, []
+        for bound, value in zip(BUCKETS + (float('inf'),), self.counts):
+            cumulative += value
+            buckets.append((bound, cumulative))
+        return buckets, self.total / 1e9, self.count
+
+
+class Trace:
+    """Замеры одного запроса: этапы обработки и их длительность"""
+    __slots__ = ('started', 'started_ns', 'spans', 'route', 'method', 'code', 'elapsed_ns')
+
+    def __init__(self):
+        self.started = time()
+        self.started_ns = perf_counter_ns()
+        self.spans = []
+        self.route = self.method = self.code = None
+        self.elapsed_ns = 0
+
+    def describe(self):
+        spans = {}
+        for name, elapsed_ns in self.spans:
+            spans[name] = spans.get(name, 0) + elapsed_ns
+        details = ' '.join(f'{name}={elapsed_ns / 1e6:.2f}' for name, elapsed_ns in spans.items())
+        return f'{self.started:.3f} {self.method} {self.route} {self.code} {self.elapsed_ns / 1e6:.2f} мс {details}'
+
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик: отдельный поток периодически снимает стек потока запроса.
+    Результат выдается в свернутом формате (стек;через;точку_с_запятой количество), который понимают flamegraph-утилиты
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        """
+        :param thread_id: идентификатор профилируемого потока
+        :param interval: период снятия стека, секунды
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.stopped = Event()
+        self.thread = Thread(target=self.run, name='sampling-profiler', daemon=True)
+
+    @staticmethod
+    def frame_name(frame):
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(self.frame_name(frame))
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self
+
+    def collapsed(self):
+        """Свернутые стеки, самые частые первыми"""
+        return '\n'.join(f'{stack} {count}' for stack, count in
+                         sorted(self.stacks.items(), key=lambda item: item[1], reverse=True))
+
+
+class Metrics:
+    """
+    Сборщик метрик процесса: гистограммы длительности запросов по маршрутам и этапов обработки
+    (разбор запроса, маршрутизация, передние контроллеры, представление, SQL, шаблоны, кодирование ответа),
+    счетчики кодов ответа, счетчики попаданий и промахов зарегистрированных кэшей и кольцевой буфер
+    последних запросов.
+    Метрики не суммируются между процессами: при запуске с --workers /metrics/ показывает счетчики того
+    рабочего процесса, который ответил на запрос (его pid - в app_process_info), и обнуляется при перезапуске
+    процесса. Для сводной картины собирайте метрики каждого процесса отдельно или суммируйте их в Prometheus
+    """
+
+    def __init__(self, ring_size=256, sample_size=1024, enabled=True):
+        """
+        :param ring_size: сколько последних запросов хранить для просмотра
+        :param sample_size: сколько последних значений хранить в каждой гистограмме для перцентилей
+        :param enabled: собирать ли метрики
+        """
+        self.enabled = enabled
+        self.sample_size = sample_size
+        self.local = local()
+        self.requests = {}
+        self.spans = {}
+        self.responses = {}
+        self.recent = deque(maxlen=ring_size)
+        self.profiles = deque(maxlen=16)
+        self.profiling = False
+        self.caches = {}
+        self.lock = Lock()
+
+    def register_cache(self, name, cache):
+        """
+        Публикует счетчики кэша в /metrics/
+        :param name: имя кэша, значение метки cache
+        :param cache: объект с методом stats(), возвращающим size, hits и misses
+        """
+        self.caches[name] = cache
+
+    @staticmethod
+    def histogram(storage, key, sample_size=0):
+        """Возвращает гистограмму из storage, создавая ее при первом обращении; вызывается под блокировкой"""
+        histogram = storage.get(key)
+        if histogram is None:
+            histogram = storage[key] = Histogram(sample_size)
+        return histogram
+
+    def begin(self):
+        """Начинает замер запроса в текущем потоке"""
+        if not self.enabled:
+            self.local.trace = None
+            return None
+        trace = self.local.trace = Trace()
+        return trace
+
+    def attach(self, trace):
+        """Продолжает замер запроса в другом потоке (ASGI выполняет представления в пуле потоков)"""
+        self.local.trace = trace
+
+    def span(self, name, elapsed_ns):
+        """
+        Учитывает длительность этапа обработки. Внутри запроса этап только добавляется в его замер,
+        в гистограммы этапы попадают разом при завершении запроса
+        :param name: название этапа
+        :param elapsed_ns: длительность в наносекундах
+        """
+        if not self.enabled:
+            return
+        trace = getattr(self.local, 'trace', None)
+        if trace is not None:
+            trace.spans.append((name, elapsed_ns))
+            return
+        with self.lock:
+            self.histogram(self.spans, name).observe(elapsed_ns)
+
+    def end(self, trace, route, method, code):
+        """
+        Завершает замер запроса
+        :param trace: замер, полученный из begin
+        :param route: имя представления
+        :param method: метод запроса
+        :param code: строка статуса ответа
+        """
+        if trace is None:
+            return
+        trace.elapsed_ns = perf_counter_ns() - trace.started_ns
+        trace.route, trace.method, trace.code = route, method, code.split(' ', 1)[0]
+        key = (route, trace.code)
+        spans = self.spans
+        with self.lock:
+            self.histogram(self.requests, (route, method), self.sample_size).observe(trace.elapsed_ns)
+            for name, elapsed_ns in trace.spans:
+                histogram = spans.get(name) or self.histogram(spans, name)
+                histogram.observe(elapsed_ns)
+            self.responses[key] = self.responses.get(key, 0) + 1
+        self.recent.append(trace)
+        if getattr(self.local, 'trace', None) is trace:
+            self.local.trace = None
+
+    def track_body(self, trace, route, method, code, body):
+        """
+        Завершает замер после отправки тела ответа. Тело, выдаваемое частями, оборачивается,
+        чтобы в длительность запроса вошла вся отправка
+        :return: тело ответа
+        """
+        if trace is None:
+            return body
+        if isinstance(body, (list, tuple)):
+            self.end(trace, route, method, code)
+            return body
+        return self.iterate(trace, route, method, code, body)
+
+    def iterate(self, trace, route, method, code, body):
+        try:
+            yield from body
+        finally:
+            self.end(trace, route, method, code)
+
+    def start_profiler(self, request):
+        """
+        Запускает выборочный профилировщик, если профилирование разрешено и в запросе есть параметр profile
+        :param request: запрос
+        :return: профилировщик или None
+        """
+        if not self.profiling or 'profile' not in request.query:
+            return None
+        return SamplingProfiler(get_ident()).start()
+
+    def stop_profiler(self, profiler, request):
+        profiler.stop()
+        self.profiles.append((time(), request.method, request.path, profiler.samples, profiler.collapsed()))
+
+    def recent_requests(self):
+        """Последние запросы, по строке на запрос"""
+        return '\n'.join(trace.describe() for trace in list(self.recent))
+
+    def recent_profiles(self):
+        """Последние профили в свернутом формате"""
+        return '\n\n'.join(f'# {started:.3f} {method} {path}: {samples} выборок\n{collapsed}'
+                           for started, method, path, samples, collapsed in list(self.profiles))
+
+    @staticmethod
+    def escape(value):
+        """Экранирует значение метки: обратную косую черту, кавычку и перевод строки"""
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @classmethod
+    def labels(cls, **values):
+        return ','.join(f'{name}="{cls.escape(value)}"' for name, value in values.items())
+
+    def histogram_lines(self, name, snapshots, label_names):
+        lines = []
+        for key, (buckets, total, count) in sorted(snapshots.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            labels = self.labels(**dict(zip(label_names, key)))
+            for bound, value in buckets:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {value}')
+            lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+        return lines
+
+    def render_prometheus(self):
+        """Метрики в текстовом формате Prometheus"""
+        with self.lock:
+            requests = {key: histogram.snapshot() for key, histogram in self.requests.items()}
+            quantiles = {key: histogram.quantiles() for key, histogram in self.requests.items()}
+            spans = {key: histogram.snapshot() for key, histogram in self.spans.items()}
+            responses = dict(self.responses)
+
+        lines = ['# HELP app_process_info Процесс, метрики которого показаны: метрики не суммируются между процессами',
+                 '# TYPE app_process_info gauge',
+                 f'app_process_info{{{self.labels(pid=os.getpid())}}} 1',
+                 '# HELP app_request_duration_seconds Время обработки запроса',
+                 '# TYPE app_request_duration_seconds histogram']
+        lines += self.histogram_lines('app_request_duration_seconds', requests, ('route', 'method'))
+
+        lines += ['# HELP app_request_latency_seconds Перцентили времени обработки последних запросов',
+                  '# TYPE app_request_latency_seconds summary']
+        for (route, method), values in sorted(quantiles.items()):
+            for quantile, value in values.items():
+                labels = self.labels(route=route, method=method, quantile=quantile)
+                lines.append(f'app_request_latency_seconds{{{labels}}} {value:.6f}')
+
+        lines += ['# HELP app_span_duration_seconds Время этапов обработки запроса',
+                  '# TYPE app_span_duration_seconds histogram']
+        lines += self.histogram_lines('app_span_duration_seconds', spans, ('span',))
+
+        lines += ['# HELP app_responses_total Количество ответов по кодам',
+                  '# TYPE app_responses_total counter']
+        for (route, code), count in sorted(responses.items()):
+            lines.append(f'app_responses_total{{{self.labels(route=route, code=code)}}} {count}')
+
+        caches = {name: cache.stats() for name, cache in sorted(self.caches.items())}
+        for metric, key, kind, text in (('app_cache_hits_total', 'hits', 'counter', 'Попадания в кэш'),
+                                        ('app_cache_misses_total', 'misses', 'counter', 'Промахи кэша'),
+                                        ('app_cache_entries', 'size', 'gauge', 'Количество записей в кэше')):
+            lines += [f'# HELP {metric} {text}', f'# TYPE {metric} {kind}']
+            lines += [f'{metric}{{{self.labels(cache=name)}}} {stats[key]}' for name, stats in caches.items()]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.spans.clear()
+            self.responses.clear()
+            self.recent.clear()
+            self.profiles.clear()
+
+
+METRICS = Metrics()
+
+
+class TracedCursor(Cursor):
+    """Курсор sqlite3, записывающий длительность запросов в метрики как этап sql"""
+
+    def execute(self, sql, parameters=()):
+        start = perf_counter_ns()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            METRICS.span('sql', perf_counter_ns() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter_ns()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            METRICS.span('sql', perf_counter_ns() - start)
+
+    def fetchall(self):
+        start = perf_counter_ns()
+        try:
+            return super().fetchall()
+        finally:
+            METRICS.span('sql', perf_counter_ns() - start)
+
+    def fetchmany(self, size=None):
+        start = perf_counter_ns()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            METRICS.span('sql', perf_counter_ns() - start)
+
+
+class TracedConnection(Connection):
+    """Соединение sqlite3, курсоры которого записывают длительность запросов в метрики"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,127 @@
+"""
+Цепочка middleware вокруг представлений FrameworkApp и сжатие ответов.
+Middleware - вызываемый объект middleware(request, view, get_response), который вызывает get_response(request, view)
+(следующее звено цепочки, последним - передние контроллеры, кэш ответов и представление) и возвращает Response
+"""
+import zlib
+from functools import partial
+
+from framework.cache import LRUCache
+from framework.static import accepted_encodings
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript',
+                      'application/xml', 'image/svg+xml', 'application/openmetrics-text')
+GZIP_WBITS = 31
+
+
+def build_chain(middlewares, handler):
+    """
+    Собирает цепочку: первый middleware списка - внешний, handler - внутреннее звено
+    :param middlewares: список middleware
+    :param handler: функция handler(request, view) -> Response
+    :return: функция (request, view) -> Response
+    """
+    for middleware in reversed(middlewares):
+        handler = partial(middleware, get_response=handler)
+    return handler
+
+
+def gzip_stream(chunks, level):
+    """
+    Сжимает тело ответа по частям: в памяти только окно zlib и текущая часть, а не весь ответ.
+    Исходный итератор закрывается вместе с генератором, например при обрыве соединения
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов gzip по Accept-Encoding. Не сжимаются ответы без тела, короче min_size,
+    с уже сжатым содержимым (изображения, архивы) и с заголовком Content-Encoding.
+    Итерируемые тела сжимаются потоково. Уровень сжатия маршрута задает атрибут представления compress_level
+    (декоратор AppCompress), 0 отключает сжатие. Сжатые тела ответов с ETag (например, из кэша ответов)
+    хранятся в LRU-кэше, поэтому повторные попадания не сжимаются заново
+    """
+
+    def __init__(self, level=6, min_size=1024, cache_size=256):
+        """
+        :param level: уровень сжатия по умолчанию, от 1 (быстро) до 9 (плотно)
+        :param min_size: минимальный размер тела в байтах, меньшие тела не сжимаются
+        :param cache_size: количество сжатых тел, хранимых по ETag
+        """
+        self.level = level
+        self.min_size = min_size
+        self.cache = LRUCache(max_size=cache_size)
+
+    @staticmethod
+    def get_header(response, name):
+        lower = name.lower()
+        for header, value in response.headers:
+            if header.lower() == lower:
+                return value
+        return None
+
+    def route_level(self, view):
+        """Уровень сжатия для представления: compress_level маршрута или уровень по умолчанию"""
+        return getattr(view, 'compress_level', self.level)
+
+    def compressible(self, request, response):
+        if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if self.get_header(response, 'Content-Encoding') is not None:
+            return False
+        if 'no-transform' in (self.get_header(response, 'Cache-Control') or ''):
+            return False
+        content_type = (self.get_header(response, 'Content-Type') or '').lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def __call__(self, request, view, get_response):
+        response = get_response(request, view)
+        level = self.route_level(view)
+        if not level or not self.compressible(request, response):
+            return response
+        body = response.body
+        if hasattr(body, '__aiter__'):
+            return response
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if isinstance(body, bytes) and len(body) < self.min_size:
+            return response
+
+        vary = self.get_header(response, 'Vary')
+        if not vary:
+            response.set_header('Vary', 'Accept-Encoding')
+        elif 'accept-encoding' not in vary.lower():
+            response.set_header('Vary', f'{vary}, Accept-Encoding')
+        if 'gzip' not in accepted_encodings(request.environ.get('HTTP_ACCEPT_ENCODING', '')):
+            return response
+
+        etag = self.get_header(response, 'ETag')
+        if isinstance(body, bytes):
+            key = (etag, level) if etag else None
+            compressed = self.cache.get(key) if key else None
+            if compressed is None:
+                compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+                compressed = compressor.compress(body) + compressor.flush()
+                if key:
+                    self.cache.set(key, compressed)
+            response.body = compressed
+            response.set_header('Content-Length', str(len(compressed)))
+        else:
+            response.body = gzip_stream(body, level)
+            response.headers = [header for header in response.headers if header[0].lower() != 'content-length']
+        response.set_header('Content-Encoding', 'gzip')
+        if etag and not etag.startswith('W/'):
+            # сжатое тело отличается побайтно: слабый ETag по-прежнему совпадает с If-None-Match (etag_matches)
+            response.set_header('ETag', f'W/{etag}')
+        return response
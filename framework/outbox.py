@@ -0,0 +1,194 @@
+"""
+Исходящие сообщения (outbox). Сообщение записывается в таблицу outbox в той же транзакции, что и изменения данных,
+и доставляется фоновыми потоками: ответ пользователю не ждет внешних шлюзов, а сообщение не теряется
+ни при сбое шлюза, ни при перезапуске процесса
+"""
+import atexit
+import json
+import os
+import random
+import sys
+from threading import Event, Lock, Thread
+from time import time
+
+OUTBOX_TABLE = 'outbox'
+
+
+class OutboxWorker:
+    """
+    Пул фоновых потоков доставки. Поток захватывает пачку готовых к отправке сообщений транзакцией BEGIN IMMEDIATE,
+    продлевая им срок на время доставки (lease), поэтому одно сообщение не берут два потока или два процесса,
+    а сообщения упавшего процесса возвращаются в работу после истечения срока.
+    Пачка группируется по теме и передается обработчику темы одним вызовом. Доставленные сообщения удаляются,
+    при ошибке обработчика сообщения пачки откладываются с экспоненциальной задержкой,
+    после max_attempts попыток помечаются failed. Доставка - не менее одного раза: обработчики должны быть
+    идемпотентны
+    """
+
+    def __init__(self, pool, threads=2, batch_size=100, max_attempts=8, backoff=1.0, max_backoff=600.0,
+                 lease=60.0, poll_interval=1.0, logger=None):
+        """
+        :param pool: пул соединений ConnectionPool; потоки доставки открывают по собственному соединению
+            с его настройками и не занимают соединения пула, которые нужны запросам
+        :param threads: количество потоков доставки
+        :param batch_size: максимальное количество сообщений в пачке
+        :param max_attempts: количество попыток доставки сообщения
+        :param backoff: задержка перед второй попыткой, секунды; каждая следующая удваивается
+        :param max_backoff: максимальная задержка между попытками, секунды
+        :param lease: на сколько секунд захваченное сообщение скрывается от других потоков
+        :param poll_interval: период опроса таблицы, когда сообщений нет, секунды
+        :param logger: логгер для ошибок доставки
+        """
+        self.pool = pool
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self.handlers = {}
+        self.workers = []
+        self.lock = Lock()
+        self.wakeup = Event()
+        self.stopping = Event()
+        atexit.register(self.stop)
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def register(self, topic, handler):
+        """
+        Регистрирует обработчик темы
+        :param topic: тема сообщений
+        :param handler: функция, принимающая список данных сообщений темы; исключение означает неудачную доставку
+        """
+        self.handlers[topic] = handler
+
+    def start(self):
+        with self.lock:
+            if self.workers:
+                return
+            self.stopping.clear()
+            self.workers = [Thread(target=self.run, name=f'outbox-{index}', daemon=True)
+                            for index in range(self.threads)]
+            for worker in self.workers:
+                worker.start()
+
+    def wake(self):
+        """Будит потоки доставки после фиксации транзакции с новыми сообщениями, при надобности запускает их"""
+        if not self.workers:
+            self.start()
+        self.wakeup.set()
+
+    def stop(self, timeout=5.0):
+        """Останавливает потоки после доставки текущих пачек"""
+        with self.lock:
+            workers, self.workers = self.workers, []
+        self.stopping.set()
+        self.wakeup.set()
+        for worker in workers:
+            worker.join(timeout)
+
+    def report(self, text, *args):
+        if self.logger is not None:
+            self.logger.error(text, *args)
+        else:
+            sys.stderr.write(text % args + '\n')
+
+    def run(self):
+        connection = None
+        try:
+            while not self.stopping.is_set():
+                try:
+                    if connection is None:
+                        connection = self.pool.create_connection()
+                    delivered = self.run_once(connection)
+                except Exception as err:
+                    self.report('Ошибка доставки исходящих сообщений: %r', err)
+                    delivered = 0
+                    if connection is not None and not self.pool.is_healthy(connection):
+                        self.pool.close_connection(connection)
+                        connection = None
+                if not delivered:
+                    self.wakeup.wait(self.poll_interval)
+                    self.wakeup.clear()
+        finally:
+            if connection is not None:
+                self.pool.close_connection(connection)
+
+    def run_once(self, connection):
+        """
+        Захватывает и доставляет одну пачку сообщений
+        :param connection: соединение потока доставки
+        :return: количество захваченных сообщений
+        """
+        rows = self.claim(connection)
+        if rows:
+            self.deliver(rows, connection)
+        return len(rows)
+
+    def claim(self, connection):
+        """
+        Захватывает пачку сообщений, срок доставки которых наступил
+        :return: список строк (id, topic, payload, attempts) с уже увеличенным счетчиком попыток
+        """
+        now = time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = connection.execute(f"SELECT id, topic, payload, attempts + 1 FROM {OUTBOX_TABLE} "
+                                      f"WHERE status = 'pending' AND available_at <= ? "
+                                      f"ORDER BY available_at LIMIT ?", (now, self.batch_size)).fetchall()
+            if rows:
+                connection.executemany(f'UPDATE {OUTBOX_TABLE} SET available_at = ?, attempts = attempts + 1 '
+                                       f'WHERE id = ?', [(now + self.lease, row[0]) for row in rows])
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        return rows
+
+    def deliver(self, rows, connection):
+        """Передает пачку обработчикам по темам и записывает результат"""
+        topics = {}
+        for row in rows:
+            topics.setdefault(row[1], []).append(row)
+        done, failed = [], []
+        for topic, topic_rows in topics.items():
+            handler = self.handlers.get(topic)
+            try:
+                if handler is None:
+                    raise LookupError(f'нет обработчика темы {topic}')
+                handler([json.loads(row[2]) for row in topic_rows])
+            except Exception as err:
+                failed += [(row, repr(err)) for row in topic_rows]
+            else:
+                done += topic_rows
+        self.complete(done, failed, connection)
+
+    def retry_delay(self, attempts):
+        """Экспоненциальная задержка со случайной составляющей, чтобы повторы не приходили разом"""
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        return delay * random.uniform(0.5, 1.0)
+
+    def complete(self, done, failed, connection):
+        now = time()
+        with connection:
+            if done:
+                connection.executemany(f'DELETE FROM {OUTBOX_TABLE} WHERE id = ?', [(row[0],) for row in done])
+            if failed:
+                connection.executemany(
+                    f"UPDATE {OUTBOX_TABLE} SET status = ?, available_at = ?, error = ? WHERE id = ?",
+                    [('failed' if row[3] >= self.max_attempts else 'pending', now + self.retry_delay(row[3]), error,
+                      row[0]) for row, error in failed])
+
+    def pending(self):
+        """Количество сообщений, ожидающих доставки"""
+        with self.pool.connection() as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM {OUTBOX_TABLE} WHERE status = 'pending'").fetchone()[0]
+
+    def after_fork(self):
+        """Потоки не переживают fork: дочерний процесс запускает собственные потоки доставки"""
+        self.workers = []
+        self.lock = Lock()
+        self.wakeup = Event()
+        self.stopping = Event()
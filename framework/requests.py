@@ -1,98 +1,590 @@
-"""Содержит классы-обработчики GET и POST запросов"""
+"""
+Запрос и ответ фреймворка. Разбор параметров запроса: строки запроса, форм application/x-www-form-urlencoded
+и multipart/form-data
+"""
+import re
+import shutil
+from binascii import a2b_qp
+from http import HTTPStatus
+from tempfile import SpooledTemporaryFile
+from types import MappingProxyType
+from urllib.parse import unquote_plus
 
+MAX_FIELDS = 1000
+MAX_BODY_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+SPOOL_SIZE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
 
-class GetRequest:
-    """Выполняет обработку GET запроса"""
-    @staticmethod
-    def parse_input_data(data: str):
+HTML_CONTENT_TYPE = 'text/html; charset=utf-8'
+HTML_HEADER = ('Content-Type', HTML_CONTENT_TYPE)
+NO_PARAMS = MappingProxyType({})
+MISSING = object()
+
+PARAM_RE = re.compile(r';\s*([\w*-]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^;\s]*))')
+
+
+class BadRequest(Exception):
+    def __init__(self, text):
+        super().__init__(f'Некорректный запрос: {text}')
+
+
+class RequestTooLarge(Exception):
+    def __init__(self, text):
+        super().__init__(f'Слишком большой запрос: {text}')
+
+
+class QueryDict(dict):
+    """
+    Словарь параметров запроса. По ключу возвращается последнее значение,
+    все значения повторяющегося параметра доступны через getlist
+    """
+    __slots__ = ('lists',)
+
+    def __init__(self):
+        super().__init__()
+        self.lists = None
+
+    def add(self, key, value):
+        if key in self:
+            if self.lists is None:
+                self.lists = {}
+            self.lists.setdefault(key, [self[key]]).append(value)
+        self[key] = value
+
+    def getlist(self, key):
         """
-        Осуществляет парсинг строки с параметрами и создает словарь с параметрами
-        :param data: строка с параметрами
-        :return:словарь
+        Все значения параметра
+        :param key: имя параметра
+        :return: список значений, пустой, если параметра нет
         """
-        result = {}
+        values = self.lists.get(key) if self.lists else None
+        if values is not None:
+            return list(values)
+        return [self[key]] if key in self else []
+
+
+def unquote(value: str):
+    """
+    Декодирует значение в процентной кодировке, результат совпадает с urllib.parse.unquote_plus.
+    Последовательности %XX декодируются на C через binascii.a2b_qp (после замены '%' на '=');
+    каждая корректная последовательность укорачивает результат ровно на 2 байта,
+    поэтому по длине результата видно, были ли некорректные - тогда используется unquote_plus
+    :param value: кодированное значение
+    :return: строка
+    """
+    if '%' not in value:
+        return value.replace('+', ' ')
+    if '\n' in value or '\r' in value:
+        return unquote_plus(value)
+    raw = value.replace('=', '=3D').replace('%', '=').replace('+', ' ').encode('utf-8')
+    decoded = a2b_qp(raw)
+    if len(decoded) != len(raw) - 2 * (value.count('%') + value.count('=')):
+        return unquote_plus(value)
+    return decoded.decode('utf-8', 'replace')
 
-        if data:
-            params = data.split('&')
-            for item in params:
-                key, value = item.split('=')
-                result[key] = value
 
+def parse_qs(data: str, max_fields=MAX_FIELDS):
+    """
+    Разбирает строку вида a=1&b=%D0%B0&b=2. Значения могут содержать '=', ключ без '=' получает пустое значение.
+    Декодирование выполняется только для частей, содержащих '%' или '+'
+    :param data: строка параметров
+    :param max_fields: максимальное количество параметров
+    :return: QueryDict
+    """
+    result = QueryDict()
+    if not data:
         return result
+    pairs = data.split('&')
+    if len(pairs) > max_fields:
+        raise RequestTooLarge(f'больше {max_fields} параметров')
+    for pair in pairs:
+        if not pair:
+            continue
+        key, _, value = pair.partition('=')
+        if '%' in key or '+' in key:
+            key = unquote(key)
+        if '%' in value or '+' in value:
+            value = unquote(value)
+        if key in result:
+            result.add(key, value)
+        else:
+            result[key] = value
+    return result
+
+
+def parse_query_string(environ):
+    """
+    Параметры строки запроса. По PEP 3333 QUERY_STRING - байты, декодированные как latin-1,
+    поэтому не-ASCII символы, пришедшие без процентного кодирования, перекодируются в UTF-8
+    """
+    query = environ.get('QUERY_STRING', '')
+    if not query.isascii():
+        query = query.encode('latin-1').decode('utf-8', 'replace')
+    return parse_qs(query)
+
+
+def parse_header_params(value):
+    """
+    Разбирает заголовок вида form-data; name="img"; filename="a.jpg"
+    :return: кортеж (основное значение в нижнем регистре, словарь параметров)
+    """
+    main, _, rest = value.partition(';')
+    params = {}
+    for match in PARAM_RE.finditer(';' + rest):
+        quoted = match.group(2)
+        params[match.group(1).lower()] = quoted.replace('\\"', '"') if quoted is not None else match.group(3)
+    return main.strip().lower(), params
+
 
-    @staticmethod
-    def get_request_params(environ):
+def get_content_length(environ):
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        raise BadRequest('неверный Content-Length')
+    if length < 0:
+        raise BadRequest('неверный Content-Length')
+    return length
+
+
+class UploadedFile:
+    """
+    Загруженный файл. Содержимое хранится в памяти до SPOOL_SIZE байт, дальше - во временном файле
+    """
+
+    def __init__(self, name, filename, content_type, spool_size=SPOOL_SIZE):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.file = SpooledTemporaryFile(max_size=spool_size)
+
+    def write(self, data):
+        self.size += len(data)
+        self.file.write(data)
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def seek(self, offset):
+        self.file.seek(offset)
+
+    def save(self, path):
         """
-        Получает строку с параметрами из запроса, возвращает словарь с параметрами
-        :param environ: переменные окружения
-        :return:словарь
+        Сохраняет файл на диск без чтения целиком в память
+        :param path: путь к файлу
         """
-        query_str = environ['QUERY_STRING']
+        self.file.seek(0)
+        with open(path, 'wb') as target:
+            shutil.copyfileobj(self.file, target, CHUNK_SIZE)
 
-        request_params = GetRequest.parse_input_data(query_str)
+    def close(self):
+        self.file.close()
 
-        return request_params
+    def __repr__(self):
+        return f'<UploadedFile {self.name}: {self.filename}, {self.size} байт>'
 
 
-class PostRequest:
-    """Выполняет обработку POST запроса"""
+class MultipartParser:
+    """
+    Потоковый разбор multipart/form-data: тело читается частями по CHUNK_SIZE,
+    файлы пишутся в UploadedFile сразу по мере чтения, обычные поля собираются в QueryDict
+    """
 
-    @staticmethod
-    def parse_input_data(data: str):
+    def __init__(self, stream, boundary, length, max_fields=MAX_FIELDS, max_field_size=MAX_BODY_SIZE):
         """
-        Осуществляет парсинг строки с параметрами и создает словарь с параметрами
-        :param data: строка с параметрами
-        :return:словарь
+        :param stream: wsgi.input
+        :param boundary: граница частей из Content-Type
+        :param length: Content-Length
+        :param max_fields: максимальное количество частей
+        :param max_field_size: максимальный суммарный размер обычных полей
         """
-        result = {}
+        if not boundary or len(boundary) > 200:
+            raise BadRequest('неверная граница multipart')
+        self.stream = stream
+        self.remaining = length
+        self.boundary = b'--' + boundary.encode('latin-1')
+        self.delimiter = b'\r\n' + self.boundary
+        self.max_fields = max_fields
+        self.max_field_size = max_field_size
+        self.buffer = b''
 
-        if data:
-            params = data.split('&')
-            for item in params:
-                key, value = item.split('=')
-                result[key] = value
+    def read_more(self):
+        if self.remaining <= 0:
+            raise BadRequest('тело multipart оборвано')
+        chunk = self.stream.read(min(CHUNK_SIZE, self.remaining))
+        if not chunk:
+            raise BadRequest('тело multipart оборвано')
+        self.remaining -= len(chunk)
+        self.buffer += chunk
 
-        return result
+    def read_until(self, marker, limit):
+        """Читает до marker и возвращает данные перед ним, не больше limit байт"""
+        while True:
+            index = self.buffer.find(marker)
+            if index >= 0:
+                data, self.buffer = self.buffer[:index], self.buffer[index + len(marker):]
+                return data
+            if len(self.buffer) > limit:
+                raise RequestTooLarge('слишком длинные заголовки части multipart')
+            self.read_more()
+
+    def read_part(self, sink):
+        """Передает в sink данные части до следующей границы"""
+        keep = len(self.delimiter) - 1
+        while True:
+            index = self.buffer.find(self.delimiter)
+            if index >= 0:
+                sink(self.buffer[:index])
+                self.buffer = self.buffer[index + len(self.delimiter):]
+                return
+            if len(self.buffer) > keep:
+                sink(self.buffer[:-keep])
+                self.buffer = self.buffer[-keep:]
+            self.read_more()
+
+    def parse(self):
+        """
+        :return: кортеж (QueryDict полей, QueryDict файлов)
+        """
+        data, files = QueryDict(), QueryDict()
+        field_size = 0
+        self.read_until(self.boundary, MAX_HEADER_SIZE)
+        while True:
+            while len(self.buffer) < 2:
+                self.read_more()
+            if self.buffer.startswith(b'--'):
+                break
+            if not self.buffer.startswith(b'\r\n'):
+                raise BadRequest('неверная граница multipart')
+            self.buffer = self.buffer[2:]
+            if len(data) + len(files) >= self.max_fields:
+                raise RequestTooLarge(f'больше {self.max_fields} частей multipart')
+
+            headers = {}
+            for line in self.read_until(b'\r\n\r\n', MAX_HEADER_SIZE).decode('utf-8', 'replace').split('\r\n'):
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            disposition, params = parse_header_params(headers.get('content-disposition', ''))
+            if disposition != 'form-data' or 'name' not in params:
+                raise BadRequest('часть multipart без имени поля')
+
+            if 'filename' in params:
+                upload = UploadedFile(params['name'], params['filename'],
+                                      headers.get('content-type', 'application/octet-stream'))
+                self.read_part(upload.write)
+                upload.seek(0)
+                files.add(params['name'], upload)
+            else:
+                chunks = []
+
+                def collect(chunk):
+                    nonlocal field_size
+                    field_size += len(chunk)
+                    if field_size > self.max_field_size:
+                        raise RequestTooLarge(f'поля формы больше {self.max_field_size} байт')
+                    chunks.append(chunk)
+
+                self.read_part(collect)
+                data.add(params['name'], b''.join(chunks).decode('utf-8', 'replace'))
+        return data, files
 
-    @staticmethod
-    def get_input_data(environ):
+
+def parse_body(environ, max_body_size=MAX_BODY_SIZE, max_upload_size=MAX_UPLOAD_SIZE):
+    """
+    Разбирает тело запроса по его Content-Type
+    :param environ: переменные окружения
+    :param max_body_size: максимальный размер формы application/x-www-form-urlencoded
+    :param max_upload_size: максимальный размер тела multipart/form-data
+    :return: кортеж (QueryDict полей, QueryDict файлов)
+    """
+    length = get_content_length(environ)
+    if not length:
+        return QueryDict(), QueryDict()
+
+    content_type, params = parse_header_params(environ.get('CONTENT_TYPE', ''))
+    if content_type == 'multipart/form-data':
+        if length > max_upload_size:
+            raise RequestTooLarge(f'тело больше {max_upload_size} байт')
+        return MultipartParser(environ['wsgi.input'], params.get('boundary'), length).parse()
+
+    if length > max_body_size:
+        raise RequestTooLarge(f'тело больше {max_body_size} байт')
+    body = environ['wsgi.input'].read(length)
+    if content_type in ('', 'application/x-www-form-urlencoded'):
+        return parse_qs(body.decode('utf-8', 'replace')), QueryDict()
+    return QueryDict(), QueryDict()
+
+
+def parse_cookies(header):
+    """
+    Разбирает заголовок Cookie вида a=1; b="2". При повторении имени остается первое значение:
+    браузер передает первыми cookie с более точным путем
+    :param header: значение заголовка
+    :return: словарь cookie
+    """
+    cookies = {}
+    for item in header.split(';'):
+        name, sep, value = item.partition('=')
+        name = name.strip()
+        if not sep or not name or name in cookies:
+            continue
+        value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        cookies[name] = value
+    return cookies
+
+
+class Request:
+    """
+    Запрос. Параметры строки запроса, тело, заголовки и cookie разбираются при первом обращении и запоминаются,
+    поэтому представления, которым они не нужны, не тратят на них время.
+    Для совместимости с представлениями поддерживается доступ как к словарю: request['method'], request.get('user').
+    Ключи, не относящиеся к самому запросу, хранятся в словаре контекста, который создается при первой записи.
+    Значения ленивых передних контроллеров (year, user и т.п.) вычисляются при первом обращении к ключу
+    и хранятся в слотах подкласса, созданного with_lazy, поэтому словарь контекста для них не нужен
+    """
+    __slots__ = ('environ', 'method', 'path', 'path_params', 'error', 'context',
+                 'parsed_query', 'parsed_data', 'parsed_files', 'parsed_headers', 'parsed_cookies')
+
+    lazy = NO_PARAMS
+    lazy_slots = NO_PARAMS
+    lazy_slot_names = ()
+
+    aliases = {
+        'method': 'method', 'path': 'path', 'path_params': 'path_params', 'error': 'error',
+        'request_params': 'query', 'data': 'data', 'files': 'files', 'headers': 'headers', 'cookies': 'cookies',
+        'if_none_match': 'if_none_match',
+    }
+
+    def __init__(self, environ, path=None):
+        """
+        :param environ: переменные окружения
+        :param path: нормализованный путь запроса, по умолчанию PATH_INFO
+        """
+        self.environ = environ
+        self.method = environ['REQUEST_METHOD']
+        self.path = environ['PATH_INFO'] if path is None else path
+        self.path_params = NO_PARAMS
+        self.error = None
+        self.context = None
+        self.parsed_query = None
+        self.parsed_data = None
+        self.parsed_files = None
+        self.parsed_headers = None
+        self.parsed_cookies = None
+        for slot in self.lazy_slot_names:
+            setattr(self, slot, MISSING)
+
+    @classmethod
+    def with_lazy(cls, lazy):
         """
-        Осуществляет проверку наличия и считывание данных запроса
-        :param environ:переменные окружения
-        :return:байты данных
+        Создает подкласс запроса с ленивыми значениями контекста. Для каждого ключа заводится слот,
+        в который значение записывается при первом обращении
+        :param lazy: словарь {ключ: функция(request)}, ключи - идентификаторы Python
+        :return: класс запроса
         """
-        content_length_str = environ.get('CONTENT_LENGTH')
+        if not lazy:
+            return cls
+        for key in lazy:
+            if not key.isidentifier():
+                raise ValueError(f'Ключ ленивого контекста должен быть идентификатором: {key!r}')
+        slots = {key: f'lazy_{key}' for key in lazy}
+        names = tuple(slots.values())
+        return type(f'Lazy{cls.__name__}', (cls,), {'__slots__': names, 'lazy': dict(lazy), 'lazy_slots': slots,
+                                                     'lazy_slot_names': names})
+
+    @property
+    def query(self):
+        """Параметры строки запроса (QueryDict)"""
+        if self.parsed_query is None:
+            self.parsed_query = parse_query_string(self.environ)
+        return self.parsed_query
+
+    @query.setter
+    def query(self, value):
+        self.parsed_query = value
+
+    def load_body(self):
+        self.parsed_data, self.parsed_files = parse_body(self.environ)
+
+    @property
+    def data(self):
+        """Поля формы из тела запроса (QueryDict)"""
+        if self.parsed_data is None:
+            self.load_body()
+        return self.parsed_data
 
-        if content_length_str:
-            content_length = int(content_length_str)
+    @data.setter
+    def data(self, value):
+        self.parsed_data = value
+
+    @property
+    def files(self):
+        """Загруженные файлы (QueryDict с UploadedFile)"""
+        if self.parsed_files is None:
+            self.load_body()
+        return self.parsed_files
+
+    @files.setter
+    def files(self, value):
+        self.parsed_files = value
+
+    @property
+    def headers(self):
+        """Заголовки запроса: словарь с именами в нижнем регистре, например 'user-agent'"""
+        if self.parsed_headers is None:
+            environ = self.environ
+            headers = {key[5:].replace('_', '-').lower(): value
+                       for key, value in environ.items() if key.startswith('HTTP_')}
+            for key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                if environ.get(key):
+                    headers[key.replace('_', '-').lower()] = environ[key]
+            self.parsed_headers = headers
+        return self.parsed_headers
+
+    @property
+    def cookies(self):
+        """Cookie запроса"""
+        if self.parsed_cookies is None:
+            self.parsed_cookies = parse_cookies(self.environ.get('HTTP_COOKIE', ''))
+        return self.parsed_cookies
+
+    @property
+    def if_none_match(self):
+        return self.environ.get('HTTP_IF_NONE_MATCH', '')
+
+    def __getitem__(self, key):
+        attribute = self.aliases.get(key)
+        if attribute is not None:
+            return getattr(self, attribute)
+        slot = self.lazy_slots.get(key)
+        if slot is not None:
+            return self.lazy_value(key, slot)
+        if self.context is not None and key in self.context:
+            return self.context[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        attribute = self.aliases.get(key) or self.lazy_slots.get(key)
+        if attribute is not None:
+            setattr(self, attribute, value)
+        elif self.context is None:
+            self.context = {key: value}
         else:
-            content_length = 0
+            self.context[key] = value
 
-        data = environ['wsgi.input'].read(content_length) if content_length > 0 else b''
+    def __contains__(self, key):
+        if key in self.aliases:
+            return key != 'error' or self.error is not None
+        return key in self.lazy_slots or self.context is not None and key in self.context
 
-        return data
+    def get(self, key, default=None):
+        attribute = self.aliases.get(key)
+        if attribute is not None:
+            return getattr(self, attribute)
+        slot = self.lazy_slots.get(key)
+        if slot is not None:
+            return self.lazy_value(key, slot)
+        if self.context is not None:
+            return self.context.get(key, default)
+        return default
 
-    def parse_wsgi_data(self, data: bytes):
+    def lazy_value(self, key, slot):
+        """Значение ленивого переднего контроллера, вычисляется при первом обращении и хранится в слоте"""
+        value = getattr(self, slot)
+        if value is MISSING:
+            value = self.lazy[key](self)
+            setattr(self, slot, value)
+        return value
+
+    def peek(self, key, default=None):
         """
-        Осуществляет декодирование и парсинг данных запроса и возвращает словарь с параметрами
-        :param data: данные запроса в байтах
-        :return: словарь с параметрами запроса
+        Значение контекста без вычисления ленивого значения
+        :param key: ключ
+        :param default: значение, если ключа нет или ленивое значение еще не вычислялось
         """
+        slot = self.lazy_slots.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            return default if value is MISSING else value
+        if self.context is not None:
+            return self.context.get(key, default)
+        return default
+
+    def __repr__(self):
+        return f'<Request {self.method} {self.path}>'
 
-        if data:
-            data_str = data.decode(encoding='utf-8')
+
+class Response:
+    """
+    Ответ представления: код, заголовки и тело. Тело может быть строкой, байтами
+    или итерируемым объектом с частями ответа, который отдается клиенту без сборки в одну строку
+    """
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, body='', status='200 OK', headers=None, content_type=HTML_CONTENT_TYPE):
+        """
+        :param body: тело ответа
+        :param status: код ответа: число (404) или строка ('404 Not Found')
+        :param headers: список заголовков (имя, значение)
+        :param content_type: значение Content-Type, None - без заголовка
+        """
+        self.status = status if isinstance(status, str) else f'{status} {HTTPStatus(status).phrase}'
+        if content_type is HTML_CONTENT_TYPE:
+            self.headers = [HTML_HEADER]
         else:
-            data_str = ''
+            self.headers = [('Content-Type', content_type)] if content_type else []
+        if headers:
+            self.headers.extend(headers)
+        self.body = body
 
-        return self.parse_input_data(data_str)
+    @classmethod
+    def redirect(cls, location, status=302):
+        """Перенаправление на location"""
+        return cls(b'', status, [('Location', location)], content_type=None)
 
-    def get_request_params(self, environ):
+    @classmethod
+    def text(cls, text, status=200):
+        """Текстовый ответ, в том числе для ошибок"""
+        return cls(text, status, content_type='text/plain; charset=utf-8')
+
+    @property
+    def status_code(self):
+        return int(self.status[:3])
+
+    def set_header(self, name, value):
+        """Устанавливает заголовок, заменяя заголовок с тем же именем"""
+        lower = name.lower()
+        self.headers = [header for header in self.headers if header[0].lower() != lower]
+        self.headers.append((name, value))
+
+    def set_cookie(self, name, value, max_age=None, path='/', secure=False, httponly=True, samesite='Lax'):
         """
-        Осуществляет получение запроса и преобразование его в словарь
-        :param environ:переменные окружения
-        :return:словарь с параметрами запроса
+        Добавляет заголовок Set-Cookie
+        :param name: имя cookie
+        :param value: значение, не должно содержать ';', ',' и пробелов
+        :param max_age: время жизни в секундах, None - до закрытия браузера
+        :param path: путь, для которого действует cookie
+        :param secure: передавать только по HTTPS
+        :param httponly: недоступен из JavaScript
+        :param samesite: Strict, Lax или None
         """
-        data_bytes = self.get_input_data(environ)
-        data = self.parse_wsgi_data(data_bytes)
+        parts = [f'{name}={value}', f'Path={path}']
+        if max_age is not None:
+            parts.append(f'Max-Age={max_age}')
+        if secure:
+            parts.append('Secure')
+        if httponly:
+            parts.append('HttpOnly')
+        if samesite:
+            parts.append(f'SameSite={samesite}')
+        self.headers.append(('Set-Cookie', '; '.join(parts)))
+
+    def delete_cookie(self, name, path='/'):
+        self.set_cookie(name, '', max_age=0, path=path)
 
-        return data
+    def __repr__(self):
+        return f'<Response {self.status}>'
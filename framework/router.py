@@ -0,0 +1,220 @@
+"""Маршрутизатор фреймворка"""
+
+
+class Converter:
+    """Базовый конвертер параметра пути"""
+
+    def to_python(self, value: str):
+        """
+        Преобразует сегмент пути в значение параметра
+        :param value: сегмент пути
+        :return: значение параметра, ValueError если сегмент не подходит
+        """
+        if not value:
+            raise ValueError(value)
+        return value
+
+
+class StrConverter(Converter):
+    """Любой непустой сегмент пути"""
+    pass
+
+
+class IntConverter(Converter):
+    """Целое неотрицательное число"""
+
+    def to_python(self, value: str):
+        if not value.isdigit():
+            raise ValueError(value)
+        return int(value)
+
+
+class SlugConverter(Converter):
+    """Латинские буквы, цифры, дефис и подчеркивание"""
+    allowed = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_')
+
+    def to_python(self, value: str):
+        if not value or not self.allowed.issuperset(value):
+            raise ValueError(value)
+        return value
+
+
+class PathConverter(Converter):
+    """Остаток пути целиком, допускается только последним параметром"""
+    pass
+
+
+CONVERTERS = {
+    'str': StrConverter,
+    'int': IntConverter,
+    'slug': SlugConverter,
+    'path': PathConverter
+}
+
+
+class RouteNotFound(Exception):
+    """Для пути не найдено ни одного маршрута"""
+    pass
+
+
+class MethodNotAllowed(Exception):
+    """Маршрут найден, но не поддерживает метод запроса"""
+    def __init__(self, allowed):
+        super().__init__(f'Метод не поддерживается, допустимые методы: {", ".join(allowed)}')
+        self.allowed = allowed
+
+
+class TrieNode:
+    """Узел префиксного дерева динамических маршрутов"""
+    __slots__ = ('children', 'params', 'tail', 'views')
+
+    def __init__(self):
+        self.children = {}
+        self.params = []
+        self.tail = None
+        self.views = None
+
+
+class Router:
+    """
+    Таблица маршрутов. Статические пути хранятся в словаре и находятся за O(1),
+    пути с параметрами вида /products/<int:id>/ раскладываются по сегментам в префиксное дерево
+    """
+
+    def __init__(self, routes=None):
+        self.static = {}
+        self.root = TrieNode()
+        if routes:
+            for url, view in routes.items():
+                self.add(url, view, getattr(view, 'methods', None))
+
+    @staticmethod
+    def normalize(path: str):
+        """
+        Приводит путь к виду со слешем в конце
+        :param path: путь запроса
+        :return: нормализованный путь
+        """
+        if not path.endswith('/'):
+            path = path + '/'
+        return path
+
+    @staticmethod
+    def split(path: str):
+        return [segment for segment in path.split('/') if segment]
+
+    @staticmethod
+    def parse_segment(segment: str):
+        """
+        Разбирает сегмент шаблона маршрута
+        :param segment: сегмент вида <int:id>, <name> или статический текст
+        :return: кортеж (конвертер, имя параметра) или None для статического сегмента
+        """
+        if not (segment.startswith('<') and segment.endswith('>')):
+            return None
+        body = segment[1:-1]
+        converter_name, _, name = body.rpartition(':')
+        converter_name = converter_name or 'str'
+        if converter_name not in CONVERTERS:
+            raise ValueError(f'Неизвестный конвертер {converter_name} в маршруте')
+        return CONVERTERS[converter_name](), name
+
+    @staticmethod
+    def add_views(views, view, methods):
+        if views is None:
+            views = {}
+        for method in methods or (None,):
+            views[method.upper() if method else None] = view
+        return views
+
+    def add(self, pattern: str, view, methods=None):
+        """
+        Добавляет маршрут
+        :param pattern: шаблон пути, например /products/<int:id>/
+        :param view: представление
+        :param methods: допустимые методы запроса, None - любые
+        """
+        pattern = self.normalize(pattern)
+        if '<' not in pattern:
+            self.static[pattern] = self.add_views(self.static.get(pattern), view, methods)
+            return
+
+        node = self.root
+        segments = self.split(pattern)
+        for position, segment in enumerate(segments):
+            parsed = self.parse_segment(segment)
+            if parsed is None:
+                node = node.children.setdefault(segment, TrieNode())
+                continue
+            converter, name = parsed
+            if isinstance(converter, PathConverter):
+                if position != len(segments) - 1:
+                    raise ValueError(f'Параметр path должен быть последним в маршруте {pattern}')
+                node.tail = (name, self.add_views(node.tail[1] if node.tail else None, view, methods))
+                return
+            for param in node.params:
+                if type(param[0]) is type(converter) and param[1] == name:
+                    node = param[2]
+                    break
+            else:
+                child = TrieNode()
+                node.params.append((converter, name, child))
+                node = child
+        node.views = self.add_views(node.views, view, methods)
+
+    def search(self, node, segments, position, params):
+        """Обход дерева с возвратом: сначала статические сегменты, затем параметры"""
+        if position == len(segments):
+            return node.views
+        segment = segments[position]
+
+        child = node.children.get(segment)
+        if child is not None:
+            views = self.search(child, segments, position + 1, params)
+            if views is not None:
+                return views
+
+        for converter, name, child in node.params:
+            try:
+                params[name] = converter.to_python(segment)
+            except ValueError:
+                continue
+            views = self.search(child, segments, position + 1, params)
+            if views is not None:
+                return views
+            del params[name]
+
+        if node.tail is not None:
+            name, views = node.tail
+            params[name] = '/'.join(segments[position:])
+            return views
+        return None
+
+    @staticmethod
+    def select(views, method):
+        """Представление для метода; HEAD обслуживает представление GET, если для HEAD нет своего"""
+        view = views.get(method)
+        if view is None and method == 'HEAD':
+            view = views.get('GET')
+        if view is None:
+            view = views.get(None)
+        if view is None:
+            raise MethodNotAllowed(sorted(set(views) | {'HEAD'} if 'GET' in views else views))
+        return view
+
+    def match(self, path: str, method: str = 'GET'):
+        """
+        Находит представление для пути и метода запроса
+        :param path: нормализованный путь запроса
+        :param method: метод запроса
+        :return: кортеж (представление, словарь параметров пути)
+        """
+        views = self.static.get(path)
+        if views is not None:
+            return self.select(views, method), {}
+
+        params = {}
+        views = self.search(self.root, self.split(path), 0, params)
+        if views is None:
+            raise RouteNotFound(path)
+        return self.select(views, method), params
@@ -0,0 +1,495 @@
+"""Многопроцессный prefork-сервер WSGI"""
+import atexit
+import os
+import random
+import selectors
+import signal
+import socket
+import sys
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic, sleep
+from wsgiref.simple_server import WSGIRequestHandler, ServerHandler
+
+from framework.static import FileRange
+
+
+MAX_DRAIN = 64 * 1024
+
+
+class LimitedInput:
+    """
+    Тело запроса, ограниченное Content-Length. После обработки запроса небольшой непрочитанный остаток
+    отбрасывается, а при большом (например, отклоненной загрузке) соединение закрывается
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.readline(size)
+        self.remaining -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def drain(self):
+        while self.remaining > 0:
+            if not self.read(min(self.remaining, 65536)):
+                break
+
+
+class SocketWriter:
+    """Запись ответа в сокет без буферизации"""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+class KeepAliveServerHandler(ServerHandler):
+    """
+    Запоминает, известна ли длина ответа: без Content-Length соединение нельзя переиспользовать.
+    Тело-файл (FileRange, он же wsgi.file_wrapper) отправляется через sendfile
+    """
+    wsgi_file_wrapper = FileRange
+
+    def sendfile(self):
+        """Передает часть файла из страничного кэша ядра прямо в сокет, не копируя ее в процесс"""
+        result = self.result
+        if not self.headers_sent:
+            self.send_headers()
+        if result.length > 0:
+            self.bytes_sent += self.stdout.sock.sendfile(result.file, result.offset, result.length)
+        return True
+
+    def close(self):
+        self.request_handler.length_known = self.headers is not None and 'Content-Length' in self.headers
+        super().close()
+
+
+class Connection:
+    """Клиентское соединение с собственным буфером чтения, который сохраняется между запросами"""
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.rfile = sock.makefile('rb')
+        self.last_active = monotonic()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def has_pending(self):
+        """Есть ли уже полученные данные следующего запроса (конвейерная обработка)"""
+        self.sock.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.sock.setblocking(True)
+
+    def close(self):
+        try:
+            self.rfile.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    """
+    Обработчик одного запроса HTTP/1.1. Соединение не закрывается после ответа:
+    решение о его повторном использовании принимает WorkerServer
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.connection = self.request.sock
+        self.connection.settimeout(self.server.keepalive)
+        self.rfile = self.request.rfile
+        self.wfile = SocketWriter(self.connection)
+
+    def finish(self):
+        pass
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+    def get_environ(self):
+        environ = super().get_environ()
+        environ['wsgi.multiprocess'] = True
+        environ['wsgi.multithread'] = self.server.threads > 1
+        return environ
+
+    def handle(self):
+        self.close_connection = True
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except (socket.timeout, ConnectionError):
+            return
+        if not self.raw_requestline:
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+
+        environ = self.get_environ()
+        body = LimitedInput(self.rfile, int(environ.get('CONTENT_LENGTH') or 0))
+        handler = KeepAliveServerHandler(body, self.wfile, self.get_stderr(), environ,
+                                         multithread=self.server.threads > 1, multiprocess=True)
+        handler.request_handler = self
+        if self.request_version == 'HTTP/1.1':
+            handler.http_version = '1.1'
+        self.length_known = False
+        handler.run(self.server.get_app())
+        if body.remaining > MAX_DRAIN:
+            self.close_connection = True
+        else:
+            body.drain()
+
+        if not self.length_known:
+            self.close_connection = True
+        self.server.request_done()
+
+
+class WorkerServer:
+    """
+    Сервер рабочего процесса. Принимает соединения с общего сокета, открытого главным процессом,
+    и обрабатывает запросы сам или в ограниченном пуле потоков. Соединения keep-alive между запросами
+    не занимают поток: они возвращаются в селектор и ждут следующего запроса вместе со слушающим сокетом
+    """
+
+    def __init__(self, listener, app, threads=1, keepalive=5, max_requests=0, access_log=False):
+        """
+        :param listener: слушающий сокет в неблокирующем режиме
+        :param app: WSGI-приложение
+        :param threads: размер пула потоков, 1 - запросы обрабатываются в цикле приема
+        :param keepalive: время ожидания следующего запроса, секунды
+        :param max_requests: после стольких запросов процесс завершается, 0 - без ограничения
+        :param access_log: писать журнал запросов в stderr
+        """
+        self.listener = listener
+        self.server_address = listener.getsockname()
+        self.app = app
+        self.threads = threads
+        self.keepalive = keepalive
+        self.max_requests = max_requests
+        self.access_log = access_log
+        self.alive = True
+        self.requests = 0
+        self.counter_lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        self.selector = selectors.DefaultSelector()
+        self.idle = {}
+        self.returned = deque()
+        self.waker_read, self.waker_write = socket.socketpair()
+        self.waker_read.setblocking(False)
+        self.base_environ = {}
+        self.setup_environ()
+
+    def setup_environ(self):
+        host, port = self.server_address[:2]
+        self.base_environ = {
+            'SERVER_NAME': socket.getfqdn(host) if host else 'localhost',
+            'GATEWAY_INTERFACE': 'CGI/1.1',
+            'SERVER_PORT': str(port),
+            'REMOTE_HOST': '',
+            'CONTENT_LENGTH': '',
+            'SCRIPT_NAME': ''
+        }
+
+    def get_app(self):
+        return self.app
+
+    def request_done(self):
+        """Считает запросы; по достижении max_requests процесс завершается и будет заменен новым"""
+        with self.counter_lock:
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self.alive = False
+
+    def handle_error(self, connection):
+        print(f'Ошибка при обработке запроса от {connection.address}', file=sys.stderr)
+        traceback.print_exc()
+
+    def handle_connection(self, connection):
+        """Обрабатывает запросы соединения, пока в буфере есть следующий запрос"""
+        try:
+            while True:
+                handler = KeepAliveHandler(connection, connection.address, self)
+                if handler.close_connection or not self.alive:
+                    connection.close()
+                    return
+                if not connection.has_pending():
+                    break
+        except Exception:
+            self.handle_error(connection)
+            connection.close()
+            return
+        connection.last_active = monotonic()
+        if self.executor is None:
+            self.keep(connection)
+        else:
+            self.returned.append(connection)
+            self.waker_write.send(b'.')
+
+    def dispatch(self, connection):
+        if self.executor is None:
+            self.handle_connection(connection)
+        else:
+            self.executor.submit(self.handle_connection, connection)
+
+    def keep(self, connection):
+        self.idle[connection.fileno()] = connection
+        self.selector.register(connection, selectors.EVENT_READ, connection)
+
+    def accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(True)
+        # заголовки и тело ответа (в том числе sendfile) пишутся отдельно: без TCP_NODELAY алгоритм Нейгла
+        # задерживает вторую запись до подтверждения первой, а клиент откладывает подтверждение на ~40 мс
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.dispatch(Connection(sock, address))
+
+    def close_expired(self):
+        deadline = monotonic() - self.keepalive
+        for fileno, connection in list(self.idle.items()):
+            if connection.last_active < deadline:
+                self.selector.unregister(connection)
+                del self.idle[fileno]
+                connection.close()
+
+    def serve(self):
+        """Цикл приема соединений и ожидания запросов keep-alive до остановки процесса"""
+        self.selector.register(self.listener, selectors.EVENT_READ, None)
+        self.selector.register(self.waker_read, selectors.EVENT_READ, self.waker_read)
+        try:
+            while self.alive:
+                for key, _ in self.selector.select(1.0):
+                    if key.data is None:
+                        if self.alive:
+                            self.accept()
+                    elif key.data is self.waker_read:
+                        try:
+                            self.waker_read.recv(4096)
+                        except BlockingIOError:
+                            pass
+                    else:
+                        connection = self.idle.pop(key.fd)
+                        self.selector.unregister(connection)
+                        self.dispatch(connection)
+                while self.returned:
+                    self.keep(self.returned.popleft())
+                self.close_expired()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+            while self.returned:
+                self.returned.popleft().close()
+            for connection in self.idle.values():
+                connection.close()
+            self.selector.close()
+
+
+class PreforkServer:
+    """
+    Главный процесс prefork-сервера. Открывает слушающий сокет, прогревает приложение
+    и запускает рабочие процессы, которые принимают соединения с общего сокета.
+    SIGHUP - плавный перезапуск рабочих процессов, SIGTERM/SIGINT - плавная остановка
+    """
+
+    def __init__(self, app, host='', port=8081, workers=2, threads=1, keepalive=5, max_requests=0,
+                 max_requests_jitter=0, graceful_timeout=30, backlog=1024, warm_up=None, post_fork=None,
+                 access_log=False):
+        """
+        :param app: WSGI-приложение
+        :param host: адрес
+        :param port: порт
+        :param workers: количество рабочих процессов
+        :param threads: размер пула потоков в каждом рабочем процессе
+        :param keepalive: время ожидания следующего запроса в соединении keep-alive, секунды
+        :param max_requests: после стольких запросов рабочий процесс перезапускается, 0 - без ограничения
+        :param max_requests_jitter: случайная добавка к max_requests, чтобы процессы не перезапускались разом
+        :param graceful_timeout: время на завершение текущих запросов при остановке, секунды
+        :param backlog: длина очереди соединений сокета
+        :param warm_up: функция прогрева, вызывается в главном процессе до запуска рабочих процессов
+        :param post_fork: функция, вызываемая в каждом рабочем процессе перед приемом соединений,
+            например для запуска фоновых потоков
+        :param access_log: писать журнал запросов в stderr
+        """
+        self.app = app
+        self.address = (host, port)
+        self.workers = workers
+        self.threads = threads
+        self.keepalive = keepalive
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.warm_up = warm_up
+        self.post_fork = post_fork
+        self.access_log = access_log
+        self.listener = None
+        self.children = {}
+        self.running = False
+        self.reload_requested = False
+
+    def bind(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(self.address)
+        listener.listen(self.backlog)
+        listener.setblocking(False)
+        self.listener = listener
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = monotonic()
+            return pid
+
+        exit_code = 0
+        try:
+            self.run_worker()
+        except Exception:
+            exit_code = 1
+            traceback.print_exc()
+        finally:
+            # os._exit не вызывает обработчики atexit: дописываем журнал и прочие буферы сами
+            atexit._run_exitfuncs()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def run_worker(self):
+        """Тело рабочего процесса"""
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+        server = WorkerServer(self.listener, self.app, threads=self.threads, keepalive=self.keepalive,
+                              max_requests=max_requests, access_log=self.access_log)
+
+        def stop(signum, frame):
+            server.alive = False
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        if self.post_fork:
+            self.post_fork()
+        server.serve()
+
+    def reap(self):
+        """Собирает завершившиеся рабочие процессы"""
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            self.children.pop(pid, None)
+
+    def kill_workers(self, pids, sig=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+
+    def wait_workers(self, pids, timeout):
+        deadline = monotonic() + timeout
+        pids = set(pids)
+        while pids & set(self.children) and monotonic() < deadline:
+            self.reap()
+            sleep(0.1)
+        remaining = pids & set(self.children)
+        if remaining:
+            self.kill_workers(remaining, signal.SIGKILL)
+            sleep(0.1)
+            self.reap()
+
+    def reload(self):
+        """Плавный перезапуск: новые процессы запускаются до остановки старых"""
+        old = list(self.children)
+        if self.warm_up:
+            self.warm_up()
+        for _ in range(self.workers):
+            self.spawn_worker()
+        self.kill_workers(old)
+        self.wait_workers(old, self.graceful_timeout)
+
+    def handle_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self.reload_requested = True
+        else:
+            self.running = False
+
+    def serve_forever(self):
+        self.bind()
+        if self.warm_up:
+            self.warm_up()
+        self.running = True
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self.handle_signal)
+
+        for _ in range(self.workers):
+            self.spawn_worker()
+        print(f'Запущен prefork-сервер на порту {self.address[1]}: '
+              f'{self.workers} процессов по {self.threads} потоков, pid {os.getpid()}')
+
+        try:
+            while self.running:
+                sleep(0.5)
+                self.reap()
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.reload()
+                while self.running and len(self.children) < self.workers:
+                    self.spawn_worker()
+        finally:
+            pids = list(self.children)
+            self.kill_workers(pids)
+            self.wait_workers(pids, self.graceful_timeout)
+            self.listener.close()
@@ -0,0 +1,292 @@
+"""Сессии: подписанный cookie с идентификатором сессии и хранилища данных сессий на стороне сервера"""
+import hmac
+import json
+import mmap
+import multiprocessing
+import os
+import secrets
+import struct
+from base64 import urlsafe_b64encode
+from hashlib import blake2b, sha256
+from time import time
+
+from framework.cache import LRUCache
+
+SESSION_COOKIE = 'sid'
+SESSION_MAX_AGE = 14 * 24 * 3600
+SECRET_FILE = '.secret_key'
+
+
+class SessionTooLarge(Exception):
+    def __init__(self, message):
+        super().__init__(f'Слишком большие данные сессии: {message}')
+
+
+def load_secret(path=SECRET_FILE):
+    """
+    Ключ подписи cookie: переменная окружения SECRET_KEY или файл path, который создается при первом запуске.
+    Ключ читается в главном процессе до запуска рабочих, поэтому у всех процессов он общий
+    :param path: файл с ключом
+    :return: ключ в байтах
+    """
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        key = secrets.token_bytes(32)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+
+class Session(dict):
+    """
+    Данные сессии. Изменение ключей отмечает сессию измененной, и только такая сессия записывается в хранилище.
+    Изменение вложенных объектов (session['basket'].append(...)) не отслеживается:
+    нужно присвоить значение заново или выставить modified
+    """
+
+    def __init__(self, data=None, sid=None):
+        super().__init__(data or ())
+        self.sid = sid
+        self.old_sid = None
+        self.modified = False
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.modified = True
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.modified = True
+
+    def pop(self, key, *default):
+        self.modified = self.modified or key in self
+        return super().pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.modified = True
+
+    def clear(self):
+        super().clear()
+        self.modified = True
+
+    def regenerate(self):
+        """Выдает сессии новый идентификатор, например при входе пользователя, чтобы нельзя было навязать чужой"""
+        if self.sid is not None and self.old_sid is None:
+            self.old_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class MemorySessionStore:
+    """Сессии в памяти процесса (LRU). Подходит для одного процесса"""
+
+    def __init__(self, max_size=10000):
+        self.cache = LRUCache(max_size)
+
+    def load(self, sid):
+        data = self.cache.get(sid)
+        return json.loads(data) if data is not None else None
+
+    def save(self, sid, data, max_age):
+        self.cache.set(sid, json.dumps(data, ensure_ascii=False), max_age)
+
+    def delete(self, sid):
+        self.cache.delete(sid)
+
+
+class SqliteSessionStore:
+    """
+    Сессии в таблице session базы данных (см. миграцию 0004_session.sql), общие для всех процессов.
+    Просроченные сессии удаляются при каждой purge_every-й записи
+    """
+
+    def __init__(self, pool, purge_every=1000):
+        """
+        :param pool: пул соединений ConnectionPool
+        :param purge_every: через сколько записей удалять просроченные сессии
+        """
+        self.pool = pool
+        self.purge_every = purge_every
+        self.writes = 0
+
+    def load(self, sid):
+        with self.pool.connection() as connection:
+            row = connection.execute('SELECT data FROM session WHERE sid = ? AND expires > ?',
+                                     (sid, time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, sid, data, max_age):
+        self.writes += 1
+        with self.pool.connection() as connection:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO session (sid, data, expires) VALUES (?, ?, ?)',
+                                   (sid, json.dumps(data, ensure_ascii=False), time() + max_age))
+                if self.writes % self.purge_every == 0:
+                    connection.execute('DELETE FROM session WHERE expires <= ?', (time(),))
+
+    def delete(self, sid):
+        with self.pool.connection() as connection:
+            with connection:
+                connection.execute('DELETE FROM session WHERE sid = ?', (sid,))
+
+
+class SharedMemorySessionStore:
+    """
+    Сессии в общей памяти для нескольких процессов: анонимный mmap, созданный до fork, виден всем рабочим процессам.
+    Память разбита на слоты фиксированного размера, слот выбирается по хэшу идентификатора сессии
+    среди probes слотов-кандидатов; при переполнении вытесняется слот с самым ранним сроком действия.
+    Доступ защищен межпроцессной блокировкой. Хранилище нужно создать в главном процессе до запуска рабочих
+    """
+    header = struct.Struct('<16sdI')
+
+    def __init__(self, slots=8192, slot_size=2048, probes=8):
+        """
+        :param slots: количество слотов (сессий), округляется вверх до степени двойки
+        :param slot_size: размер слота в байтах, включая заголовок
+        :param probes: сколько слотов-кандидатов просматривается при поиске
+        """
+        self.slots = 1 << max(slots - 1, 1).bit_length()
+        self.slot_size = slot_size
+        self.probes = min(probes, self.slots)
+        self.memory = mmap.mmap(-1, self.slots * slot_size)
+        self.lock = multiprocessing.Lock()
+
+    @staticmethod
+    def digest(sid):
+        return blake2b(sid.encode('ascii'), digest_size=16).digest()
+
+    def positions(self, digest):
+        """Слоты-кандидаты: двойное хэширование с нечетным шагом, при числе слотов - степени двойки все они различны"""
+        start = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(start + step * probe) % self.slots * self.slot_size for probe in range(self.probes)]
+
+    def find(self, digest):
+        """Смещение слота с сессией; вызывается под блокировкой"""
+        for offset in self.positions(digest):
+            if self.header.unpack_from(self.memory, offset)[0] == digest:
+                return offset
+        return None
+
+    def load(self, sid):
+        digest = self.digest(sid)
+        with self.lock:
+            offset = self.find(digest)
+            if offset is None:
+                return None
+            _, expires, length = self.header.unpack_from(self.memory, offset)
+            start = offset + self.header.size
+            data = self.memory[start:start + length]
+        if expires <= time():
+            return None
+        return json.loads(data)
+
+    def save(self, sid, data, max_age):
+        data = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        if len(data) > self.slot_size - self.header.size:
+            raise SessionTooLarge(f'{len(data)} байт, в слот помещается {self.slot_size - self.header.size}')
+        digest = self.digest(sid)
+        with self.lock:
+            offset = self.find(digest)
+            if offset is None:
+                offset = min(self.positions(digest), key=lambda position: self.header.unpack_from(
+                    self.memory, position)[1])
+            start = offset + self.header.size
+            self.memory[start:start + len(data)] = data
+            self.header.pack_into(self.memory, offset, digest, time() + max_age, len(data))
+
+    def delete(self, sid):
+        digest = self.digest(sid)
+        with self.lock:
+            offset = self.find(digest)
+            if offset is not None:
+                self.header.pack_into(self.memory, offset, bytes(16), 0.0, 0)
+
+
+STORES = {
+    'memory': MemorySessionStore,
+    'sqlite': SqliteSessionStore,
+    'shared': SharedMemorySessionStore,
+}
+
+
+class SessionManager:
+    """
+    Передний контроллер сессий. Сессия загружается при первом обращении к request['session'],
+    после ответа записывается в хранилище, только если она изменилась; тогда же ставится или продлевается cookie.
+    Значение cookie - идентификатор сессии и его подпись HMAC-SHA256, подделанный cookie игнорируется
+    """
+    lazy_name = 'session'
+
+    def __init__(self, store=None, secret=None, cookie_name=SESSION_COOKIE, max_age=SESSION_MAX_AGE,
+                 secure=False):
+        """
+        :param store: хранилище сессий, по умолчанию MemorySessionStore
+        :param secret: ключ подписи, по умолчанию load_secret()
+        :param cookie_name: имя cookie
+        :param max_age: время жизни сессии с последнего изменения, секунды
+        :param secure: передавать cookie только по HTTPS
+        """
+        self.store = store if store is not None else MemorySessionStore()
+        self.secret = secret if secret is not None else load_secret()
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.secure = secure
+
+    def sign(self, sid):
+        signature = hmac.new(self.secret, sid.encode('ascii'), sha256).digest()
+        return urlsafe_b64encode(signature).rstrip(b'=').decode('ascii')
+
+    def unsign(self, value):
+        """
+        Проверяет подпись cookie
+        :return: идентификатор сессии или None
+        """
+        sid, _, signature = value.rpartition('.')
+        if not sid or not sid.isascii() or not hmac.compare_digest(self.sign(sid), signature):
+            return None
+        return sid
+
+    def __call__(self, request):
+        """Загружает сессию запроса"""
+        value = request.cookies.get(self.cookie_name)
+        sid = self.unsign(value) if value else None
+        if sid is not None:
+            data = self.store.load(sid)
+            if data is not None:
+                return Session(data, sid)
+        return Session()
+
+    def finish(self, request, response):
+        """
+        Записывает измененную сессию и ставит или удаляет cookie. Cookie отправляется при каждой записи сессии,
+        чтобы его Max-Age продлевался вместе со сроком жизни сессии в хранилище
+        """
+        session = request.peek(self.lazy_name)
+        if session is None or not session.modified:
+            return
+        if session.old_sid is not None:
+            self.store.delete(session.old_sid)
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+            if session.sid is not None or session.old_sid is not None:
+                response.delete_cookie(self.cookie_name)
+            return
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(24)
+        self.store.save(session.sid, dict(session), self.max_age)
+        response.set_cookie(self.cookie_name, f'{session.sid}.{self.sign(session.sid)}', max_age=self.max_age,
+                            secure=self.secure)
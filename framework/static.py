@@ -0,0 +1,329 @@
+"""
+Статические файлы: манифест файлов с размерами, временем изменения и хэшами содержимого,
+адреса с хэшем для долгого кэширования и WSGI-middleware, отдающее файлы в обход представлений
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from hashlib import blake2b
+
+from framework.cache import etag_matches
+
+STATIC_MOUNTS = {
+    '/static/': 'static',
+    '/style/': 'templates/style',
+}
+# имена файлов в этих папках - хэши содержимого (хранилище изображений framework.images), адрес уже неизменяем
+IMMUTABLE_PREFIXES = ('/static/img/store/',)
+STATIC_MAX_AGE = 3600
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+BLOCK_SIZE = 256 * 1024
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(r'\.([0-9a-f]{%d})(\.[^./]+)?$' % HASH_LENGTH)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class FileRange:
+    """
+    Часть файла для тела ответа, совместима с wsgi.file_wrapper(file, block_size).
+    Сервер framework.server отдает ее через sendfile без копирования данных в процесс,
+    другие серверы читают файл блоками
+    """
+
+    def __init__(self, file, block_size=BLOCK_SIZE, offset=0, length=None):
+        self.file = file
+        self.block_size = block_size
+        self.offset = offset
+        self.length = os.fstat(file.fileno()).st_size - offset if length is None else length
+
+    def __iter__(self):
+        self.file.seek(self.offset)
+        remaining = self.length
+        while remaining > 0:
+            data = self.file.read(min(self.block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.file.close()
+
+
+class StaticAsset:
+    """Запись манифеста: файл, его размер, время изменения, ETag и сжатые копии рядом с ним (.br, .gz)"""
+    __slots__ = ('url', 'path', 'size', 'mtime', 'digest', 'etag', 'last_modified', 'content_type', 'hashed_url',
+                 'encodings')
+
+    def __init__(self, url, path):
+        """
+        :param url: адрес файла, например /static/img/1.jpeg
+        :param path: путь к файлу
+        """
+        stat = os.stat(path)
+        self.url = url
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.digest = self.hash_file(path)
+        self.etag = f'"{self.digest}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'image/svg+xml'):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        base, ext = os.path.splitext(url)
+        self.hashed_url = f'{base}.{self.digest[:HASH_LENGTH]}{ext}'
+        self.encodings = {}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.encodings[encoding] = (path + suffix, os.stat(path + suffix).st_size)
+
+    @staticmethod
+    def hash_file(path):
+        digest = blake2b(digest_size=8)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+class StaticManifest:
+    """
+    Манифест статических файлов. Строится при запуске (в главном процессе до запуска рабочих),
+    файлы, появившиеся позже (загруженные изображения), добавляются при первом обращении
+    """
+
+    def __init__(self, mounts=None, immutable=IMMUTABLE_PREFIXES):
+        """
+        :param mounts: словарь префикс адреса -> папка с файлами
+        :param immutable: префиксы адресов, содержимое которых не меняется: они кэшируются надолго без хэша в адресе
+        """
+        self.mounts = dict(STATIC_MOUNTS if mounts is None else mounts)
+        self.immutable = tuple(immutable)
+        self.assets = {}
+        self.hashed = {}
+
+    def build(self):
+        """
+        Обходит папки и строит манифест заново
+        :return: количество файлов
+        """
+        assets = {}
+        for prefix, directory in self.mounts.items():
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                        continue
+                    path = os.path.join(root, name)
+                    url = prefix + os.path.relpath(path, directory).replace(os.sep, '/')
+                    assets[url] = StaticAsset(url, path)
+        self.assets = assets
+        self.hashed = {asset.hashed_url: asset for asset in assets.values()}
+        return len(assets)
+
+    def mount(self, url):
+        for prefix, directory in self.mounts.items():
+            if url.startswith(prefix):
+                return prefix, directory
+        return None
+
+    def find(self, url):
+        """
+        Находит файл по адресу, в том числе по адресу с хэшем
+        :param url: адрес
+        :return: кортеж (StaticAsset или None, адрес с хэшем ли это)
+        """
+        asset = self.hashed.get(url)
+        if asset is not None:
+            return asset, True
+        asset = self.assets.get(url)
+        if asset is not None:
+            return asset, url.startswith(self.immutable)
+        asset = self.add(url)
+        if asset is not None and url.startswith(self.immutable):
+            return asset, True
+        if asset is None:
+            # устаревший хэш: отдаем текущую версию файла, но без долгого кэширования
+            match = HASHED_NAME.search(url)
+            if match:
+                asset = self.assets.get(url[:match.start()] + (match.group(2) or '')) or \
+                    self.add(url[:match.start()] + (match.group(2) or ''))
+        return asset, False
+
+    def add(self, url):
+        """Добавляет в манифест файл, появившийся после запуска; пути за пределами папки не принимаются"""
+        mount = self.mount(url)
+        if mount is None:
+            return None
+        prefix, directory = mount
+        relative = url[len(prefix):]
+        if not relative or '\\' in relative or '\x00' in relative or '..' in relative.split('/'):
+            return None
+        root = os.path.realpath(directory)
+        path = os.path.realpath(os.path.join(root, relative))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return None
+        asset = StaticAsset(url, path)
+        self.assets[url] = asset
+        self.hashed[asset.hashed_url] = asset
+        return asset
+
+    def url(self, url):
+        """
+        Адрес файла с хэшем содержимого для шаблонов: такой адрес кэшируется браузером надолго
+        и меняется вместе с содержимым. Для неизвестных файлов и неизменяемых папок возвращается исходный адрес
+        :param url: адрес файла, например /style/back.png
+        """
+        if not url or url.startswith(self.immutable):
+            return url
+        asset = self.assets.get(url) or self.add(url)
+        return asset.hashed_url if asset is not None else url
+
+
+STATIC_MANIFEST = StaticManifest()
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range с одним диапазоном
+    :param header: значение заголовка, например bytes=0-499, bytes=500- или bytes=-500
+    :param size: размер файла
+    :return: (начало, длина); None, если заголовок нужно проигнорировать; ValueError, если диапазон за концом файла
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        length = min(int(last), size)
+        if length == 0:
+            raise ValueError(header)
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме запрещенных через q=0"""
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        params = params.strip()
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class StaticFiles:
+    """
+    WSGI-middleware статических файлов. Запросы к префиксам манифеста отдаются без представлений,
+    передних контроллеров и сессий: поддерживаются условные запросы (ETag, Last-Modified),
+    диапазоны (Range, If-Range), заранее сжатые копии файлов (.br, .gz) и адреса с хэшем содержимого,
+    которые кэшируются на год. Тело ответа - FileRange, его сервер может отправить через sendfile
+    """
+
+    def __init__(self, app, manifest=STATIC_MANIFEST, max_age=STATIC_MAX_AGE, block_size=BLOCK_SIZE):
+        """
+        :param app: WSGI-приложение для остальных запросов
+        :param manifest: манифест статических файлов
+        :param max_age: время кэширования файлов по адресу без хэша, секунды
+        :param block_size: размер блока при чтении файла
+        """
+        self.app = app
+        self.manifest = manifest
+        self.max_age = max_age
+        self.block_size = block_size
+        self.prefixes = tuple(manifest.mounts)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefixes):
+            return self.app(environ, start_response)
+        return self.serve(environ, start_response, path)
+
+    def serve(self, environ, start_response, path):
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+            return []
+        asset, hashed = self.manifest.find(path)
+        if asset is None:
+            body = b'File not found'
+            start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8'),
+                                             ('Content-Length', str(len(body)))])
+            return [body]
+
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable' if hashed else \
+            f'public, max-age={self.max_age}'
+        headers = [('Cache-Control', cache_control), ('Last-Modified', asset.last_modified)]
+        if asset.encodings:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        range_header = environ.get('HTTP_RANGE')
+        if range_header and environ.get('HTTP_IF_RANGE', asset.etag) not in (asset.etag, asset.last_modified):
+            range_header = None
+        file_path, size, etag = asset.path, asset.size, asset.etag
+        if not range_header and asset.encodings:
+            accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+            for encoding, _ in ENCODINGS:
+                if encoding in asset.encodings and encoding in accepted:
+                    file_path, size = asset.encodings[encoding]
+                    etag = f'"{asset.digest}-{encoding}"'
+                    headers.append(('Content-Encoding', encoding))
+                    break
+        headers.append(('ETag', etag))
+
+        if self.not_modified(environ, asset, etag):
+            start_response('304 Not Modified', headers)
+            return []
+
+        status, offset, length = '200 OK', 0, size
+        if range_header:
+            try:
+                part = parse_range(range_header, size)
+            except ValueError:
+                start_response('416 Range Not Satisfiable', headers + [('Content-Range', f'bytes */{size}'),
+                                                                       ('Content-Length', '0')])
+                return []
+            if part is not None:
+                offset, length = part
+                status = '206 Partial Content'
+                headers.append(('Content-Range', f'bytes {offset}-{offset + length - 1}/{size}'))
+        headers += [('Content-Type', asset.content_type), ('Content-Length', str(length)),
+                    ('Accept-Ranges', 'bytes')]
+        start_response(status, headers)
+        if method == 'HEAD':
+            return []
+
+        file = open(file_path, 'rb')
+        wrapper = environ.get('wsgi.file_wrapper')
+        if wrapper is not None and wrapper is not FileRange and status == '200 OK':
+            return wrapper(file, self.block_size)
+        return FileRange(file, self.block_size, offset, length)
+
+    @staticmethod
+    def not_modified(environ, asset, etag):
+        """Условный запрос: If-None-Match проверяется первым, If-Modified-Since - только без него"""
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return etag_matches(if_none_match, etag)
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            try:
+                return asset.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
@@ -1,5 +1,160 @@
-from jinja2 import FileSystemLoader
+"""Шаблонизатор фреймворка"""
+import os
+from threading import Lock
+from time import perf_counter_ns
+
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader, nodes
 from jinja2.environment import Environment
+from jinja2.ext import Extension
+
+from framework.cache import FRAGMENT_CACHE
+from framework.metrics import METRICS
+from framework.static import STATIC_MANIFEST
+
+TEMPLATE_CACHE_SIZE = 400
+TEMPLATE_AUTO_RELOAD = False
+TEMPLATE_BYTECODE_DIR = None
+
+METRICS.register_cache('fragment', FRAGMENT_CACHE)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Тег {% cache ключ[, ttl[, теги]] %}...{% endcache %}: кэширует результат рендера фрагмента шаблона.
+    Ключ - строка или список значений, от которых зависит фрагмент, например ['category-menu', path].
+    Теги позволяют сбросить фрагмент при изменении данных (см. framework.cache.invalidate_tags)
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FRAGMENT_CACHE)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while len(args) < 3 and parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        args += [nodes.Const(None)] * (3 - len(args))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('render_fragment', args), [], [], body).set_lineno(lineno)
+
+    def render_fragment(self, key, ttl, tags, caller):
+        """
+        Возвращает фрагмент из кэша или рендерит его
+        :param key: ключ фрагмента
+        :param ttl: время жизни, по умолчанию ttl кэша фрагментов
+        :param tags: тег или список тегов
+        :param caller: функция рендера тела блока
+        """
+        cache = self.environment.fragment_cache
+        tags = (tags,) if isinstance(tags, str) else tuple(tags or ())
+        key = cache.versioned(('fragment', key if isinstance(key, str) else tuple(key)), tags)
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value, ttl, tags)
+        return value
+
+
+class TemplateEngine:
+    """
+    Общий для процесса шаблонизатор. Хранит по одному окружению Jinja2 на каждую папку с шаблонами,
+    благодаря чему скомпилированные шаблоны переиспользуются между запросами
+    """
+    _environments = {}
+    _lock = Lock()
+
+    _globals = {}
+
+    cache_size = TEMPLATE_CACHE_SIZE
+    auto_reload = TEMPLATE_AUTO_RELOAD
+    bytecode_dir = TEMPLATE_BYTECODE_DIR
+
+    @classmethod
+    def register_global(cls, name, value):
+        """
+        Добавляет функцию или значение, доступные во всех шаблонах, в том числе в уже созданных окружениях
+        :param name: имя в шаблонах
+        :param value: функция или значение
+        """
+        with cls._lock:
+            cls._globals[name] = value
+            for env in cls._environments.values():
+                env.globals[name] = value
+
+    @classmethod
+    def configure(cls, cache_size=None, auto_reload=None, bytecode_dir=None):
+        """
+        Задает параметры шаблонизатора. Созданные ранее окружения сбрасываются
+        :param cache_size: количество скомпилированных шаблонов, хранимых в памяти
+        :param auto_reload: проверять ли время изменения файлов шаблонов (режим разработки)
+        :param bytecode_dir: папка для дискового кэша байт-кода шаблонов, пустая строка отключает кэш
+        """
+        if cache_size is not None:
+            cls.cache_size = cache_size
+        if auto_reload is not None:
+            cls.auto_reload = auto_reload
+        if bytecode_dir is not None:
+            cls.bytecode_dir = bytecode_dir or None
+        cls.reset()
+
+    @classmethod
+    def reset(cls):
+        """Сбрасывает все созданные окружения"""
+        with cls._lock:
+            cls._environments.clear()
+
+    @classmethod
+    def create_environment(cls, folder):
+        """
+        Создает окружение Jinja2 для папки с шаблонами. В шаблонах доступна функция static_url(адрес),
+        возвращающая адрес статического файла с хэшем содержимого, и значения из register_global
+        :param folder: папка с шаблонами
+        :return: окружение Jinja2
+        """
+        bytecode_cache = None
+        if cls.bytecode_dir:
+            os.makedirs(cls.bytecode_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(cls.bytecode_dir)
+
+        env = Environment(loader=FileSystemLoader(folder),
+                          extensions=[FragmentCacheExtension],
+                          cache_size=cls.cache_size,
+                          auto_reload=cls.auto_reload,
+                          bytecode_cache=bytecode_cache)
+        env.globals['static_url'] = STATIC_MANIFEST.url
+        env.globals.update(cls._globals)
+        return env
+
+    @classmethod
+    def get_environment(cls, folder='templates'):
+        """
+        Возвращает окружение для папки с шаблонами, создавая его при первом обращении
+        :param folder: папка с шаблонами
+        :return: окружение Jinja2
+        """
+        env = cls._environments.get(folder)
+        if env is None:
+            with cls._lock:
+                env = cls._environments.get(folder)
+                if env is None:
+                    env = cls.create_environment(folder)
+                    cls._environments[folder] = env
+        return env
+
+    @classmethod
+    def warm_up(cls, folder='templates'):
+        """
+        Компилирует все шаблоны папки заранее, чтобы первый запрос не тратил на это время
+        :param folder: папка с шаблонами
+        :return: количество загруженных шаблонов
+        """
+        env = cls.get_environment(folder)
+        names = [name for name in env.list_templates() if name.endswith('.html')]
+        for name in names:
+            env.get_template(name)
+        return len(names)
 
 
 def render(template_name, context, folder='templates'):
@@ -10,9 +165,9 @@ def render(template_name, context, folder='templates'):
     :param context: именованные параметры
     :return: рендер шаблона с параметрами
     """
-    env = Environment()
-    env.loader = FileSystemLoader(folder)
-
-    template = env.get_template(template_name)
+    start = perf_counter_ns()
+    template = TemplateEngine.get_environment(folder).get_template(template_name)
+    result = template.render(**context)
+    METRICS.span('render', perf_counter_ns() - start)
 
-    return template.render(**context)
+    return result
@@ -0,0 +1,3 @@
+CREATE TABLE IF NOT EXISTS product (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, product_type VARCHAR (32), name VARCHAR (255), category_id INTEGER, price VARCHAR (32), desc VARCHAR (255), img VARCHAR (255));
+
+CREATE TABLE IF NOT EXISTS category (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, name VARCHAR (255), category_id INTEGER, desc VARCHAR (255), img VARCHAR (255));
@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS ix_product_category_id ON product (category_id);
+CREATE INDEX IF NOT EXISTS ix_product_name ON product (name);
+CREATE INDEX IF NOT EXISTS ix_category_name ON category (name);
@@ -0,0 +1,23 @@
+CREATE TEMP TABLE migration_0003_check (id INTEGER);
+
+CREATE TEMP TRIGGER tr_migration_0003_check BEFORE INSERT ON migration_0003_check BEGIN
+    SELECT RAISE(ABORT, 'Миграция 0003: в product.price есть пустые или нечисловые цены, исправьте их перед миграцией') WHERE EXISTS (SELECT 1 FROM main.product WHERE price IS NULL OR trim(price) = '' OR price GLOB '*[^0-9.]*' OR price GLOB '*.*.*' OR price NOT GLOB '*[0-9]*');
+    SELECT RAISE(ABORT, 'Миграция 0003: в product.price есть дробные цены, исправьте их перед миграцией') WHERE EXISTS (SELECT 1 FROM main.product WHERE CAST(price AS INTEGER) <> CAST(price AS REAL));
+END;
+
+INSERT INTO migration_0003_check VALUES (1);
+DROP TABLE migration_0003_check;
+
+CREATE TABLE product_new (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, product_type VARCHAR (32), name VARCHAR (255), category_id INTEGER, price INTEGER NOT NULL DEFAULT 0, desc VARCHAR (255), img VARCHAR (255));
+
+INSERT INTO product_new (id, product_type, name, category_id, price, desc, img)
+SELECT id, product_type, name, category_id, CAST(price AS INTEGER), desc, img FROM product;
+
+UPDATE sqlite_sequence SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('product', 'product_new'))
+WHERE name = 'product_new';
+
+DROP TABLE product;
+ALTER TABLE product_new RENAME TO product;
+
+CREATE INDEX ix_product_category_id ON product (category_id);
+CREATE INDEX ix_product_name ON product (name);
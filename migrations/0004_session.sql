@@ -0,0 +1,3 @@
+CREATE TABLE IF NOT EXISTS session (sid VARCHAR (64) PRIMARY KEY NOT NULL, data TEXT NOT NULL, expires REAL NOT NULL) WITHOUT ROWID;
+
+CREATE INDEX ix_session_expires ON session (expires);
@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS basket_item (user VARCHAR (255) NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL DEFAULT 1, created REAL NOT NULL, PRIMARY KEY (user, product_id)) WITHOUT ROWID;
+
+CREATE INDEX ix_basket_item_created ON basket_item (created);
+
+CREATE TABLE IF NOT EXISTS shop_order (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, user VARCHAR (255) NOT NULL, status VARCHAR (32) NOT NULL DEFAULT 'new', pay_method VARCHAR (32), created REAL NOT NULL);
+
+CREATE INDEX ix_shop_order_user_created ON shop_order (user, created);
+CREATE INDEX ix_shop_order_created ON shop_order (created);
+
+CREATE TABLE IF NOT EXISTS order_item (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, order_id INTEGER NOT NULL REFERENCES shop_order (id), product_id INTEGER NOT NULL, name VARCHAR (255), price INTEGER NOT NULL, quantity INTEGER NOT NULL);
+
+CREATE INDEX ix_order_item_order_id ON order_item (order_id);
@@ -0,0 +1,3 @@
+CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, topic VARCHAR (64) NOT NULL, payload TEXT NOT NULL, status VARCHAR (16) NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, created REAL NOT NULL, error TEXT);
+
+CREATE INDEX ix_outbox_pending ON outbox (available_at) WHERE status = 'pending';
@@ -0,0 +1,18 @@
+CREATE VIEW IF NOT EXISTS product_search_source AS SELECT id, replace(replace(name, 'ё', 'е'), 'Ё', 'Е') AS name, replace(replace("desc", 'ё', 'е'), 'Ё', 'Е') AS "desc" FROM product;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5 (name, "desc", content = 'product_search_source', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3');
+
+CREATE TRIGGER IF NOT EXISTS tr_product_search_insert AFTER INSERT ON product BEGIN
+    INSERT INTO product_search (rowid, name, "desc") VALUES (new.id, replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(new."desc", 'ё', 'е'), 'Ё', 'Е'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_product_search_delete AFTER DELETE ON product BEGIN
+    INSERT INTO product_search (product_search, rowid, name, "desc") VALUES ('delete', old.id, replace(replace(old.name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(old."desc", 'ё', 'е'), 'Ё', 'Е'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_product_search_update AFTER UPDATE OF name, "desc" ON product BEGIN
+    INSERT INTO product_search (product_search, rowid, name, "desc") VALUES ('delete', old.id, replace(replace(old.name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(old."desc", 'ё', 'е'), 'Ё', 'Е'));
+    INSERT INTO product_search (rowid, name, "desc") VALUES (new.id, replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(new."desc", 'ё', 'е'), 'Ё', 'Е'));
+END;
+
+INSERT INTO product_search (product_search) VALUES ('rebuild');
@@ -0,0 +1,38 @@
+CREATE TABLE IF NOT EXISTS category_tree (ancestor_id INTEGER NOT NULL, descendant_id INTEGER NOT NULL, depth INTEGER NOT NULL, PRIMARY KEY (ancestor_id, descendant_id)) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS ix_category_tree_descendant ON category_tree (descendant_id, depth);
+
+CREATE TABLE IF NOT EXISTS category_tree_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL);
+
+INSERT INTO category_tree_version (id, version) VALUES (1, 1);
+
+WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0 FROM category
+    UNION ALL
+    SELECT tree.ancestor_id, category.id, tree.depth + 1 FROM tree JOIN category ON category.category_id = tree.descendant_id WHERE tree.depth < 64
+)
+INSERT OR IGNORE INTO category_tree (ancestor_id, descendant_id, depth) SELECT ancestor_id, descendant_id, depth FROM tree;
+
+CREATE TRIGGER IF NOT EXISTS tr_category_tree_insert AFTER INSERT ON category BEGIN
+    INSERT INTO category_tree (ancestor_id, descendant_id, depth) SELECT ancestor_id, new.id, depth + 1 FROM category_tree WHERE descendant_id = new.category_id UNION ALL SELECT new.id, new.id, 0;
+    UPDATE category_tree_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_category_tree_cycle BEFORE UPDATE OF category_id ON category WHEN EXISTS (SELECT 1 FROM category_tree WHERE ancestor_id = new.id AND descendant_id = new.category_id) BEGIN
+    SELECT RAISE(ABORT, 'category cycle');
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_category_tree_move AFTER UPDATE OF category_id ON category WHEN old.category_id IS NOT new.category_id BEGIN
+    DELETE FROM category_tree WHERE descendant_id IN (SELECT descendant_id FROM category_tree WHERE ancestor_id = new.id) AND ancestor_id NOT IN (SELECT descendant_id FROM category_tree WHERE ancestor_id = new.id);
+    INSERT INTO category_tree (ancestor_id, descendant_id, depth) SELECT parent.ancestor_id, subtree.descendant_id, parent.depth + subtree.depth + 1 FROM category_tree AS parent, category_tree AS subtree WHERE parent.descendant_id = new.category_id AND subtree.ancestor_id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_category_tree_update AFTER UPDATE ON category BEGIN
+    UPDATE category_tree_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_category_tree_delete AFTER DELETE ON category BEGIN
+    UPDATE category SET category_id = old.category_id WHERE category_id = old.id;
+    DELETE FROM category_tree WHERE ancestor_id = old.id OR descendant_id = old.id;
+    UPDATE category_tree_version SET version = version + 1;
+END;
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS product_image (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, product_id INTEGER NOT NULL, digest VARCHAR (32) NOT NULL, ext VARCHAR (8) NOT NULL, size INTEGER NOT NULL, width INTEGER, height INTEGER, thumbnails VARCHAR (64) NOT NULL DEFAULT '', status VARCHAR (16) NOT NULL DEFAULT 'pending', error TEXT, created REAL NOT NULL);
+
+CREATE INDEX IF NOT EXISTS ix_product_image_product_id ON product_image (product_id);
+
+CREATE INDEX IF NOT EXISTS ix_product_image_pending ON product_image (id) WHERE status = 'pending';
+
+CREATE TRIGGER IF NOT EXISTS tr_product_image_delete AFTER DELETE ON product BEGIN
+    DELETE FROM product_image WHERE product_id = old.id;
+END;
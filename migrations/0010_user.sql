@@ -0,0 +1 @@
+CREATE TABLE IF NOT EXISTS shop_user (name VARCHAR (255) PRIMARY KEY NOT NULL, user_type VARCHAR (32) NOT NULL DEFAULT 'buyer', password_hash VARCHAR (255) NOT NULL, created REAL NOT NULL) WITHOUT ROWID;
@@ -0,0 +1,39 @@
+CREATE TABLE IF NOT EXISTS data_version (name VARCHAR (64) PRIMARY KEY NOT NULL, version INTEGER NOT NULL) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO data_version (name, version) VALUES ('product', 1), ('category', 1);
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_insert AFTER INSERT ON product BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_update AFTER UPDATE ON product BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_delete AFTER DELETE ON product BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_image_insert AFTER INSERT ON product_image BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_image_update AFTER UPDATE ON product_image BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_image_delete AFTER DELETE ON product_image BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_category_insert AFTER INSERT ON category BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_category_update AFTER UPDATE ON category BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_category_delete AFTER DELETE ON category BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'category';
+END;
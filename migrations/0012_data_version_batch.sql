@@ -0,0 +1,55 @@
+CREATE TABLE IF NOT EXISTS data_version_batch (name VARCHAR (64) PRIMARY KEY NOT NULL) WITHOUT ROWID;
+
+DROP TRIGGER IF EXISTS tr_data_version_product_insert;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_insert AFTER INSERT ON product WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'product') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_product_update;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_update AFTER UPDATE ON product WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'product') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_product_delete;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_delete AFTER DELETE ON product WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'product') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_product_image_insert;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_image_insert AFTER INSERT ON product_image WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'product') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_product_image_update;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_image_update AFTER UPDATE ON product_image WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'product') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_product_image_delete;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_product_image_delete AFTER DELETE ON product_image WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'product') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'product';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_category_insert;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_category_insert AFTER INSERT ON category WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'category') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'category';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_category_update;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_category_update AFTER UPDATE ON category WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'category') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'category';
+END;
+
+DROP TRIGGER IF EXISTS tr_data_version_category_delete;
+
+CREATE TRIGGER IF NOT EXISTS tr_data_version_category_delete AFTER DELETE ON category WHEN NOT EXISTS (SELECT 1 FROM data_version_batch WHERE name = 'category') BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'category';
+END;
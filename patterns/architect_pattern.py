@@ -1,49 +1,86 @@
 """Архитектурный системный паттерн UnitOfWork"""
 from threading import local
 
+from errors import DbCommitException
+
 
 class UnitOfWork:
-    """Паттерн UnitOfWork"""
+    """
+    Паттерн UnitOfWork. Объекты регистрируются один раз, удаление еще не вставленного объекта
+    отменяет его вставку. При фиксации объекты группируются по мапперу и операции,
+    каждая группа записывается одним запросом, а вся фиксация - одной транзакцией.
+    Карта идентичности гарантирует, что в пределах единицы работы каждой строке таблицы
+    соответствует один объект. Версии данных для кэшей чтения (data_version) читаются один раз
+    за единицу работы и сбрасываются при записи
+    """
     current = local()
 
     def __init__(self):
-        self.new_objects = []
-        self.dirty_objects = []
-        self.removed_objects = []
+        self.new_objects = {}
+        self.dirty_objects = {}
+        self.removed_objects = {}
+        self.identity_map = {}
+        self.data_version = None
         self.MapperRegistry = None
 
     def set_mapper_registry(self, mapper_registry):
         self.MapperRegistry = mapper_registry
 
+    def get_object(self, table, _id):
+        return self.identity_map.get((table, _id))
+
+    def add_object(self, table, obj):
+        self.identity_map[(table, obj.id)] = obj
+
+    def remove_object(self, table, obj):
+        self.identity_map.pop((table, obj.id), None)
+
     def register_new(self, obj):
-        self.new_objects.append(obj)
+        self.new_objects[id(obj)] = obj
 
     def register_dirty(self, obj):
-        self.dirty_objects.append(obj)
+        key = id(obj)
+        if key not in self.new_objects and key not in self.removed_objects:
+            self.dirty_objects[key] = obj
 
     def register_removed(self, obj):
-        self.removed_objects.append(obj)
+        key = id(obj)
+        if self.new_objects.pop(key, None) is not None:
+            return
+        self.dirty_objects.pop(key, None)
+        self.removed_objects[key] = obj
+
+    def group_by_mapper(self, objects):
+        """
+        Группирует объекты по классу, для каждой группы получает маппер один раз
+        :param objects: словарь зарегистрированных объектов
+        :return: список пар (маппер, список объектов)
+        """
+        groups = {}
+        for obj in objects.values():
+            groups.setdefault(type(obj), []).append(obj)
+        return [(self.MapperRegistry.get_mapper(objs[0]), objs) for objs in groups.values()]
 
     def commit(self):
-        self.insert_new()
-        self.update_dirty()
-        self.delete_removed()
-
-        self.new_objects.clear()
-        self.dirty_objects.clear()
-        self.removed_objects.clear()
-
-    def insert_new(self):
-        for obj in self.new_objects:
-            self.MapperRegistry.get_mapper(obj).insert(obj)
-
-    def update_dirty(self):
-        for obj in self.dirty_objects:
-            self.MapperRegistry.get_mapper(obj).update(obj)
-
-    def delete_removed(self):
-        for obj in self.removed_objects:
-            self.MapperRegistry.get_mapper(obj).delete(obj)
+        operations = [(mapper, mapper.insert_many, objs) for mapper, objs in self.group_by_mapper(self.new_objects)]
+        operations += [(mapper, mapper.update_many, objs) for mapper, objs in self.group_by_mapper(self.dirty_objects)]
+        operations += [(mapper, mapper.delete_many, objs) for mapper, objs in self.group_by_mapper(self.removed_objects)]
+        connections = {id(mapper.connection): mapper.connection for mapper, _, _ in operations}
+        try:
+            for _, write, objs in operations:
+                write(objs)
+            for connection in connections.values():
+                connection.commit()
+        except Exception as err:
+            for connection in connections.values():
+                connection.rollback()
+            raise DbCommitException(err.args)
+        finally:
+            self.new_objects.clear()
+            self.dirty_objects.clear()
+            self.removed_objects.clear()
+            for mapper, _, _ in operations:
+                mapper.invalidate()
 
     @staticmethod
     def new_current():
@@ -55,7 +92,7 @@ class UnitOfWork:
 
     @classmethod
     def get_current(cls):
-        return cls.current.unit_of_work
+        return getattr(cls.current, 'unit_of_work', None)
 
 
 class DomainObject:
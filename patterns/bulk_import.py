@@ -0,0 +1,230 @@
+"""Потоковая пакетная загрузка каталога из файлов json"""
+from json import JSONDecoder, JSONDecodeError
+from time import perf_counter
+
+from errors import DbCommitException
+from patterns.pattern_creator import CategoryMapper, ProductsMapper, ProductFactory, Category
+
+READ_CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(file, chunk_size=READ_CHUNK_SIZE):
+    """
+    Последовательно разбирает json-массив из файла, не загружая файл в память целиком
+    :param file: открытый текстовый файл с массивом json
+    :param chunk_size: размер читаемого блока
+    :return: генератор элементов массива
+    """
+    decoder = JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def next_char():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                raise JSONDecodeError('Неожиданный конец файла', buffer, position)
+
+    if next_char() != '[':
+        raise JSONDecodeError('Ожидался массив', buffer, position)
+    position += 1
+    if next_char() == ']':
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                if end < len(buffer) or eof:
+                    break
+            except JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        position = end
+        yield item
+
+        char = next_char()
+        if char == ']':
+            return
+        if char != ',':
+            raise JSONDecodeError('Ожидалась запятая', buffer, position)
+        position += 1
+
+
+def parse_price(value):
+    """
+    Цена товара в целых единицах, как в колонке price (миграция 0003)
+    :param value: число или строка из json
+    :return: int; ValueError для нечисловой или дробной цены
+    """
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f'дробная цена {value}')
+    return int(value)
+
+
+class ImportStats:
+    """Результаты загрузки"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.started = perf_counter()
+
+    @property
+    def total(self):
+        return self.inserted + self.updated + self.skipped
+
+    @property
+    def rate(self):
+        elapsed = perf_counter() - self.started
+        return self.total / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return f'добавлено {self.inserted}, обновлено {self.updated}, пропущено {self.skipped}, ' \
+               f'{self.rate:.0f} строк/с'
+
+
+class CatalogImporter:
+    """
+    Пакетная загрузка категорий и товаров. Имена категорий разрешаются по словарю, загруженному
+    одним запросом, строки вставляются через executemany, каждая пачка - одна транзакция.
+    В режиме upsert записи с уже существующим именем обновляются, а не добавляются повторно
+    """
+
+    def __init__(self, connection, batch_size=1000, upsert=False, logger=None):
+        """
+        :param connection: соединение с базой данных
+        :param batch_size: количество строк в одной транзакции
+        :param upsert: обновлять существующие записи с тем же именем
+        :param logger: логгер для сообщений о ходе загрузки
+        """
+        self.connection = connection
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.logger = logger
+
+    def report(self, what, stats):
+        """Пишет ход загрузки; счетчики передаются значениями, объект stats продолжает меняться"""
+        if self.logger:
+            self.logger.log('Загрузка %s: добавлено %s, обновлено %s, пропущено %s, %.0f строк/с',
+                            what, stats.inserted, stats.updated, stats.skipped, stats.rate)
+
+    def skip(self, what, number, err):
+        """Сообщает о записи, которую не удалось разобрать: запись пропускается, загрузка продолжается"""
+        if self.logger:
+            self.logger.warning('Загрузка %s: пропущена запись %s: %r', what, number, err)
+
+    def flush(self, mapper, inserts, updates, stats):
+        """Записывает пачку в одной транзакции"""
+        try:
+            mapper.insert_many(inserts)
+            mapper.update_many(updates)
+            self.connection.commit()
+        except Exception as err:
+            self.connection.rollback()
+            raise DbCommitException(err.args)
+        finally:
+            mapper.invalidate()
+        stats.inserted += len(inserts)
+        stats.updated += len(updates)
+
+    def load(self, file, mapper, build, what):
+        """
+        Общий цикл загрузки
+        :param file: файл с json-массивом
+        :param mapper: маппер таблицы
+        :param build: функция, создающая объект из элемента json или возвращающая None для пропуска;
+            KeyError, TypeError и ValueError из нее означают некорректную запись, которая тоже пропускается
+        :param what: название загружаемых данных для отчета
+        :return: ImportStats
+        """
+        stats = ImportStats()
+        existing = mapper.name_map() if self.upsert else {}
+        pending = {}
+        updates = {}
+
+        for number, item in enumerate(iter_json_array(file), 1):
+            try:
+                obj = build(item)
+            except (KeyError, TypeError, ValueError) as err:
+                self.skip(what, number, err)
+                obj = None
+            if obj is None:
+                stats.skipped += 1
+                continue
+            if not self.upsert:
+                pending[len(pending)] = obj
+            elif obj.name in existing:
+                obj.id = existing[obj.name]
+                updates[obj.name] = obj
+            else:
+                pending[obj.name] = obj
+
+            if len(pending) + len(updates) >= self.batch_size:
+                inserts = list(pending.values())
+                self.flush(mapper, inserts, list(updates.values()), stats)
+                if self.upsert:
+                    existing.update((obj.name, obj.id) for obj in inserts)
+                pending.clear()
+                updates.clear()
+                self.report(what, stats)
+
+        self.flush(mapper, list(pending.values()), list(updates.values()), stats)
+        self.report(what, stats)
+        return stats
+
+    def import_categories(self, file):
+        """
+        Загружает категории из файла
+        :param file: файл с json-массивом категорий
+        :return: ImportStats
+        """
+        def build(item):
+            category = Category(item['name'], item.get('category_id'))
+            category.desc = item.get('desc', '')
+            category.img = item.get('img', '')
+            return category
+
+        return self.load(file, CategoryMapper(self.connection), build, 'категорий')
+
+    def import_products(self, file):
+        """
+        Загружает товары из файла. Товары с неизвестной категорией, без обязательных полей
+        или с нечисловой либо дробной ценой пропускаются
+        :param file: файл с json-массивом товаров
+        :return: ImportStats
+        """
+        categories = CategoryMapper(self.connection).name_map()
+
+        def build(item):
+            category_id = categories.get(item['category'])
+            if category_id is None:
+                return None
+            product = ProductFactory.create(item['product_type'], item['name'], category_id,
+                                            parse_price(item['price']))
+            product.desc = item.get('desc', '')
+            product.img = item.get('img', '')
+            return product
+
+        return self.load(file, ProductsMapper(self.connection), build, 'товаров')
@@ -1,16 +1,35 @@
+import hmac
+import re
+import secrets
 from abc import ABCMeta, abstractmethod
-from quopri import decodestring
-from sqlite3 import connect
-from time import time
+from collections import deque
+from functools import wraps
+from hashlib import pbkdf2_hmac
+from itertools import dropwhile, islice, takewhile
+from threading import Lock
+from time import localtime, perf_counter_ns, sleep, strftime, time
+from types import MappingProxyType
+from urllib.parse import urlencode
+
+from json import dumps as json_dumps
+from sqlite3 import IntegrityError
 
 from jsonpickle import dumps, loads
 
-from errors import RecordNotFoundException, DbCommitException, DbUpdateException
+from errors import RecordNotFoundException, DbCommitException, DbUpdateException, DbDeleteException, \
+    DuplicateKeyException
+from framework.cache import LRUCache, CachePolicy, invalidate_tags, set_version_source
+from framework.db import ConnectionPool
+from framework.images import IMAGE_STORE
+from framework.logs import AsyncFileWriter
+from framework.metrics import METRICS, TracedConnection
+from framework.outbox import OUTBOX_TABLE
+from framework.requests import Response
 from framework.templator import render
 import variables
-from patterns.architect_pattern import DomainObject
+from patterns.architect_pattern import DomainObject, UnitOfWork
 
-connection = connect('store.sqlite')
+POOL = ConnectionPool('store.sqlite', factory=TracedConnection)
 
 
 class Observer(metaclass=ABCMeta):
@@ -35,40 +54,123 @@ class Subject:
             item.update(self)
 
 
-class SmsOrderNotifier(Observer):
-    def update(self, subject):
-        print(f'SMS ---> Создан и оплачен заказ на сумму {subject.get_total_price()}')
+class ConsoleGateway:
+    """Шлюз отправки уведомлений, печатающий сообщения в консоль"""
+    def send(self, messages):
+        for message in messages:
+            print(message)
 
 
-class EmailOrderNotifier(Observer):
+class StubGateway:
+    """Локальная заглушка шлюза для проверок: запоминает сообщения, может задерживать отправку и отказывать"""
+    def __init__(self, delay=0.0, failures=0):
+        """
+        :param delay: задержка каждого вызова send, секунды
+        :param failures: сколько первых вызовов send завершатся ошибкой
+        """
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+        self.sent = []
+        self.lock = Lock()
+
+    def send(self, messages):
+        if self.delay:
+            sleep(self.delay)
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.failures:
+                raise ConnectionError(f'шлюз недоступен, вызов {self.calls}')
+            self.sent.extend(messages)
+
+
+class OrderNotifier(Observer):
+    """
+    Уведомление о заказе. update не отправляет сообщение, а ставит его в outbox текущей единицы работы:
+    оно записывается в одной транзакции с заказом и доставляется через шлюз фоновым OutboxWorker
+    """
+    topic = ''
+    template = ''
+
+    def __init__(self, gateway=None):
+        self.gateway = gateway if gateway is not None else ConsoleGateway()
+
     def update(self, subject):
-        print(f'E-mail ---> Создан и оплачен заказ на сумму {subject.get_total_price()}')
+        OutboxMessage(self.topic, subject.get_notification()).mark_new()
+
+    def deliver(self, payloads):
+        """Отправляет пачку уведомлений одним вызовом шлюза"""
+        self.gateway.send([self.template.format(**payload) for payload in payloads])
+
+
+class SmsOrderNotifier(OrderNotifier):
+    topic = 'order.sms'
+    template = 'SMS ---> Создан и оплачен заказ № {order_id} на сумму {total}'
+
+
+class EmailOrderNotifier(OrderNotifier):
+    topic = 'order.email'
+    template = 'E-mail ---> Создан и оплачен заказ № {order_id} на сумму {total}'
+
 
+PASSWORD_ITERATIONS = 200_000
 
-class AbstractUser:
-    """Класс абстрактного пользователя"""
-    def __init__(self, name, password):
+
+def hash_password(password, iterations=PASSWORD_ITERATIONS):
+    """
+    Хэш пароля для хранения в базе: pbkdf2_sha256 со случайной солью
+    :return: строка 'pbkdf2_sha256$итерации$соль$хэш'
+    """
+    salt = secrets.token_hex(16)
+    digest = pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('ascii'), iterations).hex()
+    return f'pbkdf2_sha256${iterations}${salt}${digest}'
+
+
+def verify_password(password, password_hash):
+    """Проверяет пароль по хэшу из hash_password, сравнение не зависит по времени от совпадающих символов"""
+    try:
+        algorithm, iterations, salt, digest = password_hash.split('$')
+    except ValueError:
+        return False
+    if algorithm != 'pbkdf2_sha256':
+        return False
+    candidate = pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('ascii'), int(iterations)).hex()
+    return hmac.compare_digest(candidate, digest)
+
+
+class AbstractUser(DomainObject):
+    """
+    Класс абстрактного пользователя. Пользователи хранятся в таблице shop_user (UserMapper) и общие
+    для всех процессов; пароль хранится только в виде хэша
+    """
+    user_type = None
+
+    def __init__(self, name, password_hash, created=None):
         self.name = name
-        self.password = password
-        self.is_login = False
+        self.password_hash = password_hash
+        self.created = time() if created is None else created
+
+    def check_password(self, password):
+        return verify_password(password, self.password_hash)
 
-    def login(self):
-        self.is_login = True
-        variables.AUTH_USER = self.name
+    def login(self, session):
+        """Запоминает пользователя в сессии; идентификатор сессии меняется"""
+        session.regenerate()
+        session['user'] = self.name
 
-    def logout(self):
-        self.is_login = False
-        variables.AUTH_USER = 'Анонимный'
+    @staticmethod
+    def logout(session):
+        session.clear()
 
 
 class Buyer(AbstractUser):
     """Класс покупателя"""
-    pass
+    user_type = 'buyer'
 
 
 class Staff(AbstractUser):
     """Класс персонала"""
-    pass
+    user_type = 'staff'
 
 
 class UserFactory:
@@ -80,7 +182,8 @@ class UserFactory:
 
     @classmethod
     def create(cls, user_type, name, password):
-        return cls.user_types[user_type](name, password)
+        """Создает нового пользователя, пароль сохраняется в виде хэша"""
+        return cls.user_types[user_type](name, hash_password(password))
 
 
 class Product:
@@ -125,7 +228,7 @@ class ProductFactory:
         return cls.product_types[product_type](name, category, price)
 
 
-class Category:
+class Category(DomainObject):
     """Класс категории"""
     # id_count = 0
 
@@ -139,58 +242,240 @@ class Category:
         self.img = ''
 
 
+class BasketItem(DomainObject):
+    """Строка корзины: товар и его количество. Ключ строки - пользователь и id товара"""
+    def __init__(self, user, product_id, quantity=1, created=None):
+        self.user = user
+        self.product_id = product_id
+        self.quantity = quantity
+        self.created = time() if created is None else created
+
+
 class Basket:
-    """Класс корзины"""
+    """
+    Класс корзины. Строки корзины хранятся в таблице basket_item и записываются через UnitOfWork,
+    поэтому корзина общая для всех процессов и не занимает память рабочего процесса
+    """
     def __init__(self, user):
         self.user = user
-        self.product_list = []
 
-    def add_to_basket(self, product):
-        self.product_list.append(product)
+    @property
+    def mapper(self):
+        return MapperRegistry.get_current_mapper('basket')
+
+    def add_to_basket(self, product, quantity=1):
+        """Добавляет товар; если товар уже в корзине, при фиксации увеличивается его количество"""
+        BasketItem(self.user, product.id, quantity).mark_new()
 
     def remove_from_basket(self, product):
-        self.product_list.remove(product)
+        BasketItem(self.user, product.id).mark_removed()
 
     def get_product_list(self):
-        return self.product_list
+        """Товары корзины в порядке добавления; товары, удаленные из каталога, пропускаются"""
+        return self.mapper.products(self.user)
+
+    def get_total_price(self):
+        """Сумма корзины, вычисляется в SQL"""
+        return self.mapper.total(self.user)
+
+    def is_empty(self):
+        return not self.mapper.exists(self.user)
 
     def get_user(self):
         return self.user
 
 
-class Order(Subject):
-    """Класс заказа"""
-    id_count = 0
+class Order(Subject, DomainObject):
+    """Класс заказа. Заказ и его строки хранятся в таблицах shop_order и order_item, сумма вычисляется в SQL"""
 
-    def __init__(self, basket):
-        self.id = Order.id_count
-        Order.id_count += 1
-        self.user = basket.get_user()
-        self.product_list = basket.get_product_list()
+    def __init__(self, user, total=0, status='new', pay_method=None, created=None):
+        self.id = None
+        self.user = user
+        self.total = total
+        self.status = status
+        self.pay_method = pay_method
+        self.created = time() if created is None else created
         super().__init__()
 
     def get_total_price(self):
-        total_price = 0
-        for item in self.product_list:
-            total_price += int(item.price)
+        return self.total
 
-        return total_price
+    def get_notification(self):
+        """Данные для уведомлений о заказе"""
+        return {'order_id': self.id, 'user': self.user, 'total': self.total}
 
     def pay(self, pay_method):
-        total = self.get_total_price()
-        pay_method.pay(total)
+        pay_method.pay(self.total)
+        self.status = 'paid'
+        self.pay_method = pay_method.name
+        self.mark_dirty()
         self.notify()
 
 
+class OutboxMessage(DomainObject):
+    """Исходящее сообщение: тема и данные в JSON, записывается через UnitOfWork в таблицу outbox"""
+    def __init__(self, topic, payload):
+        self.id = None
+        self.topic = topic
+        self.payload = payload
+        self.created = time()
+
+
+class ProductImage(DomainObject):
+    """
+    Изображение товара в хранилище IMAGE_STORE: хэш содержимого, расширение и ширины готовых миниатюр.
+    Пока миниатюры строятся (status pending) или если Pillow недоступен, в шаблонах используется оригинал
+    """
+    def __init__(self, product_id, digest, ext, size, width=None, height=None, thumbnails=(), status='pending',
+                 created=None):
+        self.id = None
+        self.product_id = product_id
+        self.digest = digest
+        self.ext = ext
+        self.size = size
+        self.width = width
+        self.height = height
+        self.thumbnails = tuple(thumbnails)
+        self.status = status
+        self.created = time() if created is None else created
+
+    @property
+    def url(self):
+        """Адрес оригинала"""
+        return IMAGE_STORE.url(self.digest, self.ext)
+
+    def thumbnail_url(self, width):
+        """Адрес миниатюры не уже width или самой широкой из готовых; оригинал, если миниатюр нет"""
+        for thumbnail in self.thumbnails:
+            if thumbnail >= width:
+                return IMAGE_STORE.url(self.digest, self.ext, thumbnail)
+        return IMAGE_STORE.url(self.digest, self.ext, self.thumbnails[-1]) if self.thumbnails else self.url
+
+    def srcset(self, url=None):
+        """
+        Значение атрибута srcset: миниатюры и оригинал с их ширинами
+        :param url: функция преобразования адреса, например static_url
+        """
+        url = url or (lambda value: value)
+        items = [f'{url(IMAGE_STORE.url(self.digest, self.ext, width))} {width}w' for width in self.thumbnails]
+        if self.width:
+            items.append(f'{url(self.url)} {self.width}w')
+        return ', '.join(items)
+
+
+class IndexedCollection:
+    """
+    Коллекция объектов с хэш-индексами по атрибутам. По уникальному индексу объект находится за O(1),
+    по неуникальному - все объекты с данным значением атрибута. Индексы обновляются при добавлении и удалении
+    объекта, а при изменении индексируемого атрибута - методом update. Значения None не индексируются
+    """
+
+    def __init__(self, unique=(), multi=()):
+        """
+        :param unique: атрибуты уникальных индексов
+        :param multi: атрибуты неуникальных индексов
+        """
+        self.items = {}
+        self.unique = {name: {} for name in unique}
+        self.multi = {name: {} for name in multi}
+
+    def check_unique(self, item, values):
+        for name, value in values.items():
+            index = self.unique.get(name)
+            if index is not None and value is not None and index.get(value, item) is not item:
+                raise DuplicateKeyException(f'{name} = {value}')
+
+    def index(self, item):
+        key = id(item)
+        for name, index in self.unique.items():
+            value = getattr(item, name, None)
+            if value is not None:
+                index[value] = item
+        for name, index in self.multi.items():
+            value = getattr(item, name, None)
+            if value is not None:
+                index.setdefault(value, {})[key] = item
+
+    def unindex(self, item):
+        key = id(item)
+        for name, index in self.unique.items():
+            value = getattr(item, name, None)
+            if value is not None and index.get(value) is item:
+                del index[value]
+        for name, index in self.multi.items():
+            bucket = index.get(getattr(item, name, None))
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del index[getattr(item, name)]
+
+    def add(self, item):
+        """
+        Добавляет объект
+        :raises DuplicateKeyException: значение уникального атрибута уже занято другим объектом
+        """
+        if id(item) in self.items:
+            return
+        for name, index in self.unique.items():
+            value = getattr(item, name, None)
+            if value is not None and value in index:
+                raise DuplicateKeyException(f'{name} = {value}')
+        self.items[id(item)] = item
+        self.index(item)
+
+    append = add
+
+    def remove(self, item):
+        if self.items.pop(id(item), None) is None:
+            raise RecordNotFoundException(f'объект {item} отсутствует в коллекции')
+        self.unindex(item)
+
+    def update(self, item, **changes):
+        """
+        Изменяет атрибуты объекта коллекции и обновляет индексы
+        :param item: объект коллекции
+        :param changes: новые значения атрибутов
+        """
+        self.check_unique(item, changes)
+        self.unindex(item)
+        for name, value in changes.items():
+            setattr(item, name, value)
+        self.index(item)
+
+    def get(self, name, value, default=None):
+        """Объект с уникальным атрибутом name, равным value"""
+        return self.unique[name].get(value, default)
+
+    def filter(self, name, value):
+        """Объекты с атрибутом name, равным value, в порядке добавления"""
+        return list(self.multi[name].get(value, {}).values())
+
+    def first(self, name, value, default=None):
+        bucket = self.multi[name].get(value)
+        return next(iter(bucket.values())) if bucket else default
+
+    def last(self, count):
+        """Последние добавленные объекты, от новых к старым"""
+        return list(islice(reversed(self.items.values()), count))
+
+    def __iter__(self):
+        return iter(self.items.values())
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return id(item) in self.items
+
+
 class Engine:
-    """Основной класс"""
+    """
+    Основной класс. Категории и товары хранятся в коллекциях с индексами по id и имени,
+    пользователи - в базе данных (UserMapper)
+    """
     def __init__(self):
-        self.buyers = []
-        self.staff = []
-        self.products = []
-        self.categories = []
-        self.baskets = []
-        self.orders = []
+        self.products = IndexedCollection(unique=('id',), multi=('name', 'category_id'))
+        self.categories = IndexedCollection(unique=('id',), multi=('name',))
 
     @staticmethod
     def create_user(user_type, name, password):
@@ -201,18 +486,26 @@ class Engine:
         :param password: пароль
         :return: экземпляр класса пользователя соответствующего типа
         """
-        new_user = UserFactory.create(user_type, name, password)
-        new_user.login()
-        return new_user
+        return UserFactory.create(user_type, name, password)
+
+    @staticmethod
+    def add_user(user):
+        """
+        Регистрирует пользователя среди покупателей или персонала
+        :raises DuplicateKeyException: пользователь с таким именем уже есть
+        """
+        MapperRegistry.get_current_mapper('user').insert(user)
+
+    @staticmethod
+    def remove_user(user):
+        MapperRegistry.get_current_mapper('user').delete(user)
 
-    def get_user_by_name(self, name):
-        for user in self.buyers:
-            if user.name == name:
-                return user
-        for user in self.staff:
-            if user.name == name:
-                return user
-        raise Exception(f'Не найден пользователь с именем {name}')
+    @staticmethod
+    def get_user_by_name(name):
+        """
+        :raises RecordNotFoundException: пользователя нет
+        """
+        return MapperRegistry.get_current_mapper('user').find_by_name(name)
 
     @staticmethod
     def create_category(name, category=None):
@@ -224,31 +517,37 @@ class Engine:
         """
         return Category(name, category)
 
+    def add_category(self, category):
+        self.categories.add(category)
+
+    def remove_category(self, category):
+        self.categories.remove(category)
+
     def get_category_by_id(self, _id):
         """
         Осуществляет поиск категории по id
         :param _id: id искомой категории
         :return: экземпляр класса категории
         """
-        for category in self.categories:
-            if category.id == _id:
-                return category
-        raise Exception(f'Не найдена категория с id = {_id}')
+        category = self.categories.get('id', _id)
+        if category is None:
+            raise RecordNotFoundException(f'категория с id = {_id}')
+        return category
 
     def get_category_by_name(self, name):
         """
         Осуществляет поиск категории по имени
         :param name: имя категории
-        :return: экземпляр класса категории
+        :return: экземпляр класса категории (первой добавленной, если имя повторяется)
         """
-        for category in self.categories:
-            if category.name == name:
-                return category
-        raise Exception(f'Категория {name} не найдена')
+        category = self.categories.first('name', name)
+        if category is None:
+            raise RecordNotFoundException(f'категория {name}')
+        return category
 
     def get_all_categories(self):
         """Получает список всех категорий"""
-        return self.categories
+        return list(self.categories)
 
     @staticmethod
     def create_product(product_type, name, category, price):
@@ -262,88 +561,72 @@ class Engine:
         """
         return ProductFactory.create(product_type, name, category, price)
 
+    def add_product(self, product):
+        self.products.add(product)
+
+    def remove_product(self, product):
+        self.products.remove(product)
+
     def get_product_by_id(self, _id):
         """
         Выполняет поиск товара по id
         :param _id: id товара
         :return: экземпляр класса товара
         """
-        for product in self.products:
-            if product.id == _id:
-                return product
-        raise Exception(f'Не найден продукт с id = {_id}')
+        product = self.products.get('id', _id)
+        if product is None:
+            raise RecordNotFoundException(f'товар с id = {_id}')
+        return product
 
     def get_product_by_name(self, name):
         """
         Выполняет поиск товара по имени
         :param name: имя товара
-        :return: экземпляр класса товара
+        :return: экземпляр класса товара (первого добавленного, если имя повторяется)
         """
-        for product in self.products:
-            if product.name == name:
-                return product
-        raise Exception(f'Продукт {name} не найден')
+        product = self.products.first('name', name)
+        if product is None:
+            raise RecordNotFoundException(f'товар {name}')
+        return product
 
     def get_all_products(self):
         """Получает список всех товаров"""
-        return self.products
+        return list(self.products)
 
     def get_main_products(self):
-        """Получает список популярных товаров"""
-        main_products = []
-        try:
-            main_products = self.products[-3:]
-        except IndexError:
-            print('Отсутствуют товары в базе')
-        return main_products
+        """Получает три последних добавленных товара"""
+        return self.products.last(3)[::-1]
 
     def get_products_by_category(self, category_id):
-        """Получает список продуктов категории"""
-        for category in self.categories:
-            if category.id == category_id:
-                return category.products
-        return []
+        """Получает список товаров категории"""
+        return self.products.filter('category_id', category_id)
 
-    def create_basket(self, user):
+    @staticmethod
+    def create_basket(session):
         """
-        Создает корзину пользователя
-        :param user: пользователь
-        :return: экземпляр класса корзины пользователя
+        Создает корзину покупателя
+        :param session: сессия покупателя
+        :return: экземпляр класса корзины
         """
-        for basket in self.baskets:
-            if basket.user == user:
-                return basket
-        basket = Basket(user)
-        self.baskets.append(basket)
-        return basket
+        return Basket(session.get('user', variables.ANONYMOUS_USER))
 
-    def get_basket(self, user):
-        """Получает корзину пользователя"""
-        for basket in self.baskets:
-            if basket.user == user:
-                return basket
-        return None
+    @staticmethod
+    def get_basket(session):
+        """Получает корзину покупателя, None - если покупатель не вошел или корзина пуста"""
+        user = session.get('user')
+        if user is None:
+            return None
+        basket = Basket(user)
+        return None if basket.is_empty() else basket
 
     @staticmethod
     def create_order(basket):
         """
-        Создает заказ
+        Создает заказ из строк корзины и очищает корзину
         :param basket: Экземпляр класса корзины
         :return: Экземпляр класса заказа
         """
-        return Order(basket)
-
-    @staticmethod
-    def decode_value(val):
-        """
-        Осуществляет декодирование кириллицы и специальных символов
-        :param val: декодируемое значение
-        :return: декодированное значение
-        """
-        value_bytes = bytes(val.replace('%', '=').replace('+', ' '), 'UTF-8')
-        value_decode_str = decodestring(value_bytes).decode('UTF-8')
-
-        return value_decode_str
+        return MapperRegistry.get_current_mapper('order').create_from_basket(basket.get_user())
 
 
 class SingletonByName(type):
@@ -367,6 +650,27 @@ class SingletonByName(type):
             return cls.__instance[name]
 
 
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+
+class LogRecord:
+    """Запись журнала. Сообщение форматируется только при приведении к строке, то есть при записи"""
+    __slots__ = ('created', 'name', 'level', 'text', 'args')
+
+    def __init__(self, name, level, text, args):
+        self.created = time()
+        self.name = name
+        self.level = level
+        self.text = text
+        self.args = args
+
+    def __str__(self):
+        message = self.text % self.args if self.args else self.text
+        created = strftime('%Y-%m-%d %H:%M:%S', localtime(self.created))
+        return f'{created} {LEVEL_NAMES.get(self.level, self.level)} {self.name} log---> {message}'
+
+
 class ConsoleWriter:
     def write(self, text):
         print(text)
@@ -386,47 +690,134 @@ class WriterFabric:
     def get_writer(writer_type):
         if writer_type == 'file':
             return FileWriter()
+        elif writer_type == 'async_file':
+            return AsyncFileWriter()
         elif writer_type == 'console':
             return ConsoleWriter()
 
 
 class Logger(metaclass=SingletonByName):
-    """Класс логгера"""
-    def __init__(self, name, writer_type='file'):
+    """
+    Класс логгера. Записи ниже level отбрасываются без форматирования,
+    аргументы подставляются в text через % только при записи: LOGGER.debug('контекст %s', context)
+    """
+    def __init__(self, name, writer_type='file', level=INFO):
         self.name = name
+        self.level = level
         self.writer = WriterFabric().get_writer(writer_type)
 
-    def log(self, text):
-        text = f'log---> {text}'
-        self.writer.write(text)
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def log(self, text, *args, level=INFO):
+        if level < self.level:
+            return
+        self.writer.write(LogRecord(self.name, level, text, args))
+
+    def debug(self, text, *args):
+        self.log(text, *args, level=DEBUG)
+
+    def info(self, text, *args):
+        self.log(text, *args, level=INFO)
+
+    def warning(self, text, *args):
+        self.log(text, *args, level=WARNING)
+
+    def error(self, text, *args):
+        self.log(text, *args, level=ERROR)
 
 
 class AppRoute:
-    """Паттерн-декоратор, создающий маршруты для представлений"""
-    def __init__(self, routes, url):
+    """
+    Паттерн-декоратор, создающий маршруты для представлений.
+    url может быть шаблоном с параметрами (/products/<int:id>/) или списком таких шаблонов,
+    methods ограничивает допустимые методы запроса; по умолчанию только GET (и HEAD), на остальные методы
+    маршрутизатор отвечает 405
+    """
+    def __init__(self, routes, url, methods=('GET',)):
         self.routes = routes
-        self.url = url
+        self.urls = [url] if isinstance(url, str) else list(url)
+        self.methods = tuple(method.upper() for method in methods)
+
+    def __call__(self, cls):
+        view = cls()
+        view.methods = self.methods
+        for url in self.urls:
+            self.routes[url] = view
+        return cls
+
+
+class AppCache:
+    """
+    Паттерн-декоратор, включающий кэширование ответов представления.
+    Кэшируются ответы 200 на GET-запросы с учетом пути, параметров запроса и пользователя;
+    tags - таблицы, при изменении которых закэшированные ответы сбрасываются,
+    params - параметры запроса, которые читает представление (остальные не влияют на ключ кэша)
+    """
+    def __init__(self, ttl=60, tags=(), vary_user=True, params=None):
+        self.policy = CachePolicy(ttl, tags, vary_user, params)
 
     def __call__(self, cls):
-        self.routes[self.url] = cls()
+        cls.cache_policy = self.policy
+        return cls
+
+
+class AppCompress:
+    """
+    Паттерн-декоратор, задающий уровень сжатия ответов представления (см. CompressionMiddleware):
+    высокий - для кэшируемых страниц, которые сжимаются один раз, низкий - для больших потоковых ответов,
+    0 - без сжатия
+    """
+    def __init__(self, level):
+        self.level = level
+
+    def __call__(self, cls):
+        cls.compress_level = self.level
+        return cls
+
+
+class AppAllowFrom:
+    """
+    Паттерн-декоратор, ограничивающий доступ к представлению адресами клиентов addresses;
+    с остальных адресов отвечает 403. Запросы через прокси (с заголовком X-Forwarded-For) отклоняются:
+    в REMOTE_ADDR у них адрес прокси, а не клиента
+    """
+    def __init__(self, addresses):
+        self.addresses = frozenset(addresses)
+
+    def __call__(self, cls):
+        addresses = self.addresses
+        call = cls.__call__
+
+        @wraps(call)
+        def allowed(view, request):
+            environ = request.environ
+            if environ.get('REMOTE_ADDR') not in addresses or 'HTTP_X_FORWARDED_FOR' in environ:
+                return Response.text('Forbidden', 403)
+            return call(view, request)
+        cls.__call__ = allowed
+        return cls
 
 
 class AppTime:
-    """паттерн-декоратор, осуществляет подсчет и вывод времени работы методов декорируемого класса"""
+    """
+    паттерн-декоратор, измеряет время работы метода и записывает его в метрики
+    как этап обработки запроса с именем name (см. /metrics/)
+    """
     def __init__(self, name):
         self.name = name
 
-    def __call__(self, cls):
-        def timeit(method):
-            def timed(*args, **kwargs):
-                start_time = time()
-                result = method(*args, **kwargs)
-                end_time = time()
-                time_delta = end_time - start_time
-                print(f'debug -->> {self.name} выполнялся {time_delta:2.2f} мс')
-                return result
-            return timed
-        return timeit(cls)
+    def __call__(self, method):
+        name = self.name
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                METRICS.span(name, perf_counter_ns() - start)
+        return timed
 
 
 class ProductsSerializer:
@@ -442,6 +833,82 @@ class ProductsSerializer:
         return loads(data)
 
 
+class SchemaSerializer:
+    """
+    Сериализатор по схеме: описывает поля записи и выдает json частями прямо из курсора,
+    не собирая весь ответ в памяти
+    """
+    fields = ()
+    chunk_rows = 500
+
+    def __init__(self, fields=None):
+        """
+        :param fields: список выводимых полей, None - все поля схемы
+        """
+        if fields:
+            unknown = [field for field in fields if field not in self.fields]
+            if unknown:
+                raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+            self.selected = tuple(fields)
+        else:
+            self.selected = self.fields
+
+    @classmethod
+    def from_param(cls, value):
+        """Создает сериализатор по параметру запроса вида fields=id,name"""
+        return cls([field for field in value.split(',') if field] if value else None)
+
+    def to_dict(self, row):
+        return dict(zip(self.selected, row))
+
+    def encode(self, row):
+        return json_dumps(self.to_dict(row), ensure_ascii=False, separators=(',', ':'))
+
+    def stream_json(self, rows):
+        """
+        Выдает json-массив частями
+        :param rows: итерируемый объект со строками в порядке self.selected
+        :return: генератор строк
+        """
+        yield '['
+        buffer = []
+        separator = ''
+        for row in rows:
+            buffer.append(separator + self.encode(row))
+            separator = ','
+            if len(buffer) >= self.chunk_rows:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+        yield ']'
+
+    def stream_ndjson(self, rows):
+        """
+        Выдает записи в формате NDJSON: один json-объект на строку
+        :param rows: итерируемый объект со строками в порядке self.selected
+        :return: генератор строк
+        """
+        buffer = []
+        for row in rows:
+            buffer.append(self.encode(row) + '\n')
+            if len(buffer) >= self.chunk_rows:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+
+
+class ProductSchema(SchemaSerializer):
+    """Схема товара для API"""
+    fields = ('id', 'product_type', 'name', 'category_id', 'price', 'desc', 'img')
+
+
+class CategorySchema(SchemaSerializer):
+    """Схема категории для API"""
+    fields = ('id', 'name', 'category_id', 'desc', 'img')
+
+
 class TemplateView:
     """Поведенческий паттерн. Шаблонный метод"""
     template_name = 'template.html'
@@ -459,11 +926,11 @@ class TemplateView:
     def render_template(self):
         template_name = self.get_template()
         context = self.get_context_data()
-        return '200 OK', render(template_name, context)
+        return Response(render(template_name, context))
 
     def success_redirect(self):
         url = self.get_redirect_url()
-        return '302 Found', [('Location', url)]
+        return Response.redirect(url)
 
     def __call__(self, request):
         self.request = request
@@ -489,18 +956,163 @@ class ListView(TemplateView):
         return context
 
 
+class Page:
+    """Страница списка, полученная по ключу (id последней записи), а не по смещению"""
+
+    def __init__(self, items, has_next=False, has_prev=False):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+
+    @property
+    def first_id(self):
+        return self.items[0].id if self.items else None
+
+    @property
+    def last_id(self):
+        return self.items[-1].id if self.items else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CategoryNode:
+    """Узел снимка дерева категорий"""
+    __slots__ = ('id', 'name', 'parent_id', 'depth', 'children')
+
+    def __init__(self, _id, name, parent_id, depth, children):
+        self.id = _id
+        self.name = name
+        self.parent_id = parent_id
+        self.depth = depth
+        self.children = children
+
+
+class CategoryTree:
+    """
+    Неизменяемый снимок дерева категорий для меню и навигации: узлы с кортежами детей, отсортированных по имени.
+    Строится одним запросом и используется всеми запросами процесса, пока категории не изменятся
+    (см. CategoryMapper.tree)
+    """
+
+    def __init__(self, rows, version=None):
+        """
+        :param rows: строки (id, name, category_id); категории с несуществующим родителем считаются корневыми
+        :param version: версия дерева в БД, для которой построен снимок
+        """
+        self.version = version
+        ids = {row[0] for row in rows}
+        children = {}
+        for _id, name, parent_id in sorted(rows, key=lambda row: (row[1] or '', row[0])):
+            children.setdefault(parent_id if parent_id in ids else None, []).append((_id, name, parent_id))
+        nodes = {}
+
+        def build(row, depth):
+            _id, name, parent_id = row
+            node = CategoryNode(_id, name, parent_id if parent_id in ids else None, depth,
+                                tuple(build(child, depth + 1) for child in children.get(_id, ())))
+            nodes[_id] = node
+            return node
+
+        self.roots = tuple(build(row, 0) for row in children.get(None, ()))
+        self.nodes = MappingProxyType(nodes)
+
+    def get(self, _id):
+        return self.nodes.get(_id)
+
+    def walk(self, nodes=None):
+        """Обходит дерево в глубину: родитель перед детьми, для вывода меню с отступами по depth"""
+        for node in self.roots if nodes is None else nodes:
+            yield node
+            yield from self.walk(node.children)
+
+    def ancestors(self, _id):
+        """Путь от корня до родителя категории"""
+        path = []
+        node = self.nodes.get(_id)
+        while node is not None and node.parent_id is not None:
+            node = self.nodes[node.parent_id]
+            path.append(node)
+        return path[::-1]
+
+    def descendant_ids(self, _id):
+        """id категории и всех ее подкатегорий"""
+        node = self.nodes.get(_id)
+        return [item.id for item in self.walk((node,))] if node is not None else []
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+class PaginatedListView(ListView):
+    """
+    Список с постраничным выводом. Страница выбирается параметрами after/before (id граничной записи),
+    запись страницы загружается методом get_page, весь queryset при этом не читается.
+    Параметры запроса из page_query_params сохраняются в ссылках на соседние страницы
+    """
+    paginate_by = 20
+    page_context_name = 'page'
+    page_query_params = ()
+
+    def get_paginate_by(self):
+        return self.paginate_by
+
+    @staticmethod
+    def get_id_param(params, name):
+        value = params.get(name, '')
+        return int(value) if value.isdigit() else None
+
+    def get_page(self, limit, after_id=None, before_id=None):
+        """
+        Возвращает страницу. По умолчанию отбирает записи из get_queryset (упорядоченного по id) одним проходом
+        по итератору, в памяти держится не больше limit + 1 записей; подклассы переопределяют метод,
+        чтобы выбирать страницу запросом к БД
+        """
+        queryset = iter(self.get_queryset())
+        if before_id is not None:
+            items = deque(takewhile(lambda item: item.id < before_id, queryset), maxlen=limit + 1)
+            has_prev = len(items) > limit
+            if has_prev:
+                items.popleft()
+            return Page(list(items), has_next=True, has_prev=has_prev)
+        if after_id is not None:
+            queryset = dropwhile(lambda item: item.id <= after_id, queryset)
+        items = list(islice(queryset, limit + 1))
+        return Page(items[:limit], has_next=len(items) > limit, has_prev=after_id is not None)
+
+    def get_context_data(self):
+        params = self.request.query
+        page = self.get_page(self.get_paginate_by(),
+                             after_id=self.get_id_param(params, 'after'),
+                             before_id=self.get_id_param(params, 'before'))
+        context = TemplateView.get_context_data(self)
+        context[self.get_context_object_name()] = page.items
+        context[self.page_context_name] = page
+        context['page_query'] = self.get_page_query()
+        return context
+
+    def get_page_query(self):
+        """Строка запроса для ссылок на соседние страницы без параметров after и before"""
+        params = self.request.query
+        return urlencode([(name, value) for name in self.page_query_params for value in params.getlist(name)])
+
+
 class CreateView(TemplateView):
     template_name = 'create.html'
 
     @staticmethod
     def get_request_data(request):
-        return request['data']
+        return request.data
 
     def create_obj(self, data):
         pass
 
     def __call__(self, request):
-        if request['method'] == 'POST':
+        if request.method == 'POST':
+            self.request = request
             data = self.get_request_data(request)
             self.create_obj(data)
 
@@ -536,6 +1148,8 @@ class Payment(metaclass=ABCMeta):
 
 
 class PayPalPayment(Payment):
+    name = 'paypal'
+
     def __init__(self, email, token):
         self.email = email
         self.token = token
@@ -545,6 +1159,8 @@ class PayPalPayment(Payment):
 
 
 class CardPayment(Payment):
+    name = 'card'
+
     def __init__(self, card_num):
         self.card = card_num
 
@@ -552,154 +1168,886 @@ class CardPayment(Payment):
         print(f'Выполнена оплата на сумму {amount} с карты № {self.card}')
 
 
-class ProductsMapper:
+def data_version(cursor, names):
+    """
+    Версии данных из таблицы data_version. Триггеры таблиц (миграция 0011) увеличивают версию при любой записи,
+    в том числе сделанной другим процессом сервера, поэтому версия служит частью ключа кэшей процесса.
+    Таблица читается один раз за единицу работы, то есть за запрос; запись через маппер сбрасывает прочитанное
+    :param cursor: курсор
+    :param names: имена версий, например ('product', 'category')
+    :return: кортеж версий в порядке names
+    """
+    unit_of_work = UnitOfWork.get_current()
+    versions = unit_of_work.data_version if unit_of_work is not None else None
+    if versions is None:
+        cursor.execute('SELECT name, version FROM data_version')
+        versions = dict(cursor.fetchall())
+        if unit_of_work is not None:
+            unit_of_work.data_version = versions
+    return tuple(versions.get(name) for name in names)
+
+
+def forget_data_version():
+    """Сбрасывает версии, прочитанные текущей единицей работы: после записи их нужно прочитать заново"""
+    unit_of_work = UnitOfWork.get_current()
+    if unit_of_work is not None:
+        unit_of_work.data_version = None
+
+
+def tag_versions(tags):
+    """Источник версий для кэшей страниц и фрагментов: теги кэша совпадают с именами в data_version"""
+    cursor = POOL.get_connection().cursor()
+    try:
+        return data_version(cursor, tags)
+    finally:
+        cursor.close()
+
+
+set_version_source(tag_versions)
+
+
+class TableMapper:
+    """
+    Базовый маппер таблицы с целочисленным ключом id. Подкласс задает имя таблицы tablename,
+    колонки вставки columns и колонки обновления update_columns (без id); значения колонок по умолчанию
+    берутся из одноименных атрибутов объекта, подкласс может переопределить insert_values и update_values.
+    Методы *_many не фиксируют транзакцию, это делает вызывающий код (UnitOfWork, загрузка каталога),
+    методы insert, update и delete записывают один объект и фиксируют транзакцию, при ошибке откатывая ее.
+    Если у таблицы есть версия data_version_name, пачка строк увеличивает ее один раз вместо построчных триггеров
+    """
+    tablename = None
+    columns = ()
+    update_columns = ()
+    data_version_name = None
+
     def __init__(self, _connection):
         self.connection = _connection
         self.cursor = _connection.cursor()
-        self.tablename = 'product'
 
-    def all(self):
-        statement = f'SELECT * from {self.tablename}'
-        self.cursor.execute(statement)
-        result = []
-        for item in self.cursor.fetchall():
-            _id, product_type, name, category_id, price, desc, img = item
-            product = ProductFactory().create(product_type, name, category_id, price)
-            product.id = _id
-            product.desc = desc
-            product.img = img
-            result.append(product)
-        return result
+    def invalidate(self):
+        """Кэша чтения нет, метод нужен для UnitOfWork"""
 
-    def find_by_id(self, _id):
-        statement = f'SELECT * FROM {self.tablename} WHERE id=?'
-        self.cursor.execute(statement, (_id,))
-        result = self.cursor.fetchone()
-        if result:
-            _id, product_type, name, category_id, price, desc, img = result
-            product = ProductFactory().create(product_type, name, category_id, price)
-            product.id = _id
-            product.desc = desc
-            product.img = img
-            return product
-        else:
-            raise RecordNotFoundException(f'Запись с id = {_id} не найдена')
+    def insert_values(self, obj):
+        return tuple(getattr(obj, column) for column in self.columns)
 
-    def find_by_category(self, category_id):
-        statement = f'SELECT * FROM {self.tablename} WHERE category_id=?'
-        self.cursor.execute(statement, (category_id,))
-        result = []
-        for item in self.cursor.fetchall():
-            _id, product_type, name, category_id, price, desc, img = item
-            product = ProductFactory().create(product_type, name, category_id, price)
-            product.id = _id
-            product.desc = desc
-            product.img = img
-            result.append(product)
-        return result
+    def update_values(self, obj):
+        return tuple(getattr(obj, column) for column in self.update_columns) + (obj.id,)
+
+    def iter_rows(self, columns, batch_size=500):
+        """
+        Последовательно читает строки таблицы порциями, не загружая таблицу в память
+        :param columns: список колонок, имена проверяются схемой сериализатора
+        :param batch_size: количество строк в одной порции
+        :return: генератор строк
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f'SELECT {", ".join(columns)} FROM {self.tablename} ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def execute_many(self, statement, params):
+        """
+        Выполняет запрос для пачки строк. На время запроса построчные триггеры версии таблицы отключаются
+        строкой в data_version_batch (миграция 0012), а версия увеличивается один раз после запроса.
+        Строка видна только текущей транзакции, поэтому записи других соединений по-прежнему меняют версию
+        :param statement: запрос
+        :param params: список параметров строк
+        """
+        name = self.data_version_name
+        if name is None or len(params) < 2:
+            self.cursor.executemany(statement, params)
+            return
+        self.cursor.execute('INSERT INTO data_version_batch (name) VALUES (?)', (name,))
+        try:
+            self.cursor.executemany(statement, params)
+        finally:
+            self.cursor.execute('DELETE FROM data_version_batch WHERE name=?', (name,))
+        self.cursor.execute('UPDATE data_version SET version = version + 1 WHERE name=?', (name,))
+
+    def assign_ids(self, objs):
+        """
+        Проставляет id объектам, вставленным одним executemany.
+        Внутри транзакции AUTOINCREMENT выдает идущие подряд id, последний из них - last_insert_rowid()
+        """
+        self.cursor.execute('SELECT last_insert_rowid()')
+        first_id = self.cursor.fetchone()[0] - len(objs) + 1
+        for offset, obj in enumerate(objs):
+            obj.id = first_id + offset
+
+    def insert_many(self, objs):
+        """Вставляет список объектов одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        statement = f'INSERT INTO {self.tablename} ({", ".join(self.columns)}) ' \
+                    f'VALUES ({", ".join("?" * len(self.columns))})'
+        self.execute_many(statement, [self.insert_values(obj) for obj in objs])
+        self.assign_ids(objs)
+        self.invalidate()
+
+    def update_many(self, objs):
+        """Обновляет список объектов одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        statement = f'UPDATE {self.tablename} SET {", ".join(f"{column}=?" for column in self.update_columns)} ' \
+                    f'WHERE id=?'
+        self.execute_many(statement, [self.update_values(obj) for obj in objs])
+        self.invalidate()
+
+    def delete_many(self, objs):
+        """Удаляет список объектов одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        self.execute_many(f'DELETE FROM {self.tablename} WHERE id=?', [(obj.id,) for obj in objs])
+        self.invalidate()
+        for obj in objs:
+            self.forget(obj)
 
     def insert(self, obj):
-        statement = f'INSERT INTO {self.tablename} (product_type, name, category_id, price, desc, img) ' \
-                    f'VALUES (?, ?, ?, ?, ?, ?)'
-        self.cursor.execute(statement, (obj.product_type, obj.name, obj.category_id, obj.price, obj.desc, obj.img))
         try:
+            self.insert_many([obj])
             self.connection.commit()
         except Exception as err:
+            self.connection.rollback()
             raise DbCommitException(err.args)
+        finally:
+            self.invalidate()
 
     def update(self, obj):
-        statement = f"UPDATE {self.tablename} SET name=?, category_id=?, price=?, desc=?, img=? WHERE id=?"
-        self.cursor.execute(statement, (obj.name, obj.category_id, obj.price, obj.desc, obj.img, obj.id))
         try:
+            self.update_many([obj])
             self.connection.commit()
         except Exception as err:
+            self.connection.rollback()
             raise DbUpdateException(err.args)
+        finally:
+            self.invalidate()
 
     def delete(self, obj):
-        statement = f'DELETE FROM {self.tablename} WHERE id=?'
-        self.cursor.execute(statement, (obj.id,))
+        try:
+            self.delete_many([obj])
+            self.connection.commit()
+        except Exception as err:
+            self.connection.rollback()
+            raise DbDeleteException(err.args)
+        finally:
+            self.invalidate()
+            self.forget(obj)
+
+    def forget(self, obj):
+        """Убирает удаленный объект из карты идентичности"""
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None:
+            unit_of_work.remove_object(self.tablename, obj)
+
+
+class CachedTableMapper(TableMapper):
+    """
+    Маппер таблицы с кэшем чтения на уровне процесса. Ключ кэша включает версии versioned_by из data_version,
+    поэтому запись, сделанная другим процессом, не оставляет в кэше устаревших строк
+    """
+    cache = None
+    versioned_by = ()
+
+    def fetch(self, key, statement, params=()):
+        """
+        Читает строки через кэш
+        :param key: ключ кэша
+        :param statement: запрос
+        :param params: параметры запроса
+        :return: кортеж строк
+        """
+        key = (data_version(self.cursor, self.versioned_by), key)
+        rows = self.cache.get(key)
+        if rows is None:
+            self.cursor.execute(statement, params)
+            rows = tuple(self.cursor.fetchall())
+            self.cache.set(key, rows)
+        return rows
+
+    def name_map(self):
+        """Возвращает словарь имя -> id"""
+        self.cursor.execute(f'SELECT name, id FROM {self.tablename}')
+        return dict(self.cursor.fetchall())
+
+
+class ProductsMapper(CachedTableMapper):
+    """
+    Маппер таблицы товаров. Результаты чтения кэшируются на уровне процесса, запись сбрасывает кэш.
+    Ключ кэша включает версии товаров и категорий (выборки по поддереву зависят от дерева категорий)
+    """
+    tablename = 'product'
+    data_version_name = 'product'
+    columns = ('product_type', 'name', 'category_id', 'price', 'desc', 'img')
+    update_columns = ('name', 'category_id', 'price', 'desc', 'img')
+    cache = LRUCache(max_size=1024, ttl=60)
+    versioned_by = ('product', 'category')
+    subtree_condition = 'category_id IN (SELECT descendant_id FROM category_tree WHERE ancestor_id=?)'
+
+    def invalidate(self):
+        """Сбрасывает кэши чтения товаров и поиска и закэшированные страницы, собранные из таблицы"""
+        ProductsMapper.cache.clear()
+        SearchMapper.cache.clear()
+        forget_data_version()
+        invalidate_tags(self.tablename)
+
+    def load(self, row):
+        """
+        Создает объект товара из строки таблицы, используя карту идентичности текущей единицы работы
+        :param row: строка таблицы
+        :return: экземпляр класса товара
+        """
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None:
+            product = unit_of_work.get_object(self.tablename, row[0])
+            if product is not None:
+                return product
+        _id, product_type, name, category_id, price, desc, img = row
+        product = ProductFactory().create(product_type, name, category_id, price)
+        product.id = _id
+        product.desc = desc
+        product.img = img
+        if unit_of_work is not None:
+            unit_of_work.add_object(self.tablename, product)
+        return product
 
+    def all(self):
+        statement = f'SELECT * from {self.tablename}'
+        return [self.load(row) for row in self.fetch(('all',), statement)]
 
-class CategoryMapper:
-    def __init__(self, _connection):
-        self.connection = _connection
-        self.cursor = _connection.cursor()
-        self.tablename = 'category'
+    def find_by_id(self, _id):
+        statement = f'SELECT * FROM {self.tablename} WHERE id=?'
+        result = self.fetch(('id', _id), statement, (_id,))
+        if result:
+            return self.load(result[0])
+        else:
+            raise RecordNotFoundException(f'Запись с id = {_id} не найдена')
+
+    def find_by_category(self, category_id):
+        statement = f'SELECT * FROM {self.tablename} WHERE category_id=?'
+        return [self.load(row) for row in self.fetch(('category', category_id), statement, (category_id,))]
+
+    def latest(self, limit):
+        """Возвращает последние добавленные товары"""
+        statement = f'SELECT * FROM {self.tablename} ORDER BY id DESC LIMIT ?'
+        return [self.load(row) for row in self.fetch(('latest', limit), statement, (limit,))]
+
+    def page(self, limit, after_id=None, before_id=None, category_id=None):
+        """
+        Выбирает страницу товаров по ключу: записи с id больше after_id или меньше before_id.
+        В отличие от OFFSET стоимость запроса не зависит от номера страницы
+        :param limit: размер страницы
+        :param after_id: id последней записи предыдущей страницы
+        :param before_id: id первой записи следующей страницы
+        :param category_id: ограничение по категории вместе с ее подкатегориями
+        :return: Page
+        """
+        conditions, params = [], []
+        if category_id is not None:
+            conditions.append(self.subtree_condition)
+            params.append(category_id)
+        backward = before_id is not None
+        if backward:
+            conditions.append('id<?')
+            params.append(before_id)
+        elif after_id is not None:
+            conditions.append('id>?')
+            params.append(after_id)
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        order = 'DESC' if backward else 'ASC'
+        statement = f'SELECT * FROM {self.tablename} {where}ORDER BY id {order} LIMIT ?'
+        key = ('page', category_id, after_id, before_id, limit)
+        rows = list(self.fetch(key, statement, tuple(params) + (limit + 1,)))
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+            return Page([self.load(row) for row in rows], has_next=True, has_prev=has_more)
+        has_prev = after_id is not None and self.exists_before(after_id + 1, category_id)
+        return Page([self.load(row) for row in rows], has_next=has_more, has_prev=has_prev)
+
+    def exists_before(self, _id, category_id=None):
+        """Проверяет, есть ли товары с id меньше заданного"""
+        statement = f'SELECT 1 FROM {self.tablename} WHERE id<?'
+        params = (_id,)
+        if category_id is not None:
+            statement += f' AND {self.subtree_condition}'
+            params += (category_id,)
+        return bool(self.fetch(('before', _id, category_id), statement + ' LIMIT 1', params))
+
+
+class SearchMapper(ProductsMapper):
+    """
+    Полнотекстовый поиск товаров по названию и описанию. Индекс FTS5 product_search обновляется триггерами
+    таблицы товаров (миграция 0007), поэтому поиск видит изменения, сделанные любым маппером и загрузкой каталога.
+    Слова запроса ищутся по префиксу, что отчасти заменяет отсутствующий стемминг русских слов
+    (молот - молоток, молотка), буква ё приравнивается к е. Результаты упорядочены по BM25 среди всех совпадений,
+    совпадения в названии весят больше, чем в описании: веса передаются в запрос через rank MATCH,
+    и FTS5 сортирует по rank сам, выбирая только нужную страницу. На частых словах ранжирование всех совпадений
+    занимает до сотен миллисекунд, поэтому страницы кэшируются. Кэш поиска отдельный от кэша ProductsMapper,
+    чтобы произвольные строки поиска не вытесняли строки, нужные страницам каталога
+    """
+    cache = LRUCache(max_size=256, ttl=60)
+    index = 'product_search'
+    weights = (10.0, 1.0)
+    max_terms = 8
+    word = re.compile(r'\w+')
+
+    @classmethod
+    def match_query(cls, text):
+        """
+        Строит выражение MATCH из пользовательского ввода: слова в кавычках, операторы FTS5 не пропускаются
+        :param text: строка поиска
+        :return: выражение или None, если в строке нет слов
+        """
+        words = cls.word.findall(text.lower().replace('ё', 'е'))[:cls.max_terms]
+        if not words:
+            return None
+        return ' '.join(f'"{word}"*' if len(word) > 1 else f'"{word}"' for word in words)
+
+    def search(self, text, page=1, limit=20):
+        """
+        Ищет товары
+        :param text: строка поиска
+        :param page: номер страницы, начиная с 1
+        :param limit: размер страницы
+        :return: Page
+        """
+        query = self.match_query(text)
+        if query is None:
+            return Page([])
+        rank = f'bm25({", ".join(map(str, self.weights))})'
+        statement = f'SELECT {self.tablename}.* FROM (SELECT rowid, rank FROM {self.index} ' \
+                    f'WHERE {self.index} MATCH ? AND rank MATCH ? ORDER BY rank LIMIT ? OFFSET ?) AS found ' \
+                    f'JOIN {self.tablename} ON {self.tablename}.id = found.rowid ORDER BY found.rank'
+        rows = self.fetch(('search', query, page, limit), statement, (query, rank, limit + 1, (page - 1) * limit))
+        return Page([self.load(row) for row in rows[:limit]], has_next=len(rows) > limit, has_prev=page > 1)
+
+
+class CategoryMapper(CachedTableMapper):
+    """
+    Маппер таблицы категорий. Результаты чтения кэшируются на уровне процесса, запись сбрасывает кэш.
+    Иерархия хранится в таблице замыканий category_tree (пары предок - потомок с расстоянием между ними),
+    которую поддерживают триггеры таблицы категорий (миграция 0008): поддерево и путь до корня
+    выбираются одним индексным запросом без рекурсии
+    """
+    tablename = 'category'
+    data_version_name = 'category'
+    columns = ('name', 'category_id', 'desc', 'img')
+    update_columns = columns
+    cache = LRUCache(max_size=256, ttl=60)
+    versioned_by = ('category',)
+    tree_table = 'category_tree'
+    snapshot = None
+
+    def invalidate(self):
+        """
+        Сбрасывает кэш чтения таблицы, снимок дерева и закэшированные страницы, собранные из нее.
+        Кэш товаров тоже сбрасывается: страницы категорий включают товары подкатегорий
+        """
+        self.cache.clear()
+        ProductsMapper.cache.clear()
+        SearchMapper.cache.clear()
+        CategoryMapper.snapshot = None
+        forget_data_version()
+        invalidate_tags(self.tablename)
+
+    def load(self, row):
+        """
+        Создает объект категории из строки таблицы, используя карту идентичности текущей единицы работы
+        :param row: строка таблицы
+        :return: экземпляр класса категории
+        """
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None:
+            category = unit_of_work.get_object(self.tablename, row[0])
+            if category is not None:
+                return category
+        _id, name, category_id, desc, img = row
+        category = Category(name, category_id)
+        category.id = _id
+        category.desc = desc
+        category.img = img
+        if unit_of_work is not None:
+            unit_of_work.add_object(self.tablename, category)
+        return category
 
     def all(self):
         statement = f'SELECT * from {self.tablename}'
-        self.cursor.execute(statement)
-        result = []
-        for item in self.cursor.fetchall():
-            _id, name, category_id, desc, img = item
-            category = Category(name, category_id)
-            category.id = _id
-            category.desc = desc
-            category.img = img
-            result.append(category)
-        return result
+        return [self.load(row) for row in self.fetch(('all',), statement)]
 
     def find_by_id(self, _id):
         statement = f'SELECT * FROM {self.tablename} WHERE id=?'
-        self.cursor.execute(statement, (_id,))
-        result = self.cursor.fetchone()
+        result = self.fetch(('id', _id), statement, (_id,))
         if result:
-            _id, name, category_id, desc, img = result
-            category = Category(name, category_id)
-            category.id = _id
-            category.desc = desc
-            category.img = img
-            return category
+            return self.load(result[0])
         else:
             raise RecordNotFoundException(f'Запись с id = {_id} не найдена')
 
     def find_by_name(self, name):
         statement = f'SELECT * FROM {self.tablename} WHERE name=?'
-        self.cursor.execute(statement, (name,))
-        result = self.cursor.fetchone()
+        result = self.fetch(('name', name), statement, (name,))
         if result:
-            _id, _name, category_id, desc, img = result
-            category = Category(_name, category_id)
-            category.id = _id
-            category.desc = desc
-            category.img = img
-            return category
+            return self.load(result[0])
         else:
             raise RecordNotFoundException(f'Запись с именем = {name} не найдена')
 
-    def insert(self, obj):
-        statement = f'INSERT INTO {self.tablename} (name, category_id, desc, img) ' \
-                    f'VALUES (?, ?, ?, ?)'
-        self.cursor.execute(statement, (obj.name, obj.category_id, obj.desc, obj.img))
+    def descendants(self, _id, include_self=False):
+        """
+        Подкатегории всех уровней, ближние первыми
+        :param _id: id категории
+        :param include_self: включить саму категорию
+        :return: список категорий
+        """
+        statement = f'SELECT {self.tablename}.* FROM {self.tree_table} ' \
+                    f'JOIN {self.tablename} ON {self.tablename}.id = {self.tree_table}.descendant_id ' \
+                    f'WHERE {self.tree_table}.ancestor_id=? AND {self.tree_table}.depth>=? ' \
+                    f'ORDER BY {self.tree_table}.depth, {self.tablename}.id'
+        min_depth = 0 if include_self else 1
+        return [self.load(row) for row in self.fetch(('descendants', _id, min_depth), statement, (_id, min_depth))]
+
+    def ancestors(self, _id):
+        """
+        Путь от корневой категории до родителя категории
+        :param _id: id категории
+        :return: список категорий
+        """
+        statement = f'SELECT {self.tablename}.* FROM {self.tree_table} ' \
+                    f'JOIN {self.tablename} ON {self.tablename}.id = {self.tree_table}.ancestor_id ' \
+                    f'WHERE {self.tree_table}.descendant_id=? AND {self.tree_table}.depth>0 ' \
+                    f'ORDER BY {self.tree_table}.depth DESC'
+        return [self.load(row) for row in self.fetch(('ancestors', _id), statement, (_id,))]
+
+    def tree_version(self):
+        """Версия дерева: триггеры увеличивают ее при любом изменении категорий, в том числе в другом процессе"""
+        self.cursor.execute(f'SELECT version FROM {self.tree_table}_version')
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def tree(self):
+        """
+        Снимок дерева категорий. Снимок общий для процесса и перестраивается, только если версия дерева в БД
+        изменилась, поэтому меню не читает таблицу категорий на каждом запросе
+        :return: CategoryTree
+        """
+        snapshot = CategoryMapper.snapshot
+        version = self.tree_version()
+        if snapshot is None or snapshot.version != version:
+            self.cursor.execute(f'SELECT id, name, category_id FROM {self.tablename}')
+            snapshot = CategoryTree(self.cursor.fetchall(), version)
+            CategoryMapper.snapshot = snapshot
+        return snapshot
+
+    def move(self, obj, parent_id):
+        """
+        Переносит категорию вместе с подкатегориями к другому родителю
+        :param obj: категория
+        :param parent_id: id нового родителя или None для корня
+        """
+        try:
+            self.cursor.execute(f'UPDATE {self.tablename} SET category_id=? WHERE id=?', (parent_id, obj.id))
+            self.connection.commit()
+        except Exception as err:
+            self.connection.rollback()
+            raise DbUpdateException(err.args)
+        finally:
+            self.invalidate()
+        obj.category_id = parent_id
+
+
+class BasketMapper:
+    """
+    Маппер таблицы строк корзины. Строка определяется пользователем и id товара,
+    повторное добавление товара увеличивает количество в той же строке. Кэша чтения нет:
+    корзины индивидуальны и часто меняются
+    """
+
+    def __init__(self, _connection):
+        self.connection = _connection
+        self.cursor = _connection.cursor()
+        self.tablename = 'basket_item'
+
+    def invalidate(self):
+        """Кэша чтения у корзин нет, метод нужен для UnitOfWork"""
+
+    @staticmethod
+    def load(row):
+        user, product_id, quantity, created = row
+        return BasketItem(user, product_id, quantity, created)
+
+    def find_by_user(self, user):
+        statement = f'SELECT user, product_id, quantity, created FROM {self.tablename} WHERE user=? ORDER BY created'
+        self.cursor.execute(statement, (user,))
+        return [self.load(row) for row in self.cursor.fetchall()]
+
+    def exists(self, user):
+        self.cursor.execute(f'SELECT 1 FROM {self.tablename} WHERE user=? LIMIT 1', (user,))
+        return self.cursor.fetchone() is not None
+
+    def products(self, user):
+        """
+        Товары корзины одним запросом с соединением таблиц
+        :param user: имя пользователя
+        :return: список товаров
+        """
+        statement = f'SELECT p.* FROM {self.tablename} b JOIN product p ON p.id = b.product_id ' \
+                    f'WHERE b.user=? ORDER BY b.created'
+        self.cursor.execute(statement, (user,))
+        mapper = MapperRegistry.get_current_mapper('products')
+        return [mapper.load(row) for row in self.cursor.fetchall()]
+
+    def total(self, user):
+        statement = f'SELECT COALESCE(SUM(p.price * b.quantity), 0) FROM {self.tablename} b ' \
+                    f'JOIN product p ON p.id = b.product_id WHERE b.user=?'
+        self.cursor.execute(statement, (user,))
+        return self.cursor.fetchone()[0]
+
+    def insert_many(self, objs):
+        """
+        Добавляет строки одним запросом: если товар уже в корзине, его количество увеличивается.
+        Фиксацию транзакции выполняет вызывающий код
+        """
+        if not objs:
+            return
+        statement = f'INSERT INTO {self.tablename} (user, product_id, quantity, created) VALUES (?, ?, ?, ?) ' \
+                    f'ON CONFLICT (user, product_id) DO UPDATE SET quantity = quantity + excluded.quantity'
+        self.cursor.executemany(statement, [(obj.user, obj.product_id, obj.quantity, obj.created) for obj in objs])
+
+    def update_many(self, objs):
+        """Обновляет количество товаров одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        statement = f'UPDATE {self.tablename} SET quantity=? WHERE user=? AND product_id=?'
+        self.cursor.executemany(statement, [(obj.quantity, obj.user, obj.product_id) for obj in objs])
+
+    def delete_many(self, objs):
+        """Удаляет строки одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        statement = f'DELETE FROM {self.tablename} WHERE user=? AND product_id=?'
+        self.cursor.executemany(statement, [(obj.user, obj.product_id) for obj in objs])
+
+
+class OrderMapper(TableMapper):
+    """
+    Маппер заказов: шапка заказа в таблице shop_order, строки - в order_item.
+    В строки копируются название и цена товара на момент заказа, сумма заказа считается в SQL.
+    insert_many и update_many записывают только шапки заказов
+    """
+    tablename = 'shop_order'
+    columns = ('user', 'status', 'pay_method', 'created')
+    update_columns = ('status', 'pay_method')
+
+    def load(self, row):
+        """
+        Создает объект заказа из строки запроса, используя карту идентичности текущей единицы работы
+        :param row: (id, user, status, pay_method, created, total)
+        :return: экземпляр класса заказа
+        """
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None:
+            order = unit_of_work.get_object(self.tablename, row[0])
+            if order is not None:
+                return order
+        _id, user, status, pay_method, created, total = row
+        order = Order(user, total, status, pay_method, created)
+        order.id = _id
+        if unit_of_work is not None:
+            unit_of_work.add_object(self.tablename, order)
+        return order
+
+    def select(self, where, params, tail=''):
+        statement = f'SELECT o.id, o.user, o.status, o.pay_method, o.created, ' \
+                    f'(SELECT COALESCE(SUM(i.price * i.quantity), 0) FROM order_item i WHERE i.order_id = o.id) ' \
+                    f'FROM {self.tablename} o WHERE {where}{tail}'
+        self.cursor.execute(statement, params)
+        return [self.load(row) for row in self.cursor.fetchall()]
+
+    def find_by_id(self, _id):
+        result = self.select('o.id=?', (_id,))
+        if result:
+            return result[0]
+        raise RecordNotFoundException(f'Заказ с id = {_id} не найден')
+
+    def find_by_user(self, user, limit=20):
+        """Последние заказы пользователя, выбираются по индексу (user, created)"""
+        return self.select('o.user=?', (user, limit), ' ORDER BY o.created DESC LIMIT ?')
+
+    def total(self, _id):
+        self.cursor.execute('SELECT COALESCE(SUM(price * quantity), 0) FROM order_item WHERE order_id=?', (_id,))
+        return self.cursor.fetchone()[0]
+
+    def create_from_basket(self, user):
+        """
+        Создает заказ из корзины пользователя одной транзакцией: шапка заказа, перенос строк корзины
+        в строки заказа запросом INSERT ... SELECT и очистка корзины
+        :param user: имя пользователя
+        :return: экземпляр класса заказа
+        """
+        order = Order(user)
         try:
+            self.cursor.execute(f'INSERT INTO {self.tablename} (user, status, created) VALUES (?, ?, ?)',
+                                (user, order.status, order.created))
+            order.id = self.cursor.lastrowid
+            self.cursor.execute('INSERT INTO order_item (order_id, product_id, name, price, quantity) '
+                                'SELECT ?, p.id, p.name, p.price, b.quantity FROM basket_item b '
+                                'JOIN product p ON p.id = b.product_id WHERE b.user=? ORDER BY b.created',
+                                (order.id, user))
+            if self.cursor.rowcount <= 0:
+                raise RecordNotFoundException(f'корзина пользователя {user} пуста')
+            self.cursor.execute('DELETE FROM basket_item WHERE user=?', (user,))
+            order.total = self.total(order.id)
             self.connection.commit()
+        except RecordNotFoundException:
+            self.connection.rollback()
+            raise
         except Exception as err:
+            self.connection.rollback()
             raise DbCommitException(err.args)
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None:
+            unit_of_work.add_object(self.tablename, order)
+        return order
 
-    def update(self, obj):
-        statement = f"UPDATE {self.tablename} SET name=?, category_id=?,desc=?, img=? WHERE id=?"
-        self.cursor.execute(statement, (obj.name, obj.category_id, obj.desc, obj.img, obj.id))
+    def delete_many(self, objs):
+        """Удаляет заказы вместе со строками, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        self.cursor.executemany('DELETE FROM order_item WHERE order_id=?', [(obj.id,) for obj in objs])
+        super().delete_many(objs)
+
+
+class UserMapper:
+    """
+    Маппер таблицы пользователей. Ключ строки - имя пользователя, тип строки определяет класс (UserFactory).
+    Кэша чтения нет: пользователь читается при входе, а сессия хранит только его имя
+    """
+
+    def __init__(self, _connection):
+        self.connection = _connection
+        self.cursor = _connection.cursor()
+        self.tablename = 'shop_user'
+
+    def invalidate(self):
+        """Кэша чтения у пользователей нет, метод нужен для UnitOfWork"""
+
+    @staticmethod
+    def load(row):
+        name, user_type, password_hash, created = row
+        return UserFactory.user_types[user_type](name, password_hash, created)
+
+    def find_by_name(self, name):
+        statement = f'SELECT name, user_type, password_hash, created FROM {self.tablename} WHERE name=?'
+        self.cursor.execute(statement, (name,))
+        row = self.cursor.fetchone()
+        if row is None:
+            raise RecordNotFoundException(f'пользователь с именем {name}')
+        return self.load(row)
+
+    def insert(self, user):
+        """
+        Записывает нового пользователя и фиксирует транзакцию
+        :raises DuplicateKeyException: пользователь с таким именем уже есть
+        """
         try:
+            self.insert_many([user])
             self.connection.commit()
+        except IntegrityError:
+            self.connection.rollback()
+            raise DuplicateKeyException(f'пользователь {user.name}')
         except Exception as err:
-            raise DbUpdateException(err.args)
+            self.connection.rollback()
+            raise DbCommitException(err.args)
 
-    def delete(self, obj):
-        statement = f'DELETE FROM {self.tablename} WHERE id=?'
-        self.cursor.execute(statement, (obj.id,))
+    def delete(self, user):
+        """Удаляет пользователя и фиксирует транзакцию"""
+        try:
+            self.delete_many([user])
+            self.connection.commit()
+        except Exception as err:
+            self.connection.rollback()
+            raise DbDeleteException(err.args)
+
+    def insert_many(self, objs):
+        """Добавляет пользователей одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        statement = f'INSERT INTO {self.tablename} (name, user_type, password_hash, created) VALUES (?, ?, ?, ?)'
+        self.cursor.executemany(statement, [(obj.name, obj.user_type, obj.password_hash, obj.created) for obj in objs])
+
+    def update_many(self, objs):
+        """Обновляет тип и пароль пользователей одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        statement = f'UPDATE {self.tablename} SET user_type=?, password_hash=? WHERE name=?'
+        self.cursor.executemany(statement, [(obj.user_type, obj.password_hash, obj.name) for obj in objs])
+
+    def delete_many(self, objs):
+        """Удаляет пользователей одним запросом, фиксацию транзакции выполняет вызывающий код"""
+        if not objs:
+            return
+        self.cursor.executemany(f'DELETE FROM {self.tablename} WHERE name=?', [(obj.name,) for obj in objs])
+
+
+class OutboxMapper(TableMapper):
+    """Маппер таблицы исходящих сообщений, доставку выполняет framework.outbox.OutboxWorker"""
+    tablename = OUTBOX_TABLE
+    columns = ('topic', 'payload', 'available_at', 'created')
+
+    def insert_values(self, obj):
+        return obj.topic, json_dumps(obj.payload, ensure_ascii=False), obj.created, obj.created
+
+    def update_many(self, objs):
+        """Сообщения не изменяются после постановки в очередь"""
+
+    def delete_many(self, objs):
+        """Отменяет еще не доставленные сообщения"""
+        if not objs:
+            return
+        self.cursor.executemany(f"DELETE FROM {self.tablename} WHERE id=? AND status='pending'",
+                                [(obj.id,) for obj in objs])
+
+
+class ImageMapper(TableMapper):
+    """
+    Маппер таблицы изображений товаров. Изображения списка товаров читаются одним запросом по индексу product_id.
+    Запись о готовых миниатюрах делается из служебного потока ThumbnailPool. Удаление записи не удаляет файлы:
+    их может использовать другой товар с тем же содержимым
+    """
+
+    tablename = 'product_image'
+    data_version_name = 'product'
+    columns = ('product_id', 'digest', 'ext', 'size', 'width', 'height', 'thumbnails', 'status', 'created')
+    update_columns = ('width', 'height', 'thumbnails', 'status')
+
+    def invalidate(self):
+        """Кэша чтения нет, сбрасываются закэшированные страницы со списками товаров"""
+        forget_data_version()
+        invalidate_tags('product')
+
+    @staticmethod
+    def load(row):
+        _id, product_id, digest, ext, size, width, height, thumbnails, status, _, created = row
+        image = ProductImage(product_id, digest, ext, size, width, height,
+                             [int(value) for value in thumbnails.split(',') if value], status, created)
+        image.id = _id
+        return image
+
+    def for_products(self, products):
+        """
+        Изображения товаров списка, по одному последнему на товар
+        :param products: список товаров
+        :return: словарь id товара -> ProductImage
+        """
+        ids = [product.id for product in products if product.id is not None]
+        if not ids:
+            return {}
+        statement = f'SELECT * FROM {self.tablename} WHERE product_id IN ({", ".join("?" * len(ids))}) ORDER BY id'
+        self.cursor.execute(statement, ids)
+        return {image.product_id: image for image in map(self.load, self.cursor.fetchall())}
+
+    def find_by_product(self, product_id):
+        statement = f'SELECT * FROM {self.tablename} WHERE product_id=? ORDER BY id DESC LIMIT 1'
+        self.cursor.execute(statement, (product_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            raise RecordNotFoundException(f'изображение товара {product_id}')
+        return self.load(row)
+
+    def pending(self, limit=1000):
+        """Изображения, миниатюры которых еще не построены, например из-за перезапуска сервера"""
+        statement = f"SELECT * FROM {self.tablename} WHERE status='pending' ORDER BY id LIMIT ?"
+        self.cursor.execute(statement, (limit,))
+        return [self.load(row) for row in self.cursor.fetchall()]
+
+    def products_without_images(self):
+        """Товары с адресом изображения, для которых изображение еще не загружено в хранилище"""
+        statement = f"SELECT id, img FROM product WHERE img != '' AND NOT EXISTS " \
+                    f"(SELECT 1 FROM {self.tablename} WHERE {self.tablename}.product_id = product.id)"
+        self.cursor.execute(statement)
+        return self.cursor.fetchall()
+
+    def insert_values(self, obj):
+        return (obj.product_id, obj.digest, obj.ext, obj.size, obj.width, obj.height,
+                ','.join(map(str, obj.thumbnails)), obj.status, obj.created)
+
+    def update_values(self, obj):
+        return obj.width, obj.height, ','.join(map(str, obj.thumbnails)), obj.status, obj.id
+
+    def thumbnails_done(self, image_id, result, error):
+        """
+        Записывает результат построения миниатюр
+        :param image_id: id изображения
+        :param result: кортеж (ширина, высота, ширины миниатюр) или None при ошибке
+        :param error: описание ошибки
+        """
+        if result is None:
+            statement = f"UPDATE {self.tablename} SET status='failed', error=? WHERE id=?"
+            params = (error, image_id)
+        else:
+            width, height, widths = result
+            statement = f"UPDATE {self.tablename} SET width=?, height=?, thumbnails=?, status='ready', error=NULL " \
+                        f"WHERE id=?"
+            params = (width, height, ','.join(map(str, widths)), image_id)
+        with self.connection:
+            self.cursor.execute(statement, params)
+        self.invalidate()
 
 
 class MapperRegistry:
     mappers = {
         'products': ProductsMapper,
-        'category': CategoryMapper
+        'search': SearchMapper,
+        'category': CategoryMapper,
+        'basket': BasketMapper,
+        'order': OrderMapper,
+        'outbox': OutboxMapper,
+        'image': ImageMapper,
+        'user': UserMapper
     }
 
     @staticmethod
     def get_mapper(obj):
         if isinstance(obj, RealProduct) or isinstance(obj, ServiceProduct):
-            return ProductsMapper(connection)
+            return ProductsMapper(POOL.get_connection())
+        if isinstance(obj, Category):
+            return CategoryMapper(POOL.get_connection())
+        if isinstance(obj, BasketItem):
+            return BasketMapper(POOL.get_connection())
+        if isinstance(obj, Order):
+            return OrderMapper(POOL.get_connection())
+        if isinstance(obj, OutboxMessage):
+            return OutboxMapper(POOL.get_connection())
+        if isinstance(obj, ProductImage):
+            return ImageMapper(POOL.get_connection())
+        if isinstance(obj, AbstractUser):
+            return UserMapper(POOL.get_connection())
 
     @staticmethod
     def get_current_mapper(name):
-        return MapperRegistry.mappers[name](connection)
+        return MapperRegistry.mappers[name](POOL.get_connection())
+
+    @staticmethod
+    def caches():
+        """Кэши чтения мапперов по имени маппера"""
+        return {name: mapper.cache for name, mapper in MapperRegistry.mappers.items() if 'cache' in vars(mapper)}
+
+    @staticmethod
+    def cache_stats():
+        """Возвращает счетчики попаданий и промахов кэшей мапперов"""
+        return {name: cache.stats() for name, cache in MapperRegistry.caches().items()}
+
+    @staticmethod
+    def register_metrics(metrics):
+        """Публикует счетчики кэшей мапперов в метриках (/metrics/)"""
+        for name, cache in MapperRegistry.caches().items():
+            metrics.register_cache(f'mapper_{name}', cache)
+
+
+MapperRegistry.register_metrics(METRICS)
@@ -1,13 +1,81 @@
+from argparse import ArgumentParser
 from wsgiref.simple_server import make_server
 
 
+from create_db import migrate
 from framework.main import FrameworkApp
-from urls import fronts
-from views import routes
+from framework.metrics import METRICS
+from framework.middleware import CompressionMiddleware
+from framework.server import PreforkServer
+from framework.sessions import STORES
+from framework.static import STATIC_MANIFEST, StaticFiles
+from framework.templator import TemplateEngine
+from urls import SESSIONS, fronts
+from views import OUTBOX, THUMBNAILS, routes
+from patterns.pattern_creator import POOL, MapperRegistry
+
+
+def warm_up():
+    """Прогрев перед запуском рабочих процессов: миграции, манифест статики, шаблоны и страницы БД в кэше ОС"""
+    migrate()
+    STATIC_MANIFEST.build()
+    TemplateEngine.reset()
+    TemplateEngine.warm_up()
+    MapperRegistry.get_current_mapper('category').all()
+    MapperRegistry.get_current_mapper('products').latest(3)
+    POOL.release_thread()
+    POOL.close_all()
+
+
+def parse_args():
+    parser = ArgumentParser(description='Запуск интернет-магазина')
+    parser.add_argument('--host', default='')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--workers', type=int, default=0, help='количество процессов, 0 - однопоточный сервер')
+    parser.add_argument('--threads', type=int, default=1, help='потоков в каждом процессе')
+    parser.add_argument('--max-requests', type=int, default=0, help='перезапуск процесса после N запросов')
+    parser.add_argument('--keepalive', type=int, default=5, help='таймаут keep-alive, секунды')
+    parser.add_argument('--profiling', action='store_true', help='разрешить профилирование запросов с ?profile=1')
+    parser.add_argument('--sessions', choices=sorted(STORES),
+                        help='хранилище сессий, по умолчанию memory, а при --workers - shared')
+    parser.add_argument('--gzip-level', type=int, default=6, help='уровень сжатия ответов gzip, 0 - не сжимать')
+    parser.add_argument('--outbox-threads', type=int, default=2,
+                        help='потоков доставки уведомлений в каждом процессе, 0 - не доставлять')
+    parser.add_argument('--thumbnail-processes', type=int, default=2,
+                        help='процессов построения миниатюр изображений в каждом рабочем процессе, 0 - не строить')
+    parser.add_argument('--db-connections', type=int, default=0,
+                        help='соединений с БД в каждом процессе, 0 - по числу потоков запросов')
+    args = parser.parse_args()
+    # каждый поток запросов может одновременно держать соединение, еще одно - для записи миниатюр и сессий;
+    # потоки доставки уведомлений открывают собственные соединения
+    required = args.threads + 1
+    if args.db_connections and args.db_connections < required:
+        parser.error(f'--db-connections {args.db_connections} меньше, чем нужно потокам: {required} '
+                     f'(--threads + 1)')
+    args.db_connections = args.db_connections or max(POOL.max_size, required)
+    return args
+
 
 if __name__ == '__main__':
-    application = FrameworkApp(routes, fronts)
-    port = 8081
-    with make_server('', port, application) as httpd:
-        print(f'Запущен сервер на порту {port}...')
-        httpd.serve_forever()
+    args = parse_args()
+    TemplateEngine.configure(bytecode_dir='.jinja_cache')
+    METRICS.profiling = args.profiling
+    sessions = args.sessions or ('shared' if args.workers else 'memory')
+    SESSIONS.store = STORES[sessions](POOL) if sessions == 'sqlite' else STORES[sessions]()
+    POOL.max_size = args.db_connections
+    OUTBOX.threads = args.outbox_threads
+    THUMBNAILS.processes = args.thumbnail_processes
+    middlewares = [CompressionMiddleware(args.gzip_level)] if args.gzip_level else []
+    application = StaticFiles(FrameworkApp(routes, fronts, middlewares=middlewares))
+
+    if args.workers:
+        PreforkServer(application, args.host, args.port, workers=args.workers, threads=args.threads,
+                      keepalive=args.keepalive, max_requests=args.max_requests,
+                      max_requests_jitter=args.max_requests // 10, warm_up=warm_up,
+                      post_fork=OUTBOX.start).serve_forever()
+    else:
+        warm_up()
+        OUTBOX.start()
+        with make_server(args.host, args.port, application) as httpd:
+            print(f'Запущен сервер на порту {args.port}...')
+            httpd.serve_forever()
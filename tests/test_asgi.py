@@ -0,0 +1,20 @@
+import unittest
+
+from framework.asgi import AsgiFrameworkApp
+
+
+class BuildEnvironTest(unittest.TestCase):
+    """PATH_INFO под ASGI совпадает с тем, что передает wsgiref"""
+
+    def environ(self, path):
+        return AsgiFrameworkApp.build_environ({'method': 'GET', 'path': path, 'query_string': b''}, b'')
+
+    def test_path_not_unquoted_twice(self):
+        self.assertEqual(self.environ('/products/%41/')['PATH_INFO'], '/products/%41/')
+
+    def test_path_is_latin1_string(self):
+        self.assertEqual(self.environ('/товары/')['PATH_INFO'], '/товары/'.encode('utf-8').decode('latin-1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
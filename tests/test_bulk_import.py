@@ -0,0 +1,83 @@
+import io
+import json
+import unittest
+from sqlite3 import connect
+
+from benchmarks.common import temp_database, remove_database
+from patterns.architect_pattern import UnitOfWork
+from patterns.bulk_import import CatalogImporter, iter_json_array, parse_price
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.warnings = []
+
+    def log(self, text, *args):
+        pass
+
+    def warning(self, text, *args):
+        self.warnings.append(text % args)
+
+
+def json_file(items):
+    return io.StringIO(json.dumps(items, ensure_ascii=False))
+
+
+def product(name, category='Категория 1', price=100):
+    return {'name': name, 'category': category, 'price': price, 'product_type': 'product'}
+
+
+class ParseTest(unittest.TestCase):
+    def test_iter_json_array_small_chunks(self):
+        items = [{'name': 'a, [b]'}, {'name': 'в "кавычках"'}, 3, [1, 2]]
+        self.assertEqual(list(iter_json_array(json_file(items), chunk_size=3)), items)
+
+    def test_parse_price(self):
+        self.assertEqual(parse_price('120'), 120)
+        self.assertEqual(parse_price(120.0), 120)
+        for value in (12.5, '12.5', 'abc', ''):
+            with self.assertRaises(ValueError):
+                parse_price(value)
+
+
+class CatalogImporterTest(unittest.TestCase):
+    """Пакетная загрузка: пачки, пропуск некорректных записей и обновление по имени"""
+
+    def setUp(self):
+        self.path = temp_database(products=0, categories=2)
+        self.connection = connect(self.path)
+        UnitOfWork.set_current(None)
+
+    def tearDown(self):
+        self.connection.close()
+        remove_database(self.path)
+
+    def products(self):
+        return dict(self.connection.execute('SELECT name, price FROM product').fetchall())
+
+    def test_batches(self):
+        importer = CatalogImporter(self.connection, batch_size=3)
+        stats = importer.import_products(json_file([product(f'Товар {i}', price=i) for i in range(10)]))
+        self.assertEqual((stats.inserted, stats.skipped), (10, 0))
+        self.assertEqual(self.products(), {f'Товар {i}': i for i in range(10)})
+
+    def test_malformed_records_skipped(self):
+        logger = RecordingLogger()
+        importer = CatalogImporter(self.connection, logger=logger)
+        items = [product('Хороший'), product('Дробная цена', price=1.5), {'name': 'Без категории'},
+                 product('Чужая категория', category='Нет такой'), product('Текстовая цена', price='дорого')]
+        stats = importer.import_products(json_file(items))
+        self.assertEqual((stats.inserted, stats.skipped), (1, 4))
+        self.assertEqual(list(self.products()), ['Хороший'])
+        self.assertEqual(len(logger.warnings), 3)
+
+    def test_upsert_updates_by_name(self):
+        CatalogImporter(self.connection).import_products(json_file([product('Молоток', price=100)]))
+        importer = CatalogImporter(self.connection, upsert=True)
+        stats = importer.import_products(json_file([product('Молоток', price=150), product('Пила', price=300)]))
+        self.assertEqual((stats.inserted, stats.updated), (1, 1))
+        self.assertEqual(self.products(), {'Молоток': 150, 'Пила': 300})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from concurrent.futures import Future
+
+from framework.images import ThumbnailPool
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.records = []
+
+    def error(self, text, *args):
+        self.records.append(text % args)
+
+
+class ThumbnailErrorTest(unittest.TestCase):
+    """Ошибка записи результата миниатюр уходит в логгер приложения"""
+
+    def test_on_done_error_logged(self):
+        def on_done(image_id, result, error):
+            raise RuntimeError('database is locked')
+
+        logger = RecordingLogger()
+        pool = ThumbnailPool(store=None, on_done=on_done, processes=0, logger=logger)
+        future = Future()
+        future.set_result({160: 'thumb.jpg'})
+        pool.complete(7, future)
+        self.assertEqual(len(logger.records), 1)
+        self.assertIn('7', logger.records[0])
+        self.assertIn('database is locked', logger.records[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
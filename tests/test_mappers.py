@@ -0,0 +1,125 @@
+import unittest
+from sqlite3 import connect
+
+from benchmarks.common import temp_database, remove_database
+from framework.metrics import Metrics
+from patterns.architect_pattern import UnitOfWork
+from errors import DbCommitException
+from patterns.pattern_creator import Category, CategoryMapper, ImageMapper, MapperRegistry, Order, OrderMapper, \
+    ProductImage, ProductsMapper, SearchMapper
+
+
+class RowCacheTest(unittest.TestCase):
+    """Кэш чтения маппера товаров и версии данных"""
+
+    def setUp(self):
+        self.path = temp_database(products=10, categories=2)
+        self.connection = connect(self.path)
+        self.other = connect(self.path)
+        ProductsMapper.cache.clear()
+        UnitOfWork.set_current(None)
+
+    def tearDown(self):
+        UnitOfWork.set_current(None)
+        self.connection.close()
+        self.other.close()
+        remove_database(self.path)
+
+    def rename(self, _id, name):
+        self.other.execute('UPDATE product SET name=? WHERE id=?', (name, _id))
+        self.other.commit()
+
+    def test_write_in_other_connection_invalidates(self):
+        mapper = ProductsMapper(self.connection)
+        self.assertEqual(mapper.find_by_id(1).name, 'Товар 0')
+        self.rename(1, 'Новое имя')
+        self.assertEqual(mapper.find_by_id(1).name, 'Новое имя')
+
+    def test_version_read_once_per_unit_of_work(self):
+        statements = []
+        self.connection.set_trace_callback(statements.append)
+        mapper = ProductsMapper(self.connection)
+        UnitOfWork.new_current()
+        for _id in (1, 2, 1, 2):
+            mapper.find_by_id(_id)
+        UnitOfWork.new_current()
+        mapper.find_by_id(1)
+        self.assertEqual(sum('data_version' in statement for statement in statements), 2)
+
+    def test_search_has_own_cache(self):
+        SearchMapper.cache.clear()
+        SearchMapper(self.connection).search('товар')
+        self.assertEqual(len(ProductsMapper.cache), 0)
+        self.assertEqual(len(SearchMapper.cache), 1)
+
+    def test_cache_counters_in_metrics(self):
+        metrics = Metrics()
+        MapperRegistry.register_metrics(metrics)
+        ProductsMapper(self.connection).find_by_id(1)
+        self.assertIn('app_cache_misses_total{cache="mapper_products"} 1', metrics.render_prometheus())
+
+
+class TableMapperTest(unittest.TestCase):
+    """Общая запись мапперов: id вставленных объектов, обновление, удаление и откат при ошибке"""
+
+    def setUp(self):
+        self.path = temp_database(products=3, categories=2)
+        self.connection = connect(self.path)
+        UnitOfWork.set_current(None)
+
+    def tearDown(self):
+        self.connection.close()
+        remove_database(self.path)
+
+    def test_insert_many_assigns_ids(self):
+        mapper = CategoryMapper(self.connection)
+        categories = [Category(f'Новая {i}', None) for i in range(3)]
+        mapper.insert_many(categories)
+        self.connection.commit()
+        for category in categories:
+            self.assertEqual(mapper.find_by_id(category.id).name, category.name)
+
+    def version(self, name):
+        return self.connection.execute('SELECT version FROM data_version WHERE name=?', (name,)).fetchone()[0]
+
+    def test_batch_bumps_version_once(self):
+        before = self.version('category')
+        CategoryMapper(self.connection).insert_many([Category(f'Новая {i}', None) for i in range(5)])
+        self.connection.commit()
+        self.assertEqual(self.version('category'), before + 1)
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM data_version_batch').fetchone()[0], 0)
+
+    def test_single_row_bumps_version(self):
+        before = self.version('category')
+        CategoryMapper(self.connection).insert(Category('Одна', None))
+        self.assertEqual(self.version('category'), before + 1)
+
+    def test_update_and_delete(self):
+        mapper = CategoryMapper(self.connection)
+        category = mapper.find_by_id(1)
+        category.name = 'Переименована'
+        mapper.update(category)
+        self.assertEqual(mapper.find_by_name('Переименована').id, 1)
+        mapper.delete(category)
+        self.assertNotIn(1, mapper.name_map().values())
+
+    def test_order_delete_removes_items(self):
+        order = Order('user')
+        mapper = OrderMapper(self.connection)
+        mapper.insert_many([order])
+        self.connection.execute('INSERT INTO order_item (order_id, product_id, name, price, quantity) '
+                                'VALUES (?, 1, "Товар", 100, 1)', (order.id,))
+        mapper.delete_many([order])
+        self.connection.commit()
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM order_item').fetchone()[0], 0)
+
+    def test_image_insert_rolls_back(self):
+        CategoryMapper(self.connection).insert_many([Category('Незафиксированная', None)])
+        with self.assertRaises(DbCommitException):
+            ImageMapper(self.connection).insert(ProductImage(1, None, '.jpg', 10))
+        self.assertFalse(self.connection.in_transaction)
+        self.assertNotIn('Незафиксированная', CategoryMapper(self.connection).name_map())
+
+
+if __name__ == '__main__':
+    unittest.main()
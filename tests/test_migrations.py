@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlite3 import Error, connect
+
+from create_db import MIGRATIONS_DIR, get_version, migrate
+
+
+class PriceMigrationTest(unittest.TestCase):
+    """Миграция 0003 переводит цены в целые числа и не теряет некорректные значения"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='migrations_')
+        self.path = os.path.join(self.folder, 'store.sqlite')
+        self.before = os.path.join(self.folder, 'before')
+        os.mkdir(self.before)
+        for name in ('0001_initial.sql', '0002_indexes.sql'):
+            shutil.copy(os.path.join(MIGRATIONS_DIR, name), self.before)
+        migrate(self.path, self.before)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def insert_prices(self, *prices):
+        connection = connect(self.path)
+        with connection:
+            connection.executemany('INSERT INTO product (product_type, name, category_id, price, desc, img) '
+                                   'VALUES ("product", "Товар", 1, ?, "", "")', [(price,) for price in prices])
+        connection.close()
+
+    def select(self, statement):
+        connection = connect(self.path)
+        try:
+            return connection.execute(statement).fetchall(), get_version(connection)
+        finally:
+            connection.close()
+
+    def test_integer_prices_converted(self):
+        self.insert_prices('100', 250, '7.0')
+        migrate(self.path)
+        rows, version = self.select('SELECT price, typeof(price) FROM product ORDER BY id')
+        self.assertEqual(rows, [(100, 'integer'), (250, 'integer'), (7, 'integer')])
+        self.assertGreaterEqual(version, 3)
+
+    def check_refused(self, price):
+        self.insert_prices('100', price)
+        with self.assertRaises(Error):
+            migrate(self.path)
+        rows, version = self.select('SELECT price FROM product ORDER BY id')
+        self.assertEqual(version, 2)
+        self.assertEqual(rows, [('100',), (price,)])
+
+    def test_fractional_price_refused(self):
+        self.check_refused('12.5')
+
+    def test_empty_price_refused(self):
+        self.check_refused('')
+
+    def test_non_numeric_price_refused(self):
+        self.check_refused('abc')
+
+    def test_null_price_refused(self):
+        self.check_refused(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
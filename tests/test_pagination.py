@@ -0,0 +1,62 @@
+import unittest
+
+from patterns.pattern_creator import PaginatedListView
+
+
+class Item:
+    def __init__(self, _id):
+        self.id = _id
+
+
+class CountingView(PaginatedListView):
+    """Список из 100 записей, который считает, сколько записей прочитано из queryset"""
+
+    def __init__(self):
+        self.read = 0
+
+    def get_queryset(self):
+        for _id in range(1, 101):
+            self.read += 1
+            yield Item(_id)
+
+
+class DefaultPageTest(unittest.TestCase):
+    """Страница по умолчанию выбирается из итератора без чтения всего queryset"""
+
+    def ids(self, page):
+        return [item.id for item in page]
+
+    def test_first_page(self):
+        view = CountingView()
+        page = view.get_page(10)
+        self.assertEqual(self.ids(page), list(range(1, 11)))
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_prev)
+        self.assertEqual(view.read, 11)
+
+    def test_after(self):
+        view = CountingView()
+        page = view.get_page(10, after_id=20)
+        self.assertEqual(self.ids(page), list(range(21, 31)))
+        self.assertTrue(page.has_prev)
+        self.assertEqual(view.read, 31)
+
+    def test_last_page(self):
+        page = CountingView().get_page(10, after_id=95)
+        self.assertEqual(self.ids(page), list(range(96, 101)))
+        self.assertFalse(page.has_next)
+
+    def test_before(self):
+        page = CountingView().get_page(10, before_id=31)
+        self.assertEqual(self.ids(page), list(range(21, 31)))
+        self.assertTrue(page.has_prev)
+        self.assertTrue(page.has_next)
+
+    def test_before_first_page(self):
+        page = CountingView().get_page(10, before_id=6)
+        self.assertEqual(self.ids(page), list(range(1, 6)))
+        self.assertFalse(page.has_prev)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import io
+import unittest
+from urllib.parse import unquote_plus
+
+from framework.main import lazy_front
+from framework.requests import BadRequest, Request, RequestTooLarge, parse_cookies, parse_qs, parse_query_string, \
+    unquote
+
+
+def make_environ(method='GET', query='', body=b'', content_type='', **extra):
+    return {'REQUEST_METHOD': method, 'PATH_INFO': '/', 'QUERY_STRING': query, 'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body), **extra}
+
+
+class QueryParserTest(unittest.TestCase):
+    """Разбор строки запроса и процентной кодировки"""
+
+    def test_repeated_keys(self):
+        params = parse_qs('id=1&id=2&page=3')
+        self.assertEqual(params['id'], '2')
+        self.assertEqual(params.getlist('id'), ['1', '2'])
+        self.assertEqual(params.getlist('page'), ['3'])
+        self.assertEqual(params.getlist('missing'), [])
+
+    def test_value_with_equals_and_empty_key_value(self):
+        params = parse_qs('a=b=c&flag&&x=')
+        self.assertEqual(params, {'a': 'b=c', 'flag': '', 'x': ''})
+
+    def test_unquote_matches_stdlib(self):
+        for value in ('%D1%82%D0%BE%D0%B2%D0%B0%D1%80', 'a+b', '100%', '%zz%41', 'a=b%3D', '%0A%41'):
+            self.assertEqual(unquote(value), unquote_plus(value), value)
+
+    def test_too_many_fields(self):
+        with self.assertRaises(RequestTooLarge):
+            parse_qs('&'.join(f'k{i}=1' for i in range(11)), max_fields=10)
+
+    def test_raw_utf8_query(self):
+        environ = make_environ(query='q=товар'.encode('utf-8').decode('latin-1'))
+        self.assertEqual(parse_query_string(environ)['q'], 'товар')
+
+    def test_cookies_first_value_wins(self):
+        self.assertEqual(parse_cookies('sid="abc"; theme=dark; sid=other; broken'), {'sid': 'abc', 'theme': 'dark'})
+
+
+class RequestTest(unittest.TestCase):
+    """Ленивый разбор запроса и доступ по ключам"""
+
+    def test_form_body(self):
+        body = 'name=%D0%9C%D0%BE%D0%BB%D0%BE%D1%82&price=10'.encode()
+        request = Request(make_environ('POST', body=body, content_type='application/x-www-form-urlencoded'))
+        self.assertEqual(request['data'], {'name': 'Молот', 'price': '10'})
+
+    def test_bad_content_length(self):
+        environ = make_environ('POST', content_type='application/x-www-form-urlencoded')
+        environ['CONTENT_LENGTH'] = '-1'
+        with self.assertRaises(BadRequest):
+            Request(environ).data
+
+    def test_query_parsed_once(self):
+        request = Request(make_environ(query='page=2'))
+        self.assertIs(request['request_params'], request.query)
+        self.assertEqual(request.get('request_params')['page'], '2')
+
+    def test_headers_and_aliases(self):
+        request = Request(make_environ(HTTP_IF_NONE_MATCH='"v1"', HTTP_X_TEST='1'))
+        self.assertEqual(request['if_none_match'], '"v1"')
+        self.assertEqual(request['headers']['x-test'], '1')
+        self.assertEqual(request['method'], 'GET')
+        self.assertNotIn('error', request)
+
+    def test_lazy_front_computed_once(self):
+        calls = []
+
+        @lazy_front('year')
+        def year(request):
+            calls.append(request)
+            return 2026
+
+        request = Request.with_lazy({'year': year})(make_environ())
+        self.assertIsNone(request.peek('year'))
+        self.assertEqual(request['year'], 2026)
+        self.assertEqual(request.get('year'), 2026)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(request.context)
+
+    def test_context_keys(self):
+        request = Request(make_environ())
+        self.assertNotIn('title', request)
+        self.assertEqual(request.get('title', 'нет'), 'нет')
+        request['title'] = 'Каталог'
+        self.assertEqual(request['title'], 'Каталог')
+        with self.assertRaises(KeyError):
+            request['missing']
+
+
+if __name__ == '__main__':
+    unittest.main()
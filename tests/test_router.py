@@ -0,0 +1,64 @@
+import unittest
+
+from framework.router import MethodNotAllowed, RouteNotFound, Router
+
+
+def view(name):
+    def handler(request):
+        return name
+    handler.__name__ = name
+    return handler
+
+
+class RouterTest(unittest.TestCase):
+    """Сопоставление путей с маршрутами и конвертеры параметров"""
+
+    def setUp(self):
+        self.views = {name: view(name) for name in ('index', 'detail', 'slug', 'any', 'static', 'files', 'latest')}
+        self.router = Router()
+        self.router.add('/', self.views['index'])
+        self.router.add('/products/<int:id>/', self.views['detail'], ['GET'])
+        self.router.add('/products/latest/', self.views['latest'])
+        self.router.add('/category/<slug:name>/', self.views['slug'])
+        self.router.add('/tag/<name>/', self.views['any'])
+        self.router.add('/files/<path:rest>/', self.views['files'])
+
+    def test_static(self):
+        self.assertEqual(self.router.match('/'), (self.views['index'], {}))
+
+    def test_int_converter(self):
+        self.assertEqual(self.router.match('/products/42/'), (self.views['detail'], {'id': 42}))
+        with self.assertRaises(RouteNotFound):
+            self.router.match('/products/-1/')
+
+    def test_static_wins_over_parameter(self):
+        self.assertIs(self.router.match('/products/latest/')[0], self.views['latest'])
+
+    def test_slug_converter(self):
+        self.assertEqual(self.router.match('/category/hand-tools_2/')[1], {'name': 'hand-tools_2'})
+        with self.assertRaises(RouteNotFound):
+            self.router.match('/category/инструмент/')
+
+    def test_str_converter_default(self):
+        self.assertEqual(self.router.match('/tag/инструмент/')[1], {'name': 'инструмент'})
+
+    def test_path_converter(self):
+        self.assertEqual(self.router.match('/files/a/b/c.txt/')[1], {'rest': 'a/b/c.txt'})
+
+    def test_method_not_allowed(self):
+        with self.assertRaises(MethodNotAllowed) as caught:
+            self.router.match('/products/1/', 'POST')
+        self.assertEqual(caught.exception.allowed, ['GET', 'HEAD'])
+        self.assertIs(self.router.match('/products/1/', 'HEAD')[0], self.views['detail'])
+
+    def test_unknown_converter(self):
+        with self.assertRaises(ValueError):
+            Router().add('/x/<uuid:id>/', self.views['index'])
+
+    def test_normalize(self):
+        self.assertEqual(Router.normalize('/products'), '/products/')
+        self.assertEqual(Router.normalize('/products/'), '/products/')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import io
+import unittest
+
+import views
+from framework.main import FrameworkApp
+from urls import fronts
+
+
+class MethodNotAllowedTest(unittest.TestCase):
+    """Маршруты приложения отвечают 405 на методы, которые представление не поддерживает"""
+
+    def setUp(self):
+        self.app = FrameworkApp(views.routes, fronts)
+
+    def request(self, method, path):
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'wsgi.input': io.BytesIO()}
+        return self.app.handle(environ)
+
+    def test_delete_products_not_allowed(self):
+        response = self.request('DELETE', '/products/')
+        self.assertEqual(response.status_code, 405)
+        self.assertIn(('Allow', 'GET, HEAD'), response.headers)
+
+    def test_put_index_not_allowed(self):
+        self.assertEqual(self.request('PUT', '/').status_code, 405)
+
+    def test_post_form_allowed(self):
+        router = self.app.router
+        view, _ = router.match('/login/', 'POST')
+        self.assertIs(view, router.match('/login/', 'GET')[0])
+
+
+class DebugMetricsAccessTest(unittest.TestCase):
+    """Последние запросы и профили доступны только с разрешенных адресов и не через прокси"""
+
+    def setUp(self):
+        self.app = FrameworkApp(views.routes, fronts)
+
+    def request(self, path, address, **headers):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'REMOTE_ADDR': address,
+                   'wsgi.input': io.BytesIO(), **headers}
+        return self.app.handle(environ)
+
+    def test_local_allowed(self):
+        for path in ('/metrics/requests/', '/metrics/profiles/'):
+            self.assertEqual(self.request(path, '127.0.0.1').status_code, 200)
+
+    def test_remote_forbidden(self):
+        for path in ('/metrics/requests/', '/metrics/profiles/'):
+            self.assertEqual(self.request(path, '203.0.113.7').status_code, 403)
+
+    def test_proxied_forbidden(self):
+        response = self.request('/metrics/requests/', '127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(response.status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import io
+import unittest
+
+from benchmarks.common import temp_database, remove_database
+from framework.db import ConnectionPool
+from framework.requests import Request, Response
+from framework.sessions import MemorySessionStore, SessionManager, SessionTooLarge, SharedMemorySessionStore, \
+    SqliteSessionStore
+
+
+class StoreContract:
+    """Общие проверки хранилищ сессий"""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def test_save_load_delete(self):
+        store = self.make_store()
+        store.save('sid1', {'user': 'Анна', 'basket': [1, 2]}, 60)
+        self.assertEqual(store.load('sid1'), {'user': 'Анна', 'basket': [1, 2]})
+        store.delete('sid1')
+        self.assertIsNone(store.load('sid1'))
+
+    def test_expired(self):
+        store = self.make_store()
+        store.save('sid2', {'user': 'Анна'}, -1)
+        self.assertIsNone(store.load('sid2'))
+
+    def test_unknown(self):
+        self.assertIsNone(self.make_store().load('missing'))
+
+
+class MemoryStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return MemorySessionStore()
+
+
+class SharedMemoryStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return SharedMemorySessionStore(slots=16, slot_size=256)
+
+    def test_too_large(self):
+        with self.assertRaises(SessionTooLarge):
+            self.make_store().save('sid', {'data': 'x' * 1000}, 60)
+
+
+class SqliteStoreTest(StoreContract, unittest.TestCase):
+    def setUp(self):
+        self.path = temp_database(products=0)
+        self.pool = ConnectionPool(self.path)
+
+    def tearDown(self):
+        self.pool.close_all()
+        remove_database(self.path)
+
+    def make_store(self):
+        return SqliteSessionStore(self.pool)
+
+
+class SessionManagerTest(unittest.TestCase):
+    """Загрузка сессии по подписанному cookie и запись только измененной сессии"""
+
+    def setUp(self):
+        self.store = MemorySessionStore()
+        self.manager = SessionManager(self.store, secret=b'test-secret')
+        self.request_class = Request.with_lazy({'session': self.manager})
+
+    def request(self, cookie=None):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/', 'QUERY_STRING': '', 'wsgi.input': io.BytesIO()}
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        return self.request_class(environ)
+
+    def cookie(self, response):
+        return next(value for name, value in response.headers if name == 'Set-Cookie').split(';')[0]
+
+    def test_new_session_sets_cookie(self):
+        request = self.request()
+        request['session']['user'] = 'Анна'
+        response = Response()
+        self.manager.finish(request, response)
+        cookie = self.cookie(response)
+        self.assertEqual(self.request(cookie)['session']['user'], 'Анна')
+
+    def test_unmodified_session_not_saved(self):
+        request = self.request()
+        request['session']
+        response = Response()
+        self.manager.finish(request, response)
+        self.assertNotIn('Set-Cookie', dict(response.headers))
+        self.assertEqual(len(self.store.cache), 0)
+
+    def test_untouched_session_not_loaded(self):
+        request = self.request('sid=forged.signature')
+        self.manager.finish(request, Response())
+        self.assertIsNone(request.peek('session'))
+
+    def test_forged_cookie_ignored(self):
+        self.store.save('victim', {'user': 'admin'}, 60)
+        self.assertEqual(dict(self.request('sid=victim.forged')['session']), {})
+
+    def test_modified_session_refreshes_cookie(self):
+        request = self.request()
+        request['session']['user'] = 'Анна'
+        first = Response()
+        self.manager.finish(request, first)
+        again = self.request(self.cookie(first))
+        again['session']['basket'] = [1]
+        second = Response()
+        self.manager.finish(again, second)
+        self.assertEqual(self.cookie(second), self.cookie(first))
+        self.assertIn('Max-Age', dict(second.headers)['Set-Cookie'])
+
+    def test_regenerate_replaces_old_session(self):
+        request = self.request()
+        request['session']['user'] = 'Анна'
+        response = Response()
+        self.manager.finish(request, response)
+        old_sid = self.cookie(response).split('=', 1)[1].rpartition('.')[0]
+        login = self.request(self.cookie(response))
+        login['session'].regenerate()
+        self.manager.finish(login, Response())
+        self.assertIsNone(self.store.load(old_sid))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+
+from errors import DbCommitException
+from patterns.architect_pattern import UnitOfWork
+
+
+class Connection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class RecordingMapper:
+    def __init__(self, connection, calls, fail=False):
+        self.connection = connection
+        self.calls = calls
+        self.fail = fail
+        self.invalidated = 0
+
+    def write(self, operation, objs):
+        if self.fail:
+            raise ValueError('constraint failed')
+        self.calls.append((operation, [obj.name for obj in objs]))
+
+    def insert_many(self, objs):
+        self.write('insert', objs)
+
+    def update_many(self, objs):
+        self.write('update', objs)
+
+    def delete_many(self, objs):
+        self.write('delete', objs)
+
+    def invalidate(self):
+        self.invalidated += 1
+
+
+class Item:
+    def __init__(self, name):
+        self.name = name
+
+
+class Registry:
+    def __init__(self, mapper):
+        self.mapper = mapper
+
+    def get_mapper(self, obj):
+        return self.mapper
+
+
+class UnitOfWorkTest(unittest.TestCase):
+    """Группировка записей по операциям, отмена вставки удалением и откат при ошибке"""
+
+    def make(self, fail=False):
+        self.connection = Connection()
+        self.calls = []
+        self.mapper = RecordingMapper(self.connection, self.calls, fail)
+        unit_of_work = UnitOfWork()
+        unit_of_work.set_mapper_registry(Registry(self.mapper))
+        return unit_of_work
+
+    def test_one_statement_per_operation(self):
+        unit_of_work = self.make()
+        a, b, c = Item('a'), Item('b'), Item('c')
+        unit_of_work.register_new(a)
+        unit_of_work.register_new(b)
+        unit_of_work.register_dirty(c)
+        unit_of_work.register_dirty(a)
+        unit_of_work.commit()
+        self.assertEqual(self.calls, [('insert', ['a', 'b']), ('update', ['c'])])
+        self.assertEqual(self.connection.commits, 1)
+
+    def test_remove_new_cancels_insert(self):
+        unit_of_work = self.make()
+        item = Item('a')
+        unit_of_work.register_new(item)
+        unit_of_work.register_removed(item)
+        unit_of_work.commit()
+        self.assertEqual(self.calls, [])
+
+    def test_removed_not_updated(self):
+        unit_of_work = self.make()
+        item = Item('a')
+        unit_of_work.register_dirty(item)
+        unit_of_work.register_removed(item)
+        unit_of_work.register_dirty(item)
+        unit_of_work.commit()
+        self.assertEqual(self.calls, [('delete', ['a'])])
+
+    def test_failure_rolls_back(self):
+        unit_of_work = self.make(fail=True)
+        unit_of_work.register_new(Item('a'))
+        with self.assertRaises(DbCommitException):
+            unit_of_work.commit()
+        self.assertEqual((self.connection.commits, self.connection.rollbacks), (0, 1))
+        self.assertEqual(self.mapper.invalidated, 1)
+        self.assertEqual(unit_of_work.new_objects, {})
+
+    def test_current_is_per_thread_slot(self):
+        UnitOfWork.new_current()
+        first = UnitOfWork.get_current()
+        UnitOfWork.new_current()
+        self.assertIsNot(UnitOfWork.get_current(), first)
+        UnitOfWork.set_current(None)
+        self.assertIsNone(UnitOfWork.get_current())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,31 @@
 from datetime import date
 
 import variables
+from framework.db import ConnectionRelease
+from framework.main import lazy_front
+from framework.sessions import SessionManager
+from patterns.architect_pattern import UnitOfWork
+from patterns.pattern_creator import MapperRegistry, POOL
 
+SESSIONS = SessionManager()
 
+
+@lazy_front('year')
 def copyright_year(request):
-    """Получает значение текущего года и передает в шаблон"""
-    request['year'] = date.today().year
+    """Получает значение текущего года для шаблона"""
+    return date.today().year
 
 
+@lazy_front('user')
 def auth_user(request):
-    """Получает имя зарегистрированного пользователя"""
-    request['user'] = variables.AUTH_USER
+    """Получает имя пользователя, вошедшего в текущей сессии"""
+    return request['session'].get('user', variables.ANONYMOUS_USER)
+
+
+def unit_of_work(request):
+    """Открывает для запроса новую единицу работы с собственной картой идентичности"""
+    UnitOfWork.new_current()
+    UnitOfWork.get_current().set_mapper_registry(MapperRegistry)
 
 
-fronts = [copyright_year, auth_user]
+fronts = [copyright_year, SESSIONS, auth_user, unit_of_work, ConnectionRelease(POOL)]
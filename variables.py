@@ -1 +1,5 @@
-AUTH_USER = 'Анонимный'
+ANONYMOUS_USER = 'Анонимный'
+
+# Адреса клиентов, которым доступны /metrics/requests/ и /metrics/profiles/: там видны пути и параметры
+# запросов пользователей. По умолчанию только запросы с той же машины
+DEBUG_METRICS_ADDRESSES = ('127.0.0.1', '::1')
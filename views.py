@@ -1,23 +1,92 @@
 """Описание представлений"""
+import os
 from datetime import date
 
 import variables
-from framework.templator import render
+from errors import DuplicateKeyException, RecordNotFoundException
+from framework.images import IMAGE_STORE, ThumbnailPool
+from framework.metrics import METRICS, PROMETHEUS_CONTENT_TYPE
+from framework.outbox import OutboxWorker
+from framework.requests import Response
+from framework.static import STATIC_MANIFEST
+from framework.templator import TemplateEngine, render
 from patterns.architect_pattern import UnitOfWork
-from patterns.pattern_creator import Engine, Logger, AppRoute, AppTime, ProductsSerializer, CreateView, ListView, \
-    EmailOrderNotifier, SmsOrderNotifier, PayPalPayment, CardPayment, MapperRegistry
+from patterns.bulk_import import CatalogImporter
+from patterns.pattern_creator import AbstractUser, Engine, Logger, AppRoute, AppAllowFrom, AppCache, AppCompress, \
+    AppTime, CreateView, ListView, PaginatedListView, EmailOrderNotifier, SmsOrderNotifier, PayPalPayment, \
+    CardPayment, MapperRegistry, POOL, ProductSchema, CategorySchema, ImageMapper, ProductImage
 
 ENGINE = Engine()
-LOGGER = Logger('main', 'file')
+LOGGER = Logger('main', 'async_file')
 EMAIL_NOTIFIER = EmailOrderNotifier()
 SMS_NOTIFIER = SmsOrderNotifier()
+OUTBOX = OutboxWorker(POOL, logger=LOGGER)
+OUTBOX.register(EMAIL_NOTIFIER.topic, EMAIL_NOTIFIER.deliver)
+OUTBOX.register(SMS_NOTIFIER.topic, SMS_NOTIFIER.deliver)
 
 routes = {}
-UnitOfWork.new_current()
-UnitOfWork.get_current().set_mapper_registry(MapperRegistry)
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
 
-@AppRoute(routes=routes, url='/')
+
+def thumbnails_done(image_id, result, error):
+    with POOL.connection() as connection:
+        ImageMapper(connection).thumbnails_done(image_id, result, error)
+
+
+THUMBNAILS = ThumbnailPool(IMAGE_STORE, thumbnails_done, logger=LOGGER)
+TemplateEngine.register_global('product_images',
+                               lambda products: MapperRegistry.get_current_mapper('image').for_products(products))
+
+
+def is_image(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def store_image(file, ext):
+    """
+    Сохраняет изображение в хранилище с адресацией по содержимому
+    :param file: файловый объект, открытый в двоичном режиме
+    :param ext: расширение файла
+    :return: ProductImage, еще не привязанное к товару
+    """
+    digest, size = IMAGE_STORE.put(file, ext)
+    return ProductImage(None, digest, ext, size)
+
+
+def attach_image(product, image):
+    """Записывает изображение сохраненного товара и ставит в очередь построение миниатюр"""
+    image.product_id = product.id
+    MapperRegistry.get_current_mapper('image').insert(image)
+    THUMBNAILS.submit(image.id, image.digest, image.ext)
+
+
+def import_catalog_images():
+    """
+    Загружает в хранилище изображения товаров, добавленных загрузкой каталога, и заново ставит в очередь
+    изображения, миниатюры которых не были построены
+    :return: количество загруженных изображений
+    """
+    mapper = MapperRegistry.get_current_mapper('image')
+    for image in mapper.pending():
+        THUMBNAILS.submit(image.id, image.digest, image.ext)
+    count = 0
+    for product_id, url in mapper.products_without_images():
+        asset, _ = STATIC_MANIFEST.find(url)
+        if asset is None or not is_image(asset.path):
+            continue
+        with open(asset.path, 'rb') as f:
+            image = store_image(f, os.path.splitext(asset.path)[1].lower())
+        image.product_id = product_id
+        mapper.insert(image)
+        THUMBNAILS.submit(image.id, image.digest, image.ext)
+        count += 1
+    return count
+
+
+@AppRoute(routes=routes, url='/', methods=['GET'])
+@AppCache(ttl=60, tags=('product',), params=())
+@AppCompress(9)
 class Index:
     """Представление главной страницы"""
 
@@ -30,35 +99,42 @@ class Index:
             'year': request.get('year'),
             'path': request.get('path'),
             'user': request.get('user'),
-            'product_list': MapperRegistry.get_current_mapper('products').all()[-3:]
+            'product_list': MapperRegistry.get_current_mapper('products').latest(3)[::-1]
         }
 
-        LOGGER.log(f'Сформирована главная страница с контекстом: {context}')
+        LOGGER.debug('Сформирована главная страница с контекстом: %s', context)
 
-        return '200 OK', render('index.html', context=context)
+        return Response(render('index.html', context=context))
 
 
-@AppRoute(routes=routes, url='/products/')
-class Products:
+@AppRoute(routes=routes, url='/products/', methods=['GET'])
+@AppCache(ttl=60, tags=('product', 'category'), params=('after', 'before'))
+@AppCompress(9)
+class Products(PaginatedListView):
     """Представление страницы с продуктами"""
+    template_name = 'products.html'
+    context_object_name = 'product_list'
+    title = 'Продукты'
 
-    @AppTime('Products')
-    def __call__(self, request):
-        title = 'Продукты'
+    def get_category_id(self):
+        return None
 
-        context = {
-            'title': title,
-            'year': request.get('year'),
-            'path': request.get('path'),
-            'user': request.get('user'),
-            'product_list': MapperRegistry.get_current_mapper('products').all(),
-            'category_list': MapperRegistry.get_current_mapper('category').all()
-        }
+    def get_page(self, limit, after_id=None, before_id=None):
+        return MapperRegistry.get_current_mapper('products').page(limit, after_id, before_id, self.get_category_id())
 
-        return '200 OK', render('products.html', context=context)
+    def get_context_data(self):
+        context = super().get_context_data()
+        context['title'] = self.title
+        context['year'] = self.request.get('year')
+        context['path'] = self.request.get('path')
+        tree = MapperRegistry.get_current_mapper('category').tree()
+        category = tree.get(self.get_category_id())
+        context['category_tree'] = tree
+        context['category_path'] = tree.ancestors(category.id) + [category] if category is not None else []
+        return context
 
 
-@AppRoute(routes=routes, url='/products/create-category/')
+@AppRoute(routes=routes, url='/products/create-category/', methods=['GET', 'POST'])
 class CreateCategory:
     """Представление страницы создания категории"""
 
@@ -71,15 +147,13 @@ class CreateCategory:
             'year': request.get('year'),
             'path': request.get('path'),
             'user': request.get('user'),
-            'product_list': MapperRegistry.get_current_mapper('products').all(),
             'category_list': MapperRegistry.get_current_mapper('category').all()
         }
 
-        if request['method'] == 'POST':
-            data = request['data']
+        if request.method == 'POST':
+            data = request.data
             name = data['name']
-            name = ENGINE.decode_value(name)
-            category_id = data.get('category_id')
+            category_id = data.get('category_id', '')
             category = None
 
             if category_id.isdigit():
@@ -90,14 +164,14 @@ class CreateCategory:
             MapperRegistry.get_current_mapper('category').insert(new_category)
             # ENGINE.categories.append(new_category)
 
-            LOGGER.log(f'Создана категория {name}')
+            LOGGER.info('Создана категория %s', name)
 
-            return '302 Found', [('Location', '/')]
+            return Response.redirect('/')
         else:
-            return '200 OK', render('create_category.html', context=context)
+            return Response(render('create_category.html', context=context))
 
 
-@AppRoute(routes=routes, url='/products/create-product/')
+@AppRoute(routes=routes, url='/products/create-product/', methods=['GET', 'POST'])
 class CreateProduct:
     """Представление страницы создания продукта"""
     category_id = - 1
@@ -115,57 +189,85 @@ class CreateProduct:
             'error': ''
         }
 
-        if request['method'] == 'POST':
-            data = request['data']
+        if request.method == 'POST':
+            data = request.data
 
             category_id = data['category_id']
             if not category_id.isdigit():
                 context['error'] = 'Необходимо выбрать категорию'
-                return '200 OK', render('create_product.html', context=context)
+                return Response(render('create_product.html', context=context))
             product_type = data['product_type']
             name = data['name']
             price = data['price']
+            if not price.isdigit():
+                context['error'] = 'Цена должна быть целым числом'
+                return Response(render('create_product.html', context=context))
+            price = int(price)
+            upload = request.files.get('img')
+            if upload is not None and upload.filename and not is_image(upload.filename):
+                context['error'] = 'Изображение должно быть в формате ' + ', '.join(IMAGE_EXTENSIONS)
+                return Response(render('create_product.html', context=context))
 
             # category = ENGINE.get_category_by_id(int(category_id))
             product = ENGINE.create_product(product_type, name, int(category_id), price)
+            image = None
+            if upload is not None and upload.filename:
+                upload.seek(0)
+                image = store_image(upload, os.path.splitext(upload.filename)[1].lower())
+                product.img = image.url
             MapperRegistry.get_current_mapper('products').insert(product)
+            if image is not None:
+                attach_image(product, image)
             # ENGINE.products.append(product)
 
-            LOGGER.log(f'Создан продукт {name}')
+            LOGGER.info('Создан продукт %s', name)
 
-            return '302 Found', [('Location', f'/products/category/?id={category_id}')]
+            return Response.redirect(f'/products/category/{category_id}/')
         else:
-            return '200 OK', render('create_product.html', context=context)
+            return Response(render('create_product.html', context=context))
 
 
-@AppRoute(routes=routes, url='/products/category/')
-class ProductsList:
+@AppRoute(routes=routes, url=['/products/category/', '/products/category/<int:id>/'], methods=['GET'])
+@AppCache(ttl=60, tags=('product', 'category'), params=('id', 'after', 'before'))
+class ProductsList(Products):
     """Представление страницы товаров для категории"""
-    category_id = -1
+    page_query_params = ('id',)
+
+    def get_category_id(self):
+        category_id = self.request.path_params.get('id', self.request.query.get('id', ''))
+        return int(category_id) if str(category_id).isdigit() else None
 
-    @AppTime('Products_list')
-    def __call__(self, request):
-        self.category_id = request['request_params']['id']
-        if self.category_id != -1:
-            products_list = MapperRegistry.get_current_mapper('products').find_by_category(int(self.category_id))
-        else:
-            products_list = []
 
-        title = f'Продукты'
+@AppRoute(routes=routes, url='/products/search/', methods=['GET'])
+@AppCache(ttl=60, tags=('product',), params=('q', 'page'))
+class SearchProducts:
+    """Представление страницы поиска товаров"""
+    paginate_by = 20
+
+    @AppTime('Search')
+    def __call__(self, request):
+        params = request.query
+        text = params.get('q', '').strip()
+        number = params.get('page', '')
+        number = int(number) if number.isdigit() and int(number) > 0 else 1
+        page = MapperRegistry.get_current_mapper('search').search(text, number, self.paginate_by)
 
         context = {
-            'title': title,
-            'year': request.get('year'),
+            'title': 'Поиск',
             'path': request.get('path'),
+            'year': request.get('year'),
             'user': request.get('user'),
-            'product_list': products_list,
-            'category_list': MapperRegistry.get_current_mapper('category').all()
+            'query': text,
+            'product_list': page.items,
+            'page': page,
+            'page_number': number
         }
 
-        return '200 OK', render('products.html', context=context)
+        return Response(render('search.html', context=context))
 
 
-@AppRoute(routes=routes, url='/contacts/')
+@AppRoute(routes=routes, url='/contacts/', methods=['GET', 'POST'])
+@AppCache(ttl=3600, params=())
 class Contacts:
     """Представление страницы контактов"""
 
@@ -180,10 +282,10 @@ class Contacts:
             'user': request.get('user')
         }
 
-        return '200 OK', render('contact.html', context=context)
+        return Response(render('contact.html', context=context))
 
 
-@AppRoute(routes=routes, url='/products/load/')
+@AppRoute(routes=routes, url='/products/load/', methods=['GET', 'POST'])
 class LoadData(CreateView):
     """Заполняет базу из файла json"""
     template_name = 'fill_db.html'
@@ -197,33 +299,17 @@ class LoadData(CreateView):
         return context
 
     def create_obj(self, data: dict):
+        importer = CatalogImporter(POOL.get_connection(), upsert='upsert' in data, logger=LOGGER)
         if 'data_category' in data:
             with open('json/category.json', 'r', encoding='utf-8') as f:
-                load_data = ProductsSerializer([]).load(f.read())
-            if load_data:
-                for item in load_data:
-                    new_category = ENGINE.create_category(item['name'])
-                    MapperRegistry.get_current_mapper('category').insert(new_category)
-                    # ENGINE.categories.append(new_category)
-                    LOGGER.log(f"Создана категория {item['name']}")
+                importer.import_categories(f)
         if 'data_product' in data:
             with open('json/products.json', 'r', encoding='utf-8') as f:
-                load_data = ProductsSerializer([]).load(f.read())
-            if load_data:
-                for item in load_data:
-                    category = MapperRegistry.get_current_mapper('category').find_by_name(item['category'])
-                    name = item['name']
-                    price = item['price']
-                    product_type = item['product_type']
-
-                    new_product = ENGINE.create_product(product_type, name, int(category.id), price)
-                    MapperRegistry.get_current_mapper('products').insert(new_product)
-                    # ENGINE.products.append(new_product)
+                importer.import_products(f)
+            LOGGER.info('Загружено изображений товаров: %s', import_catalog_images())
 
-                    LOGGER.log(f"Создан продукт {name}")
 
-
-@AppRoute(routes=routes, url='/create_user/')
+@AppRoute(routes=routes, url='/create_user/', methods=['GET', 'POST'])
 class CreateUser(CreateView):
     """Создание пользователя"""
     template_name = 'create_user.html'
@@ -241,35 +327,34 @@ class CreateUser(CreateView):
         name = data['name']
         password = data['password']
         user = ENGINE.create_user(user_type, name, password)
-        if user_type == 'buyer':
-            ENGINE.buyers.append(user)
-        else:
-            ENGINE.staff.append(user)
+        try:
+            ENGINE.add_user(user)
+        except DuplicateKeyException as err:
+            LOGGER.warning('Пользователь не создан: %s', err)
+            return
+        user.login(self.request['session'])
 
-        LOGGER.log(f'Создан пользователь {name}')
+        LOGGER.info('Создан пользователь %s', name)
 
 
-@AppRoute(routes=routes, url='/product/buy/')
+@AppRoute(routes=routes, url='/product/buy/', methods=['GET'])
 class BuyProduct:
-    """Добавление товара в корзину и создание корзины, если ее нет"""
-    product_id = -1
-    path = '/'
+    """Добавление товара в корзину покупателя, строка корзины записывается через UnitOfWork"""
 
     def __call__(self, request):
-        self.product_id = request['request_params']['id']
-        self.path = request['request_params']['path']
-        self.user = request.get('user')
+        product_id = request.query['id']
+        path = request.query.get('path', '/')
 
-        if self.product_id != -1:
-            if self.user == 'Анонимный':
-                return '302 Found', [('Location', f'/login/')]
-            basket = ENGINE.create_basket(self.user)
-            product = MapperRegistry.get_current_mapper('products').find_by_id(int(self.product_id))
-            basket.add_to_basket(product)
-            return '302 Found', [('Location', f'{self.path}')]
+        if request.get('user') == variables.ANONYMOUS_USER:
+            return Response.redirect('/login/')
+        basket = ENGINE.create_basket(request['session'])
+        product = MapperRegistry.get_current_mapper('products').find_by_id(int(product_id))
+        basket.add_to_basket(product)
+        UnitOfWork.get_current().commit()
+        return Response.redirect(path)
 
 
-@AppRoute(routes=routes, url='/login/')
+@AppRoute(routes=routes, url='/login/', methods=['GET', 'POST'])
 class Login(CreateView):
     """Авторизация пользователя"""
     template_name = 'login.html'
@@ -287,37 +372,32 @@ class Login(CreateView):
         password = data['password']
         try:
             user = ENGINE.get_user_by_name(name)
+        except RecordNotFoundException as err:
+            LOGGER.warning('Ошибка авторизации: %s', err)
         except Exception as err:
-            print(err)
+            LOGGER.error('Ошибка авторизации пользователя %s: %r', name, err)
         else:
-            if user.password == password:
-                user.login()
+            if user.check_password(password):
+                user.login(self.request['session'])
             else:
-                print('Ошибка авторизации. Не верный пароль')
+                LOGGER.warning('Ошибка авторизации пользователя %s: неверный пароль', name)
 
 
-@AppRoute(routes=routes, url='/logout/')
+@AppRoute(routes=routes, url='/logout/', methods=['GET'])
 class Logout:
     """Выход пользователя"""
     path = '/'
 
     def __call__(self, request):
-        name = request.get('user')
-        try:
-            user = ENGINE.get_user_by_name(name)
-        except Exception as err:
-            print(err)
-        else:
-            user.logout()
-
-        return '302 Found', [('Location', f'{self.path}')]
+        AbstractUser.logout(request['session'])
+        return Response.redirect(self.path)
 
 
-@AppRoute(routes=routes, url='/basket/')
+@AppRoute(routes=routes, url='/basket/', methods=['GET'])
 class BasketList(ListView):
     """Отображение корзины"""
     def get_queryset(self):
-        basket = ENGINE.get_basket(variables.AUTH_USER)
+        basket = ENGINE.get_basket(self.request['session'])
         if basket:
             queryset = basket.get_product_list()
         else:
@@ -327,47 +407,104 @@ class BasketList(ListView):
     template_name = 'basket.html'
 
 
-@AppRoute(routes=routes, url='/create_order/')
+@AppRoute(routes=routes, url='/create_order/', methods=['GET', 'POST'])
 class Order:
-    """Создание заказа"""
+    """
+    Оформление заказа: GET показывает сумму корзины, POST создает заказ из корзины и оплачивает его.
+    Уведомления о заказе записываются в outbox вместе с оплатой и отправляются в фоне
+    """
     def __call__(self, request):
-        user = request.get('user')
-        basket = ENGINE.get_basket(user)
+        basket = ENGINE.get_basket(request['session'])
         if not basket:
-            return '302 Found', [('Location', f'/')]
-        order = ENGINE.create_order(basket)
-        order.attach(EMAIL_NOTIFIER)
-        order.attach(SMS_NOTIFIER)
-        ENGINE.orders.append(order)
+            return Response.redirect('/')
 
-        title = 'Заказ'
+        if request.method == 'POST':
+            data = request.data
+            pay_method = data.get('pay_method')
+
+            if pay_method == 'paypal':
+                pay_method = PayPalPayment('example@mail.ru', 'example_token')
+            elif pay_method == 'card':
+                pay_method = CardPayment('1234-1234-1234-1234')
+            else:
+                return Response.redirect('/create_order/')
+
+            try:
+                order = ENGINE.create_order(basket)
+            except RecordNotFoundException:
+                return Response.redirect('/')
+            order.attach(EMAIL_NOTIFIER)
+            order.attach(SMS_NOTIFIER)
+            order.pay(pay_method)
+            UnitOfWork.get_current().commit()
+            OUTBOX.wake()
+            LOGGER.info('Оплачен заказ %s пользователя %s на сумму %s', order.id, order.user, order.total)
+
+            return Response.redirect('/')
 
         context = {
-            'title': title,
+            'title': 'Заказ',
             'year': request.get('year'),
-            'user': user,
-            'total': order.get_total_price(),
-            'order': order.id
+            'user': request.get('user'),
+            'total': basket.get_total_price()
         }
+        return Response(render('order.html', context=context))
 
-        if request['method'] == 'POST':
-            data = request['data']
-            pay_method = data['pay_method']
 
-            if pay_method == 'paypal':
-                pay_method = PayPalPayment('example@mail.ru', 'example_token')
-            elif pay_method == 'card':
-                pay_method = CardPayment('1234-1234-1234-1234')
+@AppCompress(1)
+class Api:
+    """Базовое представление API: потоковая выдача записей таблицы в формате json или ndjson"""
+    mapper_name = ''
+    schema = None
 
-            order.pay(pay_method)
+    def __call__(self, request):
+        params = request.query
+        try:
+            serializer = self.schema.from_param(params.get('fields'))
+        except ValueError as err:
+            return Response.text(str(err), 400)
+
+        rows = MapperRegistry.get_current_mapper(self.mapper_name).iter_rows(serializer.selected)
+        if params.get('format') == 'ndjson':
+            return Response(serializer.stream_ndjson(rows), content_type='application/x-ndjson; charset=utf-8')
+        return Response(serializer.stream_json(rows), content_type='application/json; charset=utf-8')
+
+
+@AppRoute(routes=routes, url='/api/products/', methods=['GET'])
+class ProductsApi(Api):
+    """API товаров"""
+    mapper_name = 'products'
+    schema = ProductSchema
+
+
+@AppRoute(routes=routes, url='/api/categories/', methods=['GET'])
+class CategoriesApi(Api):
+    """API категорий"""
+    mapper_name = 'category'
+    schema = CategorySchema
+
+
+@AppRoute(routes=routes, url='/metrics/', methods=['GET'])
+class Metrics:
+    """Метрики процесса в формате Prometheus"""
+
+    def __call__(self, request):
+        return Response(METRICS.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@AppRoute(routes=routes, url='/metrics/requests/', methods=['GET'])
+@AppAllowFrom(variables.DEBUG_METRICS_ADDRESSES)
+class RecentRequests:
+    """Последние запросы с длительностью этапов обработки, мс"""
+
+    def __call__(self, request):
+        return Response.text(METRICS.recent_requests())
 
-            return '302 Found', [('Location', '/')]
-        else:
-            return '200 OK', render('order.html', context=context)
 
+@AppRoute(routes=routes, url='/metrics/profiles/', methods=['GET'])
+@AppAllowFrom(variables.DEBUG_METRICS_ADDRESSES)
+class Profiles:
+    """Профили запросов, выполненных с параметром profile (при включенном профилировании)"""
 
-@AppRoute(routes=routes, url='/api/products/')
-class ProductsApi:
-    @AppTime('ProductsAPI')
     def __call__(self, request):
-        return '200 OK', ProductsSerializer(MapperRegistry.get_current_mapper('products').all()).save()
+        return Response.text(METRICS.recent_profiles())